@@ -2,19 +2,55 @@ import redis
 from flask import Flask, render_template, request, jsonify, session, send_from_directory
 from flask_limiter import Limiter
 from flask_session import Session
-import pandas as pd
+import datetime
 import logging
-import sqlite3
 import os
+import threading
+import time
 import uuid
 from werkzeug.exceptions import TooManyRequests
-
-logging.basicConfig(level=logging.DEBUG)
+import metrics
+from candle_cache import CandleCache
+from candle_store import CandleStore, RESAMPLE_INTERVALS, discover_partitions, resample_candles
+from chart_payload import cached_json_response, choose_encoding, encode_chart_compact, encode_chart_json
+from datasets import DATASET_SPECS, create_registry, file_mtime
+from streaming import candle_rows, date_rows, frame_rows, ndjson_response, peek, wants_ndjson
+from filter_index import (FILTER_SPECS, FilterEngine, create_filters, parse_earnings_filters, parse_economic_filters,
+                          parse_event_filters, parse_gap_filters, single_gap_cell, values)
+from gap_builder import output_path as gap_output_path
+from intraday_aggregate import BASES as AGGREGATE_BASES, aggregate_paths, previous_days
+from earnings_insights import EarningsInsightsEngine
+from gap_insights import ANY, GapInsightsEngine, REQUIRED_COLUMNS as GAP_INSIGHT_COLUMNS, summarize as summarize_gaps
+from manifest import file_signature, load_manifest, save_manifest
+from metrics import timed_stage
+from response_cache import ResponseCache
+from static_assets import CachedPage, StaticAssets
+from rate_limit import LocalSyncStorage
+
+BOOT_STARTED = time.perf_counter()
+
+# DEBUG logs every request's parameters and frame shapes; keep it off in production
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
 
 app = Flask(__name__)
 
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379')
+# 'local' counts hits in process and syncs them to Redis in batches, 'redis' asks Redis on every request
+RATELIMIT_STORAGE = os.environ.get('RATELIMIT_STORAGE', 'local')
+
+# Test Redis connection
+try:
+    redis_client = redis.Redis.from_url(REDIS_URL)
+    redis_client.ping()
+    logging.info("Successfully connected to Redis")
+except redis.ConnectionError as e:
+    redis_client = None
+    logging.error("Failed to connect to Redis: %s", e)
+
 # Configure Flask session settings
-app.config['SESSION_TYPE'] = 'filesystem'
+# 'cookie' keeps the session in Flask's signed cookie (no server-side storage), 'redis' and
+# 'filesystem' use Flask-Session
+app.config['SESSION_TYPE'] = os.environ.get('SESSION_TYPE', 'cookie')
 app.config['SESSION_FILE_DIR'] = os.path.join(os.path.dirname(__file__), 'sessions')
 app.config['SESSION_PERMANENT'] = False
 app.config['SESSION_USE_SIGNER'] = True
@@ -23,106 +59,250 @@ app.config['SESSION_COOKIE_NAME'] = 'onemchart_session'
 app.config['SESSION_COOKIE_SECURE'] = True
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
-
-# Initialize Flask-Session
-Session(app)
-
-# Ensure session directory exists
-os.makedirs(app.config['SESSION_FILE_DIR'], exist_ok=True)
+# RATELIMIT_ENABLED=0 turns Flask-Limiter off, e.g. for the load tests in bench/
+app.config['RATELIMIT_ENABLED'] = os.environ.get('RATELIMIT_ENABLED', '1') == '1'
+
+if app.config['SESSION_TYPE'] == 'redis' and redis_client is None:
+    logging.warning("Redis unavailable, keeping sessions in signed cookies")
+    app.config['SESSION_TYPE'] = 'cookie'
+if app.config['SESSION_TYPE'] == 'redis':
+    app.config['SESSION_REDIS'] = redis_client
+    Session(app)
+elif app.config['SESSION_TYPE'] == 'filesystem':
+    # Initialize Flask-Session
+    Session(app)
+    # Ensure session directory exists
+    os.makedirs(app.config['SESSION_FILE_DIR'], exist_ok=True)
 
 # Custom key function for Flask-Limiter
 def get_session_key():
     if 'user_id' not in session:
         session['user_id'] = str(uuid.uuid4())
-        logging.debug(f"New session created with ID: {session['user_id']}")
+        logging.debug("New session created with ID: %s", session['user_id'])
     return session['user_id']
 
-# Configure Flask-Limiter with Redis
+def rate_limit_storage_uri():
+    if redis_client is None:
+        logging.warning("Falling back to in-memory storage for rate limiting")
+        return 'memory://'
+    if RATELIMIT_STORAGE == 'redis':
+        return REDIS_URL
+    return LocalSyncStorage.uri_for(REDIS_URL)
+
+# Configure Flask-Limiter
 limiter = Limiter(
     get_session_key,
     app=app,
     default_limits=["10 per 12 hours"],
-    storage_uri=os.environ.get('REDIS_URL', 'redis://localhost:6379'),
+    storage_uri=rate_limit_storage_uri(),
     storage_options={"socket_connect_timeout": 30, "socket_timeout": 30},
-    headers_enabled=True
+    headers_enabled=True,
+    in_memory_fallback_enabled=True
 )
 
-# Test Redis connection
-try:
-    redis_client = redis.Redis.from_url(os.environ.get('REDIS_URL', 'redis://localhost:6379'))
-    redis_client.ping()
-    logging.info("Successfully connected to Redis")
-except redis.ConnectionError as e:
-    logging.error(f"Failed to connect to Redis: {str(e)}")
-    limiter.storage = limiter.storage_memory()
-    logging.warning("Falling back to in-memory storage for rate limiting")
+# Cache of deterministic API responses: local LRU in front of the shared Redis, reached through its own
+# client with short socket timeouts so a slow Redis turns lookups into misses instead of stalling requests
+response_cache = ResponseCache(ResponseCache.connect(REDIS_URL) if redis_client is not None else None)
+
+# Per-route latency, stage timings, SQLite and payload metrics exposed on /metrics
+metrics.init_app(app)
 
 # Custom error handler for rate limit exceeded
 @app.errorhandler(429)
 def ratelimit_handler(e):
-    logging.info(f"Rate limit exceeded for session: {session.get('user_id')}")
-    if request.path == '/api/gap_insights':
-        return jsonify({
-            'error': 'Rate limit exceeded: You have reached the limit of 3 requests per 12 hours. Please wait and try again later.'
-        }), 429
+    logging.info("Rate limit exceeded for session: %s", session.get('user_id'))
+    metrics.record_rate_limited()
     return jsonify({
         'error': 'Rate limit exceeded: You have reached the limit of 10 requests per 12 hours. Please wait and try again later.'
     }), 429
 
 TICKERS = ['QQQ', 'AAPL', 'MSFT', 'TSLA', 'ORCL', 'NVDA', 'MSTR', 'UBER', 'PLTR', 'META']
-DB_DIR = os.path.join(os.path.dirname(__file__), "data", "db")
-GAP_DATA_PATH = os.path.join(os.path.dirname(__file__), "data", "qqq_central_data_updated.csv")
-EVENTS_DATA_PATH = os.path.join(os.path.dirname(__file__), "data", "news_events.csv")
-EARNINGS_DATA_PATH = os.path.join(os.path.dirname(__file__), "data", "earnings_data.csv")
-ECONOMIC_DATA_BINNED_PATH = os.path.join(os.path.dirname(__file__), "data", "economic_data_binned.csv")
-
-# Define multiple QQQ database paths
-QQQ_DB_PATHS = [
-    os.path.join(DB_DIR, "stock_data_qqq_part1.db"),
-    os.path.join(DB_DIR, "stock_data_qqq_part2.db"),
-    os.path.join(DB_DIR, "stock_data_qqq_part3.db")
-]
+EARNINGS_BINS = ['Beat', 'Slight Beat', 'Miss', 'Slight Miss', 'Unknown']
+DATA_DIR = os.environ.get('DATA_DIR', os.path.join(os.path.dirname(__file__), "data"))
+DB_DIR = os.environ.get('DB_DIR', os.path.join(DATA_DIR, "db"))
+GAP_DATA_PATH = os.path.join(DATA_DIR, "qqq_central_data_updated.csv")
+EVENTS_DATA_PATH = os.path.join(DATA_DIR, "news_events.csv")
+EARNINGS_DATA_PATH = os.path.join(DATA_DIR, "earnings_data_binned.csv")
+# Display label of every surprise bin per ticker, e.g. "0% to 10% (Slight Beat)"
+EARNINGS_BINS_PATH = os.path.join(DATA_DIR, "earnings_bin_definitions.json")
+ECONOMIC_DATA_BINNED_PATH = os.path.join(DATA_DIR, "economic_data_binned.csv")
+# Per-ticker gap statistics written by gap_builder.py
+GAP_BUILD_DIR = os.environ.get('GAP_BUILD_DIR', os.path.join(DATA_DIR, 'gaps'))
+
+# Ticker/partition/catalog metadata cached across boots, keyed by DB file mtime and size
+STARTUP_MANIFEST_PATH = os.environ.get('STARTUP_MANIFEST_PATH', os.path.join(DB_DIR, 'startup_manifest.json'))
+# 'background' warms dataset caches in a thread, 'sync' before serving (gunicorn preload), 'off' disables
+WARM_UP = os.environ.get('WARM_UP', 'background')
+# CANDLE_CACHE=1 serves candles from memory-mapped NumPy exports of the DBs (SQLite stays the source of truth)
+CANDLE_CACHE = os.environ.get('CANDLE_CACHE', '0') == '1'
+CANDLE_CACHE_DIR = os.environ.get('CANDLE_CACHE_DIR', os.path.join(DB_DIR, 'cache'))
+# 'build' writes content-hashed, precompressed copies of static/ at startup when static/ changed,
+# 'prebuilt' only serves an existing build (python static_assets.py), 'off' links the plain /static files
+STATIC_ASSETS = os.environ.get('STATIC_ASSETS', 'build')
+STATIC_BUILD_DIR = os.environ.get('STATIC_BUILD_DIR', os.path.join(os.path.dirname(__file__), 'static', 'dist'))
+# Seconds browsers and proxies reuse the rendered index page before revalidating it
+INDEX_CACHE_MAX_AGE = int(os.environ.get('INDEX_CACHE_MAX_AGE', '300'))
+
+# Upper bounds for the multi-day candle endpoints
+MAX_RANGE_DAYS = int(os.environ.get('MAX_RANGE_DAYS', '370'))
+MAX_BATCH_DAYS = int(os.environ.get('MAX_BATCH_DAYS', '100'))
+MAX_AGGREGATE_DAYS = int(os.environ.get('MAX_AGGREGATE_DAYS', '1000'))
 
 VALID_TICKERS = []
 
+# Content-hashed, precompressed static files and the rendered index page, both served without the rate limit
+static_assets = StaticAssets(app.static_folder, STATIC_BUILD_DIR if STATIC_ASSETS != 'off' else None)
+app.jinja_env.globals['asset_url'] = static_assets.url
+INDEX_TEMPLATE_PATH = os.path.join(app.root_path, app.template_folder, 'index.html')
+index_page = CachedPage(lambda: render_template('index.html'),
+                        lambda: (file_mtime(INDEX_TEMPLATE_PATH), static_assets.version()),
+                        f'public, max-age={INDEX_CACHE_MAX_AGE}')
+
+# Shared datasets from data/ (prebuilt .arrow files or CSV), loaded once per worker and reloaded when a file changes
+datasets = create_registry(DATA_DIR)
+
+def gap_dataset_name(ticker):
+    # QQQ (the default) keeps the curated CSV; other tickers read what gap_builder.py produced
+    return 'gaps' if not ticker or ticker == 'QQQ' else f'gaps:{ticker}'
+
+for ticker in TICKERS:
+    if gap_dataset_name(ticker) != 'gaps':
+        datasets.register(gap_dataset_name(ticker), gap_output_path(GAP_BUILD_DIR, ticker),
+                          categories=DATASET_SPECS['gaps']['categories'])
+
+GAP_DATASETS = [name for name in datasets.names() if name == 'gaps' or name.startswith('gaps:')]
+
+# Gap insights for every gap size/day/direction combination, precomputed per data version
+gap_insights = {name: GapInsightsEngine(datasets.dataset(name)) for name in GAP_DATASETS}
+
+# Per-value bitmaps over the gap, events, economic and earnings datasets for multi-criteria filters
+filters = create_filters(datasets)
+filters.update({name: FilterEngine(datasets.dataset(name), FILTER_SPECS['gaps'])
+                for name in GAP_DATASETS if name not in filters})
+
+def gap_data_token():
+    name = gap_dataset_name(request.args.get('ticker'))
+    return datasets.dataset(name).token() if name in GAP_DATASETS else None
+
 def get_db_paths(ticker):
     if ticker not in TICKERS:
-        logging.error(f"Invalid ticker requested: {ticker}")
+        logging.error("Invalid ticker requested: %s", ticker)
         return []
-    if ticker == 'QQQ':
-        return [path for path in QQQ_DB_PATHS if os.path.exists(path)]
-    db_path = os.path.join(DB_DIR, f"stock_data_{ticker.lower()}.db")
-    return [db_path] if os.path.exists(db_path) else []
+    # stock_data_<ticker>_part<N>.db partitions (QQQ ships as three) or a single stock_data_<ticker>.db
+    return discover_partitions(DB_DIR, ticker)
+
+def all_db_paths():
+    return [path for ticker in TICKERS for path in get_db_paths(ticker)]
+
+def parse_request_date(value):
+    # ISO dates are parsed without pandas; anything else pandas understands is still accepted
+    if not isinstance(value, str) or not value:
+        raise ValueError(f"Invalid date: {value!r}")
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        import pandas as pd
+        parsed = pd.to_datetime(value)
+        if pd.isna(parsed):
+            raise ValueError(f"Invalid date: {value!r}")
+        return parsed.date()
+
+def initialize_candle_store():
+    global candle_store
+    db_paths = {ticker: get_db_paths(ticker) for ticker in TICKERS}
+    manifest = load_manifest(STARTUP_MANIFEST_PATH, all_db_paths())
+    if manifest is not None:
+        logging.debug("Using startup manifest %s", STARTUP_MANIFEST_PATH)
+        candle_store = CandleStore(db_paths, state=manifest['candles'])
+    else:
+        # Pooled read-only connections, partition map and trading day catalog for every ticker DB
+        candle_store = CandleStore(db_paths)
+        save_manifest(STARTUP_MANIFEST_PATH, {
+            'files': file_signature(all_db_paths()),
+            'candles': candle_store.export_state()
+        })
+    if CANDLE_CACHE:
+        # Exported once here, before gunicorn forks, so every worker maps the same files. The store's index
+        # and trading day sidecar writes above change the files, so the export keys on their final version
+        cache = CandleCache(CANDLE_CACHE_DIR, db_paths)
+        cache.prepare()
+        candle_store.cache = cache
 
 def initialize_tickers():
     global VALID_TICKERS
     VALID_TICKERS = []
     logging.debug("Initializing ticker list")
     for ticker in TICKERS:
-        db_paths = get_db_paths(ticker)
-        if not db_paths:
-            logging.warning(f"No database files found for {ticker}")
+        if not get_db_paths(ticker):
+            logging.warning("No database files found for %s", ticker)
             continue
-        try:
-            for db_path in db_paths:
-                conn = sqlite3.connect(db_path)
-                cursor = conn.cursor()
-                cursor.execute("SELECT DISTINCT ticker FROM candles")
-                db_tickers = [row[0] for row in cursor.fetchall()]
-                if db_tickers and ticker not in VALID_TICKERS:
-                    VALID_TICKERS.append(ticker)
-                conn.close()
-                logging.debug(f"Validated ticker {ticker} in {db_path}")
-        except Exception as e:
-            logging.warning(f"Could not access database for {ticker}: {str(e)}")
+        if candle_store.catalog.get_dates(ticker):
+            VALID_TICKERS.append(ticker)
+        else:
+            logging.warning("No candles found for %s", ticker)
     if not VALID_TICKERS:
         logging.warning("No valid ticker databases found, falling back to static list")
         VALID_TICKERS = TICKERS
     VALID_TICKERS = sorted(VALID_TICKERS)
-    logging.debug(f"Initialized tickers: {VALID_TICKERS}")
+    logging.debug("Initialized tickers: %s", VALID_TICKERS)
+
+def initialize_earnings_insights():
+    global earnings_insights
+    # Reactions are read from the candle store, so this runs once it exists
+    earnings_insights = EarningsInsightsEngine(datasets.dataset('earnings'), candle_store, EARNINGS_BINS_PATH)
+
+def initialize_static_assets():
+    if STATIC_ASSETS == 'off':
+        return
+    try:
+        static_assets.prepare(rebuild=STATIC_ASSETS == 'build')
+    except Exception as e:
+        logging.warning("Could not build static assets, linking the plain /static files: %s", e)
+
+def warm_up():
+    # Load every dataset and build derived caches so the first request is not the slow one
+    started = time.perf_counter()
+    available = []
+    for name in datasets.names():
+        try:
+            datasets.get(name)
+            available.append(name)
+        except FileNotFoundError:
+            # Per-ticker gap files only exist once gap_builder.py has run
+            logging.info("Dataset %s not found, skipping warm-up", name)
+        except Exception as e:
+            logging.warning("Could not warm dataset %s: %s", name, e)
+    for name, engine in gap_insights.items():
+        if name not in available:
+            continue
+        try:
+            engine.lookup(None, None, None)
+        except Exception as e:
+            logging.warning("Could not warm gap insights %s: %s", name, e)
+    if 'earnings' in available:
+        try:
+            earnings_insights.lookup(None)
+        except Exception as e:
+            logging.warning("Could not warm earnings insights: %s", e)
+    for name, engine in filters.items():
+        if engine.dataset.name not in available:
+            continue
+        try:
+            engine.snapshot()
+        except Exception as e:
+            logging.warning("Could not build filter index %s: %s", name, e)
+    logging.info("Warm-up finished in %.3fs", time.perf_counter() - started)
 
 with app.app_context():
+    initialize_candle_store()
     initialize_tickers()
+    initialize_earnings_insights()
+    initialize_static_assets()
+    if WARM_UP == 'sync':
+        warm_up()
+    elif WARM_UP == 'background':
+        threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+logging.info("Startup finished in %.3fs", time.perf_counter() - BOOT_STARTED)
 
 # Route to serve ads.txt
 @app.route('/ads.txt')
@@ -130,14 +310,65 @@ def serve_ads_txt():
     try:
         return send_from_directory('.', 'ads.txt')
     except Exception as e:
-        logging.error(f"Error serving ads.txt: {str(e)}")
+        logging.error("Error serving ads.txt: %s", e)
         return jsonify({'error': 'Failed to serve ads.txt'}), 404
 
+@app.route('/api/dataset_stats', methods=['GET'])
+@limiter.exempt
+def get_dataset_stats():
+    return jsonify({
+        'datasets': datasets.stats(),
+        'gap_insights': {name: engine.stats() for name, engine in gap_insights.items()},
+        'earnings_insights': earnings_insights.stats(),
+        'filters': {name: engine.stats() for name, engine in filters.items()}
+    })
+
+@app.route('/api/cache_stats', methods=['GET'])
+@limiter.exempt
+def get_cache_stats():
+    stats = {'response_cache': response_cache.stats()}
+    if candle_store.cache is not None:
+        stats['candle_cache'] = candle_store.cache.stats()
+    stats['static_assets'] = dict(static_assets.stats(), index_renders=index_page.renders)
+    return jsonify(stats)
+
+def dataset_metrics():
+    stats = datasets.stats()
+    for name, field, kind, documentation in [
+            ('dataset_rows', 'rows', 'gauge', 'Rows in each loaded dataset.'),
+            ('dataset_hits_total', 'hits', 'counter', 'Dataset reads served from memory.'),
+            ('dataset_misses_total', 'misses', 'counter', 'Dataset reads that loaded the file.'),
+            ('dataset_reloads_total', 'reloads', 'counter', 'Dataset reloads after a file change.'),
+            ('dataset_load_seconds_total', 'load_seconds', 'counter', 'Time spent loading each dataset.')]:
+        yield name, kind, documentation, ('dataset',), [((dataset,), item[field]) for dataset, item in stats.items()]
+
+def response_cache_metrics():
+    routes = response_cache.stats()['routes']
+    for field in ['local_hits', 'redis_hits', 'misses', 'stores', 'errors']:
+        yield (f'response_cache_{field}_total', 'counter', f'Response cache {field.replace("_", " ")} by route.', ('route',),
+               [((route,), counter.get(field, 0)) for route, counter in routes.items()])
+
+metrics.REGISTRY.register_collector(dataset_metrics)
+metrics.REGISTRY.register_collector(response_cache_metrics)
+
+@app.route('/metrics')
+@limiter.exempt
+def get_metrics():
+    return metrics.REGISTRY.render(), 200, {'Content-Type': metrics.CONTENT_TYPE}
+
 @app.route('/')
-@limiter.limit("10 per 12 hours")
+@limiter.exempt
 def index():
-    logging.debug("Rendering index.html")
-    return render_template('index.html')
+    # Rendered once per template and asset build; the hashed asset URLs make the page safe to cache
+    return index_page.response(request)
+
+@app.route('/assets/<path:filename>')
+@limiter.exempt
+def serve_asset(filename):
+    response = static_assets.response(filename, request)
+    if response is None:
+        return jsonify({'error': 'Asset not found'}), 404
+    return response
 
 @app.route('/api/tickers', methods=['GET'])
 @limiter.limit("10 per 12 hours")
@@ -149,67 +380,67 @@ def get_tickers():
 @limiter.limit("10 per 12 hours")
 def get_valid_dates():
     ticker = request.args.get('ticker')
-    logging.debug(f"Fetching valid dates for ticker: {ticker}")
+    logging.debug("Fetching valid dates for ticker: %s", ticker)
     if not ticker or ticker not in TICKERS:
-        logging.error(f"Invalid ticker requested: {ticker}")
+        logging.error("Invalid ticker requested: %s", ticker)
         return jsonify({'error': 'Missing or invalid ticker'}), 400
     db_paths = get_db_paths(ticker)
     if not db_paths:
-        logging.error(f"No database available for {ticker}")
+        logging.error("No database available for %s", ticker)
         return jsonify({'error': f'No database available for {ticker}'}), 404
     try:
-        dates = set()
-        for db_path in db_paths:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT DISTINCT DATE(timestamp) AS date FROM candles WHERE ticker = ?", (ticker,))
-            dates.update(row[0] for row in cursor.fetchall())
-            conn.close()
-        logging.debug(f"Found {len(dates)} dates for {ticker}")
+        dates = candle_store.catalog.get_dates(ticker)
+        logging.debug("Found %s dates for %s", len(dates), ticker)
         if not dates:
-            logging.warning(f"No dates available for {ticker}")
+            logging.warning("No dates available for %s", ticker)
             return jsonify({'error': f'No dates available for {ticker}'}), 404
-        return jsonify({'dates': sorted(dates)})
+        if wants_ndjson(request):
+            return ndjson_response(date_rows(dates))
+        output_format = request.args.get('format')
+        if output_format == 'bitmap':
+            return jsonify(candle_store.catalog.bitmap(ticker))
+        if output_format == 'full':
+            return jsonify(candle_store.catalog.columns(ticker))
+        return jsonify({'dates': dates})
     except Exception as e:
-        logging.error(f"Error fetching dates for {ticker}: {str(e)}")
+        logging.error("Error fetching dates for %s: %s", ticker, e)
         return jsonify({'error': f'Failed to fetch dates for {ticker}'}), 500
 
 @app.route('/api/stock/chart', methods=['GET'])
-@limiter.limit("10 per 12 hours")
+@limiter.limit("10 per 12 hours", deduct_when=lambda response: response.status_code != 304)
+@response_cache.cached('chart', version=lambda: candle_store.version,
+                       variant=lambda: choose_encoding(request.accept_encodings),
+                       bypass=lambda: wants_ndjson(request))
 def get_chart():
     try:
         ticker = request.args.get('ticker')
         date = request.args.get('date')
-        logging.debug(f"Processing chart request for ticker={ticker}, date={date}")
+        logging.debug("Processing chart request for ticker=%s, date=%s", ticker, date)
         if not ticker or not date:
             return jsonify({'error': 'Missing ticker or date'}), 400
         if ticker not in TICKERS:
             return jsonify({'error': 'Invalid ticker'}), 400
         try:
-            target_date = pd.to_datetime(date).date()
+            target_date = parse_request_date(date)
         except ValueError:
             return jsonify({'error': 'Invalid date format'}), 400
         db_paths = get_db_paths(ticker)
         if not db_paths:
             return jsonify({'error': f'No database available for {ticker}'}), 404
+        if wants_ndjson(request):
+            try:
+                first, rows = peek(candle_store.iter_range(ticker, target_date))
+            except Exception as e:
+                logging.error("Error querying database for %s: %s", ticker, e)
+                return jsonify({'error': 'Database query failed'}), 500
+            if first is None:
+                return jsonify({'error': 'No data available for the selected date. Try another date.'}), 404
+            return ndjson_response(candle_rows(rows))
         try:
-            df_list = []
-            query = """
-                SELECT timestamp, open, high, low, close, volume
-                FROM candles
-                WHERE ticker = ? AND DATE(timestamp) = ?
-                ORDER BY timestamp
-            """
-            for db_path in db_paths:
-                conn = sqlite3.connect(db_path)
-                df = pd.read_sql_query(query, conn, params=(ticker, str(target_date)), parse_dates=['timestamp'])
-                df_list.append(df)
-                conn.close()
-            df = pd.concat(df_list, ignore_index=True)
-            df = df.sort_values('timestamp')
-            logging.debug(f"Loaded data shape for {ticker} on {date}: {df.shape}")
+            df = candle_store.fetch_day(ticker, target_date)
+            logging.debug("Loaded data shape for %s on %s: %s", ticker, date, df.shape)
         except Exception as e:
-            logging.error(f"Error querying database for {ticker}: {str(e)}")
+            logging.error("Error querying database for %s: %s", ticker, e)
             return jsonify({'error': 'Database query failed'}), 500
         if df.empty:
             return jsonify({'error': 'No data available for the selected date. Try another date.'}), 404
@@ -217,169 +448,244 @@ def get_chart():
         if not all(col in df.columns for col in required_columns):
             return jsonify({'error': 'Invalid data format'}), 400
 
-        # Prepare data for Plotly.js
-        df['timestamp'] = df['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S')
-        chart_data = {
-            'timestamp': df['timestamp'].tolist(),
-            'open': df['open'].tolist(),
-            'high': df['high'].tolist(),
-            'low': df['low'].tolist(),
-            'close': df['close'].tolist(),
-            'volume': df['volume'].tolist(),
-            'ticker': ticker,
-            'date': date
-        }
-        return jsonify({'chart_data': chart_data})
+        # Prepare data for Plotly.js; historical bars never change so repeats are served from caches
+        with timed_stage('serialize'):
+            if request.args.get('format') == 'compact':
+                chart_data = encode_chart_compact(df, ticker, date)
+            else:
+                chart_data = encode_chart_json(df, ticker, date)
+        return cached_json_response({'chart_data': chart_data}, request,
+                                    immutable=target_date < datetime.date.today())
+    except Exception as e:
+        logging.error("Unexpected error in get_chart: %s", e)
+        return jsonify({'error': 'Server error'}), 500
+
+@app.route('/api/stock/range', methods=['GET'])
+@limiter.limit("10 per 12 hours", deduct_when=lambda response: response.status_code != 304)
+def get_range():
+    try:
+        ticker = request.args.get('ticker')
+        start = request.args.get('start')
+        end = request.args.get('end')
+        interval = request.args.get('interval', '1m')
+        logging.debug("Processing range request for ticker=%s, start=%s, end=%s, interval=%s", ticker, start, end, interval)
+        if not ticker or not start or not end:
+            return jsonify({'error': 'Missing ticker, start or end'}), 400
+        if ticker not in TICKERS:
+            return jsonify({'error': 'Invalid ticker'}), 400
+        if interval not in RESAMPLE_INTERVALS:
+            return jsonify({'error': f'Invalid interval, expected one of {list(RESAMPLE_INTERVALS)}'}), 400
+        try:
+            start_date = parse_request_date(start)
+            end_date = parse_request_date(end)
+        except ValueError:
+            return jsonify({'error': 'Invalid date format'}), 400
+        if end_date < start_date:
+            return jsonify({'error': 'End date is before start date'}), 400
+        if (end_date - start_date).days > MAX_RANGE_DAYS:
+            return jsonify({'error': f'Range is limited to {MAX_RANGE_DAYS} days'}), 400
+        if not get_db_paths(ticker):
+            return jsonify({'error': f'No database available for {ticker}'}), 404
+        if wants_ndjson(request):
+            try:
+                if interval == '1m':
+                    first, rows = peek(candle_rows(candle_store.iter_range(ticker, start_date, end_date)))
+                else:
+                    frames = (resample_candles(df, interval)
+                              for df in candle_store.iter_range_frames(ticker, start_date, end_date))
+                    first, rows = peek(frame_rows(frames))
+            except Exception as e:
+                logging.error("Error querying database for %s: %s", ticker, e)
+                return jsonify({'error': 'Database query failed'}), 500
+            if first is None:
+                return jsonify({'error': 'No data available for the selected range. Try other dates.'}), 404
+            return ndjson_response(rows)
+        try:
+            df = resample_candles(candle_store.fetch_range(ticker, start_date, end_date), interval)
+            logging.debug("Loaded range data shape for %s from %s to %s: %s", ticker, start_date, end_date, df.shape)
+        except Exception as e:
+            logging.error("Error querying database for %s: %s", ticker, e)
+            return jsonify({'error': 'Database query failed'}), 500
+        if df.empty:
+            return jsonify({'error': 'No data available for the selected range. Try other dates.'}), 404
+        encode = encode_chart_compact if request.args.get('format') == 'compact' else encode_chart_json
+        with timed_stage('serialize'):
+            chart_data = encode(df, ticker, None, start_date=str(start_date), end_date=str(end_date), interval=interval)
+        return cached_json_response({'chart_data': chart_data}, request,
+                                    immutable=end_date < datetime.date.today())
+    except Exception as e:
+        logging.error("Unexpected error in get_range: %s", e)
+        return jsonify({'error': 'Server error'}), 500
+
+def parse_batch_pairs():
+    # GET ?pairs=QQQ:2024-01-02,AAPL:2024-01-03 or POST {"pairs": [{"ticker": ..., "date": ...}]}
+    # Raises ValueError for malformed input, which the route answers with a 400
+    if request.method == 'POST':
+        body = request.get_json(silent=True) or {}
+        if not isinstance(body, dict) or not isinstance(body.get('pairs', []), list):
+            raise ValueError('Expected a JSON object with a "pairs" list')
+        pairs = [(item.get('ticker'), item.get('date')) for item in body.get('pairs', []) if isinstance(item, dict)]
+        interval, output_format = body.get('interval', '1m'), body.get('format')
+    else:
+        pairs = [tuple(item.split(':', 1)) if ':' in item else (item, None)
+                 for item in request.args.get('pairs', '').split(',') if item]
+        interval, output_format = request.args.get('interval', '1m'), request.args.get('format')
+    for ticker, date in pairs:
+        if not date:
+            raise ValueError(f'Missing date for ticker: {ticker}')
+    if not isinstance(interval, str):
+        raise ValueError(f'Invalid interval, expected one of {list(RESAMPLE_INTERVALS)}')
+    return pairs, interval, output_format
+
+def iter_batch_charts(dates_by_ticker, interval, encode):
+    # One chart per requested day, fetched ticker by ticker; missing days are flagged in place
+    for ticker, dates in dates_by_ticker.items():
+        df = candle_store.fetch_days(ticker, dates)
+        days = dict(tuple(df.groupby('date', sort=False)))
+        for date in sorted(set(dates)):
+            if date not in days:
+                yield {'ticker': ticker, 'date': date, 'missing': True}
+                continue
+            day = resample_candles(days[date].drop(columns='date').reset_index(drop=True), interval)
+            yield encode(day, ticker, date, interval=interval)
+
+@app.route('/api/stock/batch', methods=['GET', 'POST'])
+@limiter.limit("10 per 12 hours", deduct_when=lambda response: response.status_code != 304)
+def get_batch():
+    try:
+        try:
+            pairs, interval, output_format = parse_batch_pairs()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        logging.debug("Processing batch request for %s pairs, interval=%s", len(pairs), interval)
+        if not pairs:
+            return jsonify({'error': 'Missing ticker/date pairs'}), 400
+        if len(pairs) > MAX_BATCH_DAYS:
+            return jsonify({'error': f'Batch is limited to {MAX_BATCH_DAYS} ticker/date pairs'}), 400
+        if interval not in RESAMPLE_INTERVALS:
+            return jsonify({'error': f'Invalid interval, expected one of {list(RESAMPLE_INTERVALS)}'}), 400
+        dates_by_ticker = {}
+        for ticker, date in pairs:
+            if not ticker or ticker not in TICKERS:
+                return jsonify({'error': f'Invalid ticker: {ticker}'}), 400
+            try:
+                target_date = parse_request_date(date)
+            except (ValueError, TypeError):
+                return jsonify({'error': f'Invalid date format: {date}'}), 400
+            dates_by_ticker.setdefault(ticker, []).append(str(target_date))
+        encode = encode_chart_compact if output_format == 'compact' else encode_chart_json
+        if wants_ndjson(request):
+            return ndjson_response(iter_batch_charts(dates_by_ticker, interval, encode))
+        charts = []
+        missing = []
+        try:
+            for item in iter_batch_charts(dates_by_ticker, interval, encode):
+                if item.get('missing'):
+                    missing.append({'ticker': item['ticker'], 'date': item['date']})
+                else:
+                    charts.append(item)
+        except Exception as e:
+            logging.error("Error querying database for batch: %s", e)
+            return jsonify({'error': 'Database query failed'}), 500
+        logging.debug("Batch returned %s charts, %s missing", len(charts), len(missing))
+        latest = max(date for dates in dates_by_ticker.values() for date in dates)
+        return cached_json_response({'charts': charts, 'missing': missing}, request,
+                                    immutable=request.method == 'GET' and latest < str(datetime.date.today()))
     except Exception as e:
-        logging.error(f"Unexpected error in get_chart: {str(e)}")
+        logging.error("Unexpected error in get_batch: %s", e)
         return jsonify({'error': 'Server error'}), 500
 
 @app.route('/api/gaps', methods=['GET'])
 @limiter.limit("10 per 12 hours")
+@response_cache.cached('gaps', version=gap_data_token, bypass=lambda: wants_ndjson(request))
 def get_gaps():
     try:
-        gap_size = request.args.get('gap_size')
-        day = request.args.get('day')
-        gap_direction = request.args.get('gap_direction')
-        logging.debug(f"Fetching gaps for gap_size={gap_size}, day={day}, gap_direction={gap_direction}")
-        if not os.path.exists(GAP_DATA_PATH):
-            logging.error(f"Gap data file not found: {GAP_DATA_PATH}")
-            return jsonify({'error': 'Gap data file not found. Please contact support.'}), 404
+        gap_size = request.args.getlist('gap_size')
+        day = request.args.getlist('day')
+        gap_direction = request.args.getlist('gap_direction')
+        logging.debug("Fetching gaps for gap_size=%s, day=%s, gap_direction=%s", gap_size, day, gap_direction)
         try:
-            df = pd.read_csv(GAP_DATA_PATH)
-            logging.debug(f"Loaded gap data with shape: {df.shape}")
+            equals, ranges = parse_gap_filters(request.args)
+        except ValueError as e:
+            logging.error("Invalid gap filter: %s", e)
+            return jsonify({'error': str(e)}), 400
+        ticker = request.args.get('ticker')
+        if ticker and ticker not in TICKERS:
+            logging.error("Invalid ticker requested: %s", ticker)
+            return jsonify({'error': 'Invalid ticker'}), 400
+        dataset = gap_dataset_name(ticker)
+        try:
+            df = datasets.get(dataset)
+            logging.debug("Loaded gap data with shape: %s", df.shape)
+        except FileNotFoundError:
+            logging.error("Gap data file not found: %s", datasets.dataset(dataset).path)
+            return jsonify({'error': 'Gap data file not found. Please contact support.'}), 404
         except Exception as e:
-            logging.error(f"Error reading gap data file {GAP_DATA_PATH}: {str(e)}")
+            logging.error("Error reading gap data file %s: %s", datasets.dataset(dataset).path, e)
             return jsonify({'error': f'Failed to load gap data: {str(e)}'}), 500
         if 'date' not in df.columns or 'gap_size_bin' not in df.columns or 'day_of_week' not in df.columns or 'gap_direction' not in df.columns:
             logging.error("Invalid gap data format: missing required columns")
             return jsonify({'error': 'Invalid gap data format'}), 400
-        filtered_df = df[
-            (df['gap_size_bin'] == gap_size) &
-            (df['day_of_week'] == day) &
-            (df['gap_direction'] == gap_direction)
-        ]
-        dates = filtered_df['date'].tolist()
-        logging.debug(f"Filtered DataFrame shape: {filtered_df.shape}")
+        with timed_stage('filter'):
+            snapshot = filters[dataset].snapshot()
+            dates = snapshot.labels[snapshot.select(equals, ranges)].tolist()
+        logging.debug("Matched %s gap rows", len(dates))
+        if wants_ndjson(request):
+            return ndjson_response(date_rows(sorted(dates)))
         if not dates:
-            logging.debug(f"No gaps found for gap_size={gap_size}, day={day}, gap_direction={gap_direction}")
+            logging.debug("No gaps found for gap_size=%s, day=%s, gap_direction=%s", gap_size, day, gap_direction)
             return jsonify({'dates': [], 'message': 'No gaps found for the selected criteria'})
-        logging.debug(f"Found {len(dates)} gap dates")
+        logging.debug("Found %s gap dates", len(dates))
         return jsonify({'dates': sorted(dates)})
     except Exception as e:
-        logging.error(f"Error processing gaps: {str(e)}")
+        logging.error("Error processing gaps: %s", e)
         return jsonify({'error': 'Server error'}), 500
 
 @app.route('/api/gap_insights', methods=['GET'])
-@limiter.limit("3 per 12 hours")
+@limiter.limit("10 per 12 hours")
 def get_gap_insights():
     try:
-        gap_size = request.args.get('gap_size')
-        day = request.args.get('day')
-        gap_direction = request.args.get('gap_direction')
-        logging.debug(f"Fetching gap insights for gap_size={gap_size}, day={day}, gap_direction={gap_direction}")
-        if not os.path.exists(GAP_DATA_PATH):
-            logging.error(f"Gap data file not found: {GAP_DATA_PATH}")
-            return jsonify({'error': 'Gap data file not found. Please contact support.'}), 404
+        gap_size = request.args.getlist('gap_size')
+        day = request.args.getlist('day')
+        gap_direction = request.args.getlist('gap_direction')
+        logging.debug("Fetching gap insights for gap_size=%s, day=%s, gap_direction=%s", gap_size, day, gap_direction)
+        try:
+            equals, ranges = parse_gap_filters(request.args)
+        except ValueError as e:
+            logging.error("Invalid gap filter: %s", e)
+            return jsonify({'error': str(e)}), 400
+        ticker = request.args.get('ticker')
+        if ticker and ticker not in TICKERS:
+            logging.error("Invalid ticker requested: %s", ticker)
+            return jsonify({'error': 'Invalid ticker'}), 400
+        dataset = gap_dataset_name(ticker)
         try:
-            df = pd.read_csv(GAP_DATA_PATH)
-            logging.debug(f"Loaded gap data with shape: {df.shape}")
+            df = datasets.get(dataset)
+            logging.debug("Loaded gap data with shape: %s", df.shape)
+        except FileNotFoundError:
+            logging.error("Gap data file not found: %s", datasets.dataset(dataset).path)
+            return jsonify({'error': 'Gap data file not found. Please contact support.'}), 404
         except Exception as e:
-            logging.error(f"Error reading gap data file {GAP_DATA_PATH}: {str(e)}")
+            logging.error("Error reading gap data file %s: %s", datasets.dataset(dataset).path, e)
             return jsonify({'error': f'Failed to load gap data: {str(e)}'}), 500
-        required_columns = [
-            'gap_size_bin', 'day_of_week', 'gap_direction', 'filled',
-            'move_before_reversal_fill_direction_pct', 'max_move_gap_direction_first_30min_pct',
-            'time_of_low', 'time_of_high', 'reversal_after_fill', 'time_to_fill_minutes'
-        ]
-        if not all(col in df.columns for col in required_columns):
+        if not all(col in df.columns for col in GAP_INSIGHT_COLUMNS):
             logging.error("Invalid gap data format: missing required columns")
             return jsonify({'error': 'Invalid gap data format'}), 400
-        filtered_df = df[
-            (df['gap_size_bin'] == gap_size) &
-            (df['day_of_week'] == day) &
-            (df['gap_direction'] == gap_direction)
-        ].copy()
-        logging.debug(f"Filtered DataFrame shape: {filtered_df.shape}")
-        if filtered_df.empty:
-            logging.debug(f"No data found for gap_size={gap_size}, day={day}, gap_direction={gap_direction}")
+        with timed_stage('filter'):
+            cell = single_gap_cell(equals, ranges)
+            if cell is not None:
+                insights = gap_insights[dataset].lookup(*cell)
+            else:
+                # Several values or extra filters: aggregate only the rows the bitmaps select
+                snapshot = filters[dataset].snapshot()
+                insights = summarize_gaps(snapshot.frame[snapshot.select(equals, ranges)])
+        if insights is None:
+            logging.debug("No data found for gap_size=%s, day=%s, gap_direction=%s", gap_size, day, gap_direction)
             return jsonify({'insights': {}, 'message': 'No data found for the selected criteria'})
-        
-        gap_fill_rate = filtered_df['filled'].mean() * 100
-        filled_df = filtered_df[filtered_df['filled'] == True]
-        unfilled_df = filtered_df[filtered_df['filled'] == False]
-        reversal_after_fill_rate = filtered_df['reversal_after_fill'].mean() * 100 if not filtered_df.empty else 0
-        median_time_to_fill = filled_df['time_to_fill_minutes'].median() if not filled_df.empty else 0
-        average_time_to_fill = filled_df['time_to_fill_minutes'].mean() if not filled_df.empty else 0
-
-        def time_to_minutes(t):
-            try:
-                h, m = map(int, t.split(':')[:2])
-                return h * 60 + m
-            except:
-                return pd.NaT
-
-        filtered_df.loc[:, 'time_of_low_minutes'] = filtered_df['time_of_low'].apply(time_to_minutes)
-        filtered_df.loc[:, 'time_of_high_minutes'] = filtered_df['time_of_high'].apply(time_to_minutes)
-
-        def minutes_to_time(minutes):
-            if pd.isna(minutes):
-                return "N/A"
-            hours = int(minutes // 60)
-            mins = int(minutes % 60)
-            return f"{hours:02d}:{mins:02d}"
-
-        median_low_minutes = filtered_df['time_of_low_minutes'].median()
-        average_low_minutes = filtered_df['time_of_low_minutes'].mean()
-        median_high_minutes = filtered_df['time_of_high_minutes'].median()
-        average_high_minutes = filtered_df['time_of_high_minutes'].mean()
-
-        insights = {
-            'gap_fill_rate': {
-                'median': round(gap_fill_rate, 2),
-                'average': round(gap_fill_rate, 2),
-                'description': 'Percentage of gaps that close'
-            },
-            'median_move_before_fill': {
-                'median': round(filled_df['move_before_reversal_fill_direction_pct'].median(), 2) if not filled_df.empty else 0,
-                'average': round(filled_df['move_before_reversal_fill_direction_pct'].mean(), 2) if not filled_df.empty else 0,
-                'description': 'Percentage move before gap closes'
-            },
-            'median_max_move_unfilled': {
-                'median': round(unfilled_df['max_move_gap_direction_first_30min_pct'].median(), 2) if not unfilled_df.empty else 0,
-                'average': round(unfilled_df['max_move_gap_direction_first_30min_pct'].mean(), 2) if not unfilled_df.empty else 0,
-                'description': '% move in gap direction when price does not close the gap'
-            },
-            'median_time_to_fill': {
-                'median': round(median_time_to_fill, 2) if not pd.isna(median_time_to_fill) else 0,
-                'average': round(average_time_to_fill, 2) if not pd.isna(average_time_to_fill) else 0,
-                'description': 'Median time in minutes to fill gap'
-            },
-            'median_time_of_low': {
-                'median': minutes_to_time(median_low_minutes),
-                'average': minutes_to_time(average_low_minutes),
-                'description': 'Median time of the day’s low'
-            },
-            'median_time_of_high': {
-                'median': minutes_to_time(median_high_minutes),
-                'average': minutes_to_time(average_high_minutes),
-                'description': 'Median time of the day’s high'
-            },
-            'reversal_after_fill_rate': {
-                'median': round(reversal_after_fill_rate, 2),
-                'average': round(reversal_after_fill_rate, 2),
-                'description': '% of time price reverses after gap is filled'
-            },
-            'median_move_before_reversal': {
-                'median': round(filtered_df['move_before_reversal_fill_direction_pct'].median(), 2) if not filtered_df.empty else 0,
-                'average': round(filtered_df['move_before_reversal_fill_direction_pct'].mean(), 2) if not filtered_df.empty else 0,
-                'description': 'Median move in gap fill direction before reversal'
-            }
-        }
-        logging.debug(f"Computed insights: {insights}")
+        logging.debug("Computed insights: %s", insights)
         return jsonify({'insights': insights})
     except Exception as e:
-        logging.error(f"Error processing gap insights: {str(e)}")
+        logging.error("Error processing gap insights: %s", e)
         return jsonify({'error': 'Server error'}), 500
 
 @app.route('/api/years', methods=['GET'])
@@ -387,108 +693,109 @@ def get_gap_insights():
 def get_years():
     try:
         logging.debug("Fetching unique years from news_events.csv")
-        if not os.path.exists(EVENTS_DATA_PATH):
-            logging.error(f"Events data file not found: {EVENTS_DATA_PATH}")
-            return jsonify({'error': 'Events data file not found. Please contact support.'}), 404
         try:
-            df = pd.read_csv(EVENTS_DATA_PATH)
-            logging.debug(f"Loaded events data with shape: {df.shape}")
+            df = datasets.get('events')
+            logging.debug("Loaded events data with shape: %s", df.shape)
             if 'date' not in df.columns:
                 logging.error("Invalid events data format: missing 'date' column")
                 return jsonify({'error': 'Invalid events data format'}), 400
-            df['date'] = pd.to_datetime(df['date'])
-            years = sorted(df['date'].dt.year.unique().tolist())
-            logging.debug(f"Found years: {years}")
+            with timed_stage('filter'):
+                years = sorted(df['date'].dt.year.unique().tolist())
+            logging.debug("Found years: %s", years)
             return jsonify({'years': years})
+        except FileNotFoundError:
+            logging.error("Events data file not found: %s", EVENTS_DATA_PATH)
+            return jsonify({'error': 'Events data file not found. Please contact support.'}), 404
         except Exception as e:
-            logging.error(f"Error reading events data file {EVENTS_DATA_PATH}: {str(e)}")
+            logging.error("Error reading events data file %s: %s", EVENTS_DATA_PATH, e)
             return jsonify({'error': f'Failed to load events data: {str(e)}'}), 500
     except Exception as e:
-        logging.error(f"Error fetching years: {str(e)}")
+        logging.error("Error fetching years: %s", e)
         return jsonify({'error': 'Server error'}), 500
 
 @app.route('/api/events', methods=['GET'])
 @limiter.limit("10 per 12 hours")
+@response_cache.cached('events', version=datasets.dataset('events').token, bypass=lambda: wants_ndjson(request))
 def get_events():
     try:
-        event_type = request.args.get('event_type')
-        year = request.args.get('year')
-        logging.debug(f"Fetching events for event_type={event_type}, year={year}")
-        if not os.path.exists(EVENTS_DATA_PATH):
-            logging.error(f"Events data file not found: {EVENTS_DATA_PATH}")
-            return jsonify({'error': 'Events data file not found. Please contact support.'}), 404
+        event_type = values(request.args, 'event_type')
+        year = values(request.args, 'year')
+        logging.debug("Fetching events for event_type=%s, year=%s", event_type, year)
+        try:
+            equals, ranges = parse_event_filters(request.args)
+        except ValueError as e:
+            logging.error("Invalid events filter: %s", e)
+            return jsonify({'error': str(e)}), 400
         try:
-            df = pd.read_csv(EVENTS_DATA_PATH)
-            logging.debug(f"Loaded events data with shape: {df.shape}")
+            df = datasets.get('events')
+            logging.debug("Loaded events data with shape: %s", df.shape)
+        except FileNotFoundError:
+            logging.error("Events data file not found: %s", EVENTS_DATA_PATH)
+            return jsonify({'error': 'Events data file not found. Please contact support.'}), 404
         except Exception as e:
-            logging.error(f"Error reading events data file {EVENTS_DATA_PATH}: {str(e)}")
+            logging.error("Error reading events data file %s: %s", EVENTS_DATA_PATH, e)
             return jsonify({'error': f'Failed to load events data: {str(e)}'}), 500
         if 'date' not in df.columns or 'event_type' not in df.columns:
             logging.error("Invalid events data format: missing required columns")
             return jsonify({'error': 'Invalid events data format'}), 400
-        df['date'] = pd.to_datetime(df['date'])
-        filtered_df = df
-        if event_type:
-            filtered_df = filtered_df[filtered_df['event_type'] == event_type]
-        if year:
-            try:
-                year = int(year)
-                filtered_df = filtered_df[filtered_df['date'].dt.year == year]
-            except ValueError:
-                logging.error(f"Invalid year format: {year}")
-                return jsonify({'error': 'Invalid year format'}), 400
-        dates = filtered_df['date'].dt.strftime('%Y-%m-%d').tolist()
-        logging.debug(f"Filtered DataFrame shape: {filtered_df.shape}")
+        with timed_stage('filter'):
+            snapshot = filters['events'].snapshot()
+            dates = snapshot.labels[snapshot.select(equals, ranges)].tolist()
+        logging.debug("Matched %s event rows", len(dates))
+        if wants_ndjson(request):
+            return ndjson_response(date_rows(sorted(dates)))
         if not dates:
-            logging.debug(f"No events found for event_type={event_type}, year={year}")
+            logging.debug("No events found for event_type=%s, year=%s", event_type, year)
             return jsonify({'dates': [], 'message': 'No events found for the selected criteria'})
-        logging.debug(f"Found {len(dates)} event dates")
+        logging.debug("Found %s event dates", len(dates))
         return jsonify({'dates': sorted(dates)})
     except Exception as e:
-        logging.error(f"Error processing events: {str(e)}")
+        logging.error("Error processing events: %s", e)
         return jsonify({'error': 'Server error'}), 500
 
 @app.route('/api/economic_events', methods=['GET'])
 @limiter.limit("10 per 12 hours")
+@response_cache.cached('economic_events', version=datasets.dataset('economic').token, bypass=lambda: wants_ndjson(request))
 def get_economic_events():
     try:
-        event_type = request.args.get('event_type')
-        bin_range = request.args.get('bin')  # Renamed from 'bin' to 'bin_range' for clarity
-        logging.debug(f"Fetching economic events for event_type={event_type}, bin={bin_range}")
-        
-        if not os.path.exists(ECONOMIC_DATA_BINNED_PATH):
-            logging.error(f"Economic data binned file not found: {ECONOMIC_DATA_BINNED_PATH}")
-            return jsonify({'error': 'Economic data file not found. Please contact support.'}), 404
+        event_type = values(request.args, 'event_type')
+        bin_range = values(request.args, 'bin')  # Renamed from 'bin' to 'bin_range' for clarity
+        logging.debug("Fetching economic events for event_type=%s, bin=%s", event_type, bin_range)
+        try:
+            equals, ranges = parse_economic_filters(request.args)
+        except ValueError as e:
+            logging.error("Invalid economic filter: %s", e)
+            return jsonify({'error': str(e)}), 400
         
         try:
-            df = pd.read_csv(ECONOMIC_DATA_BINNED_PATH)
-            df['date'] = pd.to_datetime(df['date'])
-            logging.debug(f"Loaded economic data with shape: {df.shape}")
+            df = datasets.get('economic')
+            logging.debug("Loaded economic data with shape: %s", df.shape)
+        except FileNotFoundError:
+            logging.error("Economic data binned file not found: %s", ECONOMIC_DATA_BINNED_PATH)
+            return jsonify({'error': 'Economic data file not found. Please contact support.'}), 404
         except Exception as e:
-            logging.error(f"Error reading economic data file {ECONOMIC_DATA_BINNED_PATH}: {str(e)}")
+            logging.error("Error reading economic data file %s: %s", ECONOMIC_DATA_BINNED_PATH, e)
             return jsonify({'error': f'Failed to load economic data: {str(e)}'}), 500
         
         if 'date' not in df.columns or 'event_type' not in df.columns or 'bin' not in df.columns:
             logging.error("Invalid economic data format: missing required columns")
             return jsonify({'error': 'Invalid economic data format'}), 400
         
-        filtered_df = df
-        if event_type:
-            filtered_df = filtered_df[filtered_df['event_type'] == event_type]
-        if bin_range:
-            filtered_df = filtered_df[filtered_df['bin'] == bin_range]
-        
-        dates = filtered_df['date'].dt.strftime('%Y-%m-%d').tolist()
-        logging.debug(f"Filtered DataFrame shape: {filtered_df.shape}")
+        with timed_stage('filter'):
+            snapshot = filters['economic'].snapshot()
+            dates = snapshot.labels[snapshot.select(equals, ranges)].tolist()
+        logging.debug("Matched %s economic event rows", len(dates))
         
+        if wants_ndjson(request):
+            return ndjson_response(date_rows(sorted(dates)))
         if not dates:
-            logging.debug(f"No events found for event_type={event_type}, bin={bin_range}")
+            logging.debug("No events found for event_type=%s, bin=%s", event_type, bin_range)
             return jsonify({'dates': [], 'message': 'No events found for the selected criteria'})
         
-        logging.debug(f"Found {len(dates)} economic event dates")
+        logging.debug("Found %s economic event dates", len(dates))
         return jsonify({'dates': sorted(dates)})
     except Exception as e:
-        logging.error(f"Error processing economic events: {str(e)}")
+        logging.error("Error processing economic events: %s", e)
         return jsonify({'error': 'Server error'}), 500
 
 @app.route('/api/earnings', methods=['GET'])
@@ -496,76 +803,220 @@ def get_economic_events():
 def get_earnings():
     try:
         ticker = request.args.get('ticker')
-        logging.debug(f"Fetching earnings for ticker={ticker}")
-        if not os.path.exists(EARNINGS_DATA_PATH):
-            logging.error(f"Earnings data file not found: {EARNINGS_DATA_PATH}")
-            return jsonify({'error': 'Earnings data file not found. Please contact support.'}), 404
+        logging.debug("Fetching earnings for ticker=%s", ticker)
+        try:
+            equals, ranges = parse_earnings_filters(request.args)
+        except ValueError as e:
+            logging.error("Invalid earnings filter: %s", e)
+            return jsonify({'error': str(e)}), 400
         try:
-            df = pd.read_csv(EARNINGS_DATA_PATH)
-            df['earnings_date'] = pd.to_datetime(df['earnings_date'])
-            logging.debug(f"Loaded earnings data with shape: {df.shape}")
+            df = datasets.get('earnings')
+            logging.debug("Loaded earnings data with shape: %s", df.shape)
+        except FileNotFoundError:
+            logging.error("Earnings data file not found: %s", EARNINGS_DATA_PATH)
+            return jsonify({'error': 'Earnings data file not found. Please contact support.'}), 404
         except Exception as e:
-            logging.error(f"Error reading earnings data file {EARNINGS_DATA_PATH}: {str(e)}")
+            logging.error("Error reading earnings data file %s: %s", EARNINGS_DATA_PATH, e)
             return jsonify({'error': f'Failed to load earnings data: {str(e)}'}), 500
-        if 'ticker' not in df.columns or 'earnings_date' not in df.columns:
+        if 'ticker' not in df.columns or 'date' not in df.columns:
             logging.error("Invalid earnings data format: missing required columns")
             return jsonify({'error': 'Invalid earnings data format'}), 400
-        if ticker:
-            filtered_df = df[df['ticker'] == ticker]
-        else:
+        if not ticker:
             logging.error("No ticker provided for earnings query")
             return jsonify({'error': 'Ticker is required'}), 400
-        dates = filtered_df['earnings_date'].dt.strftime('%Y-%m-%d').tolist()
-        logging.debug(f"Filtered DataFrame shape: {filtered_df.shape}")
+        with timed_stage('filter'):
+            snapshot = filters['earnings'].snapshot()
+            dates = snapshot.labels[snapshot.select(equals, ranges)].tolist()
+        logging.debug("Matched %s earnings rows", len(dates))
+        if wants_ndjson(request):
+            return ndjson_response(date_rows(sorted(dates)))
         if not dates:
-            logging.debug(f"No earnings found for ticker={ticker}")
+            logging.debug("No earnings found for ticker=%s", ticker)
             return jsonify({'dates': [], 'message': f'No earnings found for {ticker}'})
-        logging.debug(f"Found {len(dates)} earnings dates")
+        logging.debug("Found %s earnings dates", len(dates))
         return jsonify({'dates': sorted(dates)})
     except Exception as e:
-        logging.error(f"Error processing earnings: {str(e)}")
+        logging.error("Error processing earnings: %s", e)
         return jsonify({'error': 'Server error'}), 500
 
 @app.route('/api/earnings_by_bin', methods=['GET'])
 @limiter.limit("10 per 12 hours")
+@response_cache.cached('earnings_by_bin', version=datasets.dataset('earnings').token, bypass=lambda: wants_ndjson(request))
 def get_earnings_by_bin():
     try:
         ticker = request.args.get('ticker')
-        bin_value = request.args.get('bin')
-        logging.debug(f"Fetching earnings for ticker={ticker}, bin={bin_value}")
-        if not os.path.exists(EARNINGS_DATA_PATH):
-            logging.error(f"Earnings data file not found: {EARNINGS_DATA_PATH}")
-            return jsonify({'error': 'Earnings data file not found. Please contact support.'}), 404
+        bin_value = values(request.args, 'bin')
+        logging.debug("Fetching earnings for ticker=%s, bin=%s", ticker, bin_value)
         try:
-            df = pd.read_csv(EARNINGS_DATA_PATH)
-            df['earnings_date'] = pd.to_datetime(df['earnings_date'])
-            logging.debug(f"Loaded earnings data with shape: {df.shape}")
+            equals, ranges = parse_earnings_filters(request.args)
+        except ValueError as e:
+            logging.error("Invalid earnings filter: %s", e)
+            return jsonify({'error': str(e)}), 400
+        try:
+            df = datasets.get('earnings')
+            logging.debug("Loaded earnings data with shape: %s", df.shape)
+        except FileNotFoundError:
+            logging.error("Earnings data file not found: %s", EARNINGS_DATA_PATH)
+            return jsonify({'error': 'Earnings data file not found. Please contact support.'}), 404
         except Exception as e:
-            logging.error(f"Error reading earnings data file {EARNINGS_DATA_PATH}: {str(e)}")
+            logging.error("Error reading earnings data file %s: %s", EARNINGS_DATA_PATH, e)
             return jsonify({'error': f'Failed to load earnings data: {str(e)}'}), 500
-        if 'ticker' not in df.columns or 'earnings_date' not in df.columns or 'bin' not in df.columns:
+        if 'ticker' not in df.columns or 'date' not in df.columns or 'bin' not in df.columns:
             logging.error("Invalid earnings data format: missing required columns")
             return jsonify({'error': 'Invalid earnings data format'}), 400
         if not ticker or not bin_value:
             logging.error("Missing ticker or bin parameter")
             return jsonify({'error': 'Ticker and bin are required'}), 400
         if ticker not in TICKERS:
-            logging.error(f"Invalid ticker requested: {ticker}")
+            logging.error("Invalid ticker requested: %s", ticker)
             return jsonify({'error': 'Invalid ticker'}), 400
-        valid_bins = ['Beat', 'Slight Beat', 'Miss', 'Slight Miss', 'Unknown']
-        if bin_value not in valid_bins:
-            logging.error(f"Invalid bin requested: {bin_value}")
+        if any(value not in EARNINGS_BINS for value in bin_value):
+            logging.error("Invalid bin requested: %s", bin_value)
             return jsonify({'error': 'Invalid bin'}), 400
-        filtered_df = df[(df['ticker'] == ticker) & (df['bin'] == bin_value)]
-        dates = filtered_df['earnings_date'].dt.strftime('%Y-%m-%d').tolist()
-        logging.debug(f"Filtered DataFrame shape: {filtered_df.shape}")
+        with timed_stage('filter'):
+            snapshot = filters['earnings'].snapshot()
+            dates = snapshot.labels[snapshot.select(equals, ranges)].tolist()
+        logging.debug("Matched %s earnings rows", len(dates))
+        if wants_ndjson(request):
+            return ndjson_response(date_rows(sorted(dates)))
         if not dates:
-            logging.debug(f"No earnings found for ticker={ticker}, bin={bin_value}")
-            return jsonify({'dates': [], 'message': f'No earnings found for {ticker} with bin {bin_value}'})
-        logging.debug(f"Found {len(dates)} earnings dates")
+            logging.debug("No earnings found for ticker=%s, bin=%s", ticker, bin_value)
+            return jsonify({'dates': [], 'message': f"No earnings found for {ticker} with bin {', '.join(bin_value)}"})
+        logging.debug("Found %s earnings dates", len(dates))
         return jsonify({'dates': sorted(dates)})
     except Exception as e:
-        logging.error(f"Error processing earnings by bin: {str(e)}")
+        logging.error("Error processing earnings by bin: %s", e)
+        return jsonify({'error': 'Server error'}), 500
+
+def earnings_insights_token():
+    # Reactions come from the candles, the bins and their labels from the two earnings files
+    return f"{candle_store.version}:{datasets.dataset('earnings').token()}:{file_mtime(EARNINGS_BINS_PATH)}"
+
+@app.route('/api/earnings_insights', methods=['GET'])
+@limiter.limit("10 per 12 hours")
+@response_cache.cached('earnings_insights', version=earnings_insights_token)
+def get_earnings_insights():
+    try:
+        ticker = request.args.get('ticker')
+        bin_value = values(request.args, 'bin')
+        logging.debug("Fetching earnings insights for ticker=%s, bin=%s", ticker, bin_value)
+        if not ticker:
+            logging.error("No ticker provided for earnings insights")
+            return jsonify({'error': 'Ticker is required'}), 400
+        if ticker not in TICKERS:
+            logging.error("Invalid ticker requested: %s", ticker)
+            return jsonify({'error': 'Invalid ticker'}), 400
+        if any(value not in EARNINGS_BINS for value in bin_value):
+            logging.error("Invalid bin requested: %s", bin_value)
+            return jsonify({'error': 'Invalid bin'}), 400
+        try:
+            equals, ranges = parse_earnings_filters(request.args)
+        except ValueError as e:
+            logging.error("Invalid earnings filter: %s", e)
+            return jsonify({'error': str(e)}), 400
+        try:
+            df = datasets.get('earnings')
+            logging.debug("Loaded earnings data with shape: %s", df.shape)
+        except FileNotFoundError:
+            logging.error("Earnings data file not found: %s", EARNINGS_DATA_PATH)
+            return jsonify({'error': 'Earnings data file not found. Please contact support.'}), 404
+        except Exception as e:
+            logging.error("Error reading earnings data file %s: %s", EARNINGS_DATA_PATH, e)
+            return jsonify({'error': f'Failed to load earnings data: {str(e)}'}), 500
+        if 'ticker' not in df.columns or 'date' not in df.columns or 'bin' not in df.columns:
+            logging.error("Invalid earnings data format: missing required columns")
+            return jsonify({'error': 'Invalid earnings data format'}), 400
+        with timed_stage('filter'):
+            if not ranges and len(bin_value) <= 1:
+                result = earnings_insights.lookup(ticker, bin_value[0] if bin_value else ANY)
+            else:
+                # Several bins or a date window: summarize only the rows the bitmaps select
+                snapshot = filters['earnings'].snapshot()
+                result = earnings_insights.summarize_rows(snapshot.frame[snapshot.select(equals, ranges)])
+        bins = earnings_insights.bins(ticker)
+        if result is None:
+            logging.debug("No earnings found for ticker=%s, bin=%s", ticker, bin_value)
+            return jsonify({'ticker': ticker, 'bins': bins, 'insights': {},
+                            'message': 'No earnings found for the selected criteria'})
+        logging.debug("Computed earnings insights: %s", result)
+        return jsonify(dict(result, ticker=ticker, bins=bins))
+    except Exception as e:
+        logging.error("Error processing earnings insights: %s", e)
+        return jsonify({'error': 'Server error'}), 500
+
+# Filters whose matching days can be aggregated, with the parser for their query parameters
+AGGREGATE_SOURCES = {
+    'gaps': parse_gap_filters,
+    'events': parse_event_filters,
+    'economic': parse_economic_filters,
+    'earnings': parse_earnings_filters
+}
+
+def aggregate_dataset(source, ticker):
+    return gap_dataset_name(ticker) if source == 'gaps' else source
+
+def aggregate_token():
+    # Both the candles and the filtered dataset feed the result
+    source = request.args.get('source')
+    if source not in AGGREGATE_SOURCES:
+        return None
+    name = aggregate_dataset(source, request.args.get('ticker'))
+    if name not in datasets.names():
+        return None
+    return f"{candle_store.version}:{datasets.dataset(name).token()}"
+
+@app.route('/api/stock/aggregate', methods=['GET'])
+@limiter.limit("10 per 12 hours", deduct_when=lambda response: response.status_code != 304)
+@response_cache.cached('aggregate', version=aggregate_token,
+                       variant=lambda: choose_encoding(request.accept_encodings))
+def get_aggregate():
+    try:
+        ticker = request.args.get('ticker')
+        source = request.args.get('source')
+        base = request.args.get('base', 'open')
+        logging.debug("Aggregating %s days for ticker=%s, base=%s", source, ticker, base)
+        if not ticker or ticker not in TICKERS:
+            return jsonify({'error': 'Missing or invalid ticker'}), 400
+        if source not in AGGREGATE_SOURCES:
+            return jsonify({'error': f'Invalid source, expected one of {list(AGGREGATE_SOURCES)}'}), 400
+        if base not in AGGREGATE_BASES:
+            return jsonify({'error': f'Invalid base, expected one of {list(AGGREGATE_BASES)}'}), 400
+        try:
+            equals, ranges = AGGREGATE_SOURCES[source](request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if not get_db_paths(ticker):
+            return jsonify({'error': f'No database available for {ticker}'}), 404
+        dataset = aggregate_dataset(source, ticker)
+        try:
+            with timed_stage('filter'):
+                snapshot = filters[dataset].snapshot()
+                labels = snapshot.labels[snapshot.select(equals, ranges)]
+                matched = sorted({label for label in labels if isinstance(label, str)})
+        except FileNotFoundError:
+            logging.error("Data file not found: %s", datasets.dataset(dataset).path)
+            return jsonify({'error': 'Data file not found. Please contact support.'}), 404
+        trading_days = candle_store.catalog.get_dates(ticker)
+        available = set(trading_days)
+        dates = [date for date in matched if date in available]
+        if not dates:
+            return jsonify({'error': f'No {ticker} trading days match the selected criteria'}), 404
+        if len(dates) > MAX_AGGREGATE_DAYS:
+            return jsonify({'error': f'Aggregation is limited to {MAX_AGGREGATE_DAYS} days, narrow the filter'}), 400
+        previous = previous_days(trading_days, dates) if base == 'prev_close' else {}
+        try:
+            # Matched days and, for prev_close, the sessions before them in one query per partition
+            candles = candle_store.fetch_days(ticker, dates + [day for day in previous.values() if day])
+        except Exception as e:
+            logging.error("Error querying database for %s: %s", ticker, e)
+            return jsonify({'error': 'Database query failed'}), 500
+        with timed_stage('aggregate'):
+            result = aggregate_paths(candles, dates, previous, base)
+        result.update(ticker=ticker, source=source, matched=len(matched))
+        logging.debug("Aggregated %s of %s matched days", result['days'], len(matched))
+        return cached_json_response(result, request)
+    except Exception as e:
+        logging.error("Error aggregating intraday paths: %s", e)
         return jsonify({'error': 'Server error'}), 500
 
 if __name__ == '__main__':
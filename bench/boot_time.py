@@ -0,0 +1,61 @@
+"""Measure how long `import app` takes in a fresh interpreter, with and without a startup manifest.
+
+Usage: python bench/boot_time.py [--runs 5] [--app-dir .]
+Each run imports the app in a new subprocess with WARM_UP=off. Results are printed as JSON.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SNIPPET = "import time; started = time.perf_counter(); import app; print(time.perf_counter() - started)"
+
+
+def boot_once(app_dir, env):
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', SNIPPET], cwd=app_dir, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return float(output.strip().splitlines()[-1]), time.perf_counter() - started
+
+
+def summarize(samples):
+    return {
+        'median_s': round(statistics.median(samples), 4),
+        'min_s': round(min(samples), 4),
+        'max_s': round(max(samples), 4)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--app-dir', default=os.path.join(os.path.dirname(__file__), '..'))
+    args = parser.parse_args()
+    app_dir = os.path.abspath(args.app_dir)
+    manifest_path = os.path.join(app_dir, 'bench-startup-manifest.json')
+    env = dict(os.environ, WARM_UP='off', STARTUP_MANIFEST_PATH=manifest_path)
+    results = {}
+    cold_import, cold_process = [], []
+    for _ in range(args.runs):
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        import_s, process_s = boot_once(app_dir, env)
+        cold_import.append(import_s)
+        cold_process.append(process_s)
+    results['without_manifest'] = {'import': summarize(cold_import), 'process': summarize(cold_process)}
+    warm_import, warm_process = [], []
+    for _ in range(args.runs):
+        import_s, process_s = boot_once(app_dir, env)
+        warm_import.append(import_s)
+        warm_process.append(process_s)
+    results['with_manifest'] = {'import': summarize(warm_import), 'process': summarize(warm_process)}
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Compare the default chart JSON with format=compact: bytes on the wire and serialization time.
+
+Usage: python bench/chart_payload_bench.py [--db PATH --ticker QQQ --date 2024-01-02] [--repeat 200]
+Without --db a synthetic 391-bar regular session is used. Results are printed as JSON.
+"""
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from chart_payload import encode_chart_compact, encode_chart_json  # noqa: E402
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def synthetic_day(date, bars=391, seed=0):
+    rng = np.random.default_rng(seed)
+    timestamps = pd.date_range(f"{date} 09:30:00", periods=bars, freq='min')
+    close = np.round(400 + np.cumsum(rng.normal(0, 0.15, bars)), 2)
+    open_ = np.r_[close[0], close[:-1]]
+    return pd.DataFrame({
+        'timestamp': timestamps,
+        'open': open_,
+        'high': np.round(np.maximum(open_, close) + rng.uniform(0, 0.1, bars), 2),
+        'low': np.round(np.minimum(open_, close) - rng.uniform(0, 0.1, bars), 2),
+        'close': close,
+        'volume': rng.integers(10000, 500000, bars).astype('float64')
+    })
+
+
+def load_day(db_path, ticker, date):
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        end = str((pd.Timestamp(date) + pd.Timedelta(days=1)).date())
+        return pd.read_sql_query(
+            "SELECT timestamp, open, high, low, close, volume FROM candles "
+            "WHERE ticker = ? AND timestamp >= ? AND timestamp < ? ORDER BY timestamp",
+            conn, params=(ticker, date, end), parse_dates=['timestamp'])
+    finally:
+        conn.close()
+
+
+def measure(encoder, df, ticker, date, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        body = json.dumps({'chart_data': encoder(df, ticker, date)}, separators=(',', ':')).encode('utf-8')
+    serialize_ms = (time.perf_counter() - started) * 1000 / repeat
+    started = time.perf_counter()
+    for _ in range(repeat):
+        gzipped = gzip.compress(body, compresslevel=6, mtime=0)
+    gzip_ms = (time.perf_counter() - started) * 1000 / repeat
+    result = {
+        'serialize_ms': round(serialize_ms, 3),
+        'raw_bytes': len(body),
+        'gzip_bytes': len(gzipped),
+        'gzip_ms': round(gzip_ms, 3)
+    }
+    if brotli is not None:
+        result['br_bytes'] = len(brotli.compress(body, quality=5))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db')
+    parser.add_argument('--ticker', default='QQQ')
+    parser.add_argument('--date', default='2024-01-02')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+    df = load_day(args.db, args.ticker, args.date) if args.db else synthetic_day(args.date)
+    if df.empty:
+        sys.exit(f"No candles for {args.ticker} on {args.date}")
+    results = {
+        'bars': len(df),
+        'json': measure(encode_chart_json, df, args.ticker, args.date, args.repeat),
+        'compact': measure(encode_chart_compact, df, args.ticker, args.date, args.repeat)
+    }
+    results['compact_vs_json_raw'] = round(results['compact']['raw_bytes'] / results['json']['raw_bytes'], 3)
+    results['compact_vs_json_gzip'] = round(results['compact']['gzip_bytes'] / results['json']['gzip_bytes'], 3)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
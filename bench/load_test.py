@@ -0,0 +1,272 @@
+"""Latency percentiles and throughput for every API route, measured against synthetic data.
+
+Usage: python bench/load_test.py [--data-dir DIR] [--days 250] [--scale 4] [--requests 100]
+                                 [--workers 4] [--duration 10] [--url URL] [--no-response-cache]
+                                 [--output results.json]
+Unless --data-dir already holds a synthetic.json, data is generated there with bench/synthetic_data.py.
+The app is imported with DATA_DIR pointing at it and RATELIMIT_ENABLED=0, then measured twice:
+  client  --requests sequential calls per route through the Flask test client (no HTTP)
+  load    --workers processes sending HTTP requests for --duration seconds to a local threaded
+          server, or to --url (e.g. a gunicorn started with the same environment)
+Results are printed as JSON (and written to --output) so runs can be diffed across commits.
+"""
+import argparse
+import datetime
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import numpy as np
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import synthetic_data  # noqa: E402
+
+ACCEPT_ENCODING = 'gzip, br'
+PERCENTILES = [50, 90, 99]
+
+
+def quote(value):
+    return urllib.parse.quote(str(value), safe='')
+
+
+def build_scenarios(data_dir, summary, count, seed):
+    # route name -> list of request paths, sampled from the generated data
+    rng = random.Random(seed)
+    tickers = summary['tickers']
+    days = [str(day.date()) for day in synthetic_data.trading_days(summary['days'], summary['last_day'])]
+    gap_columns = ['gap_size_bin', 'day_of_week', 'gap_direction']
+    gaps = pd.read_csv(os.path.join(data_dir, 'qqq_central_data_updated.csv'), usecols=gap_columns)
+    gap_keys = list(gaps[gap_columns].dropna().drop_duplicates().itertuples(index=False))
+    economic = pd.read_csv(os.path.join(data_dir, 'economic_data_binned.csv'), usecols=['event_type', 'bin'])
+    economic_keys = list(economic[['event_type', 'bin']].dropna().drop_duplicates().itertuples(index=False))
+    events = pd.read_csv(os.path.join(data_dir, 'news_events.csv'), usecols=['date', 'event_type'])
+    event_types = sorted(events['event_type'].dropna().unique())
+    years = sorted(pd.to_datetime(events['date']).dt.year.unique())
+    earnings = pd.read_csv(os.path.join(data_dir, 'earnings_data_binned.csv'), usecols=['ticker', 'bin'])
+    earnings_keys = list(earnings[['ticker', 'bin']].dropna().drop_duplicates().itertuples(index=False))
+
+    def sample(make):
+        return [make() for _ in range(count)]
+
+    def gap_query():
+        size, day, direction = rng.choice(gap_keys)
+        return f"gap_size={quote(size)}&day={quote(day)}&gap_direction={quote(direction)}"
+
+    def range_path(span, interval):
+        start = rng.randrange(max(len(days) - span, 1))
+        end = min(start + span, len(days) - 1)
+        return (f"/api/stock/range?ticker={rng.choice(tickers)}&start={days[start]}&end={days[end]}"
+                f"&interval={interval}&format=compact")
+
+    def batch_path():
+        pairs = ','.join(f"{rng.choice(tickers)}:{rng.choice(days)}" for _ in range(10))
+        return f"/api/stock/batch?pairs={pairs}&interval=5m&format=compact"
+
+    return {
+        'index': ['/'] * count,
+        'tickers': ['/api/tickers'] * count,
+        'valid_dates': sample(lambda: f"/api/valid_dates?ticker={rng.choice(tickers)}&format=bitmap"),
+        'chart': sample(lambda: f"/api/stock/chart?ticker={rng.choice(tickers)}&date={rng.choice(days)}"),
+        'chart_compact': sample(
+            lambda: f"/api/stock/chart?ticker={rng.choice(tickers)}&date={rng.choice(days)}&format=compact"),
+        'range_5m_week': sample(lambda: range_path(5, '5m')),
+        'range_1d_quarter': sample(lambda: range_path(63, '1d')),
+        'batch_10_days': sample(batch_path),
+        'gaps': sample(lambda: f"/api/gaps?{gap_query()}"),
+        'gap_insights': sample(lambda: f"/api/gap_insights?{gap_query()}"),
+        'years': ['/api/years'] * count,
+        'events': sample(lambda: f"/api/events?event_type={quote(rng.choice(event_types))}&year={rng.choice(years)}"),
+        'economic_events': sample(
+            lambda: "/api/economic_events?event_type={}&bin={}".format(*map(quote, rng.choice(economic_keys)))),
+        'earnings': sample(lambda: f"/api/earnings?ticker={quote(rng.choice(earnings_keys)[0])}"),
+        'earnings_by_bin': sample(
+            lambda: "/api/earnings_by_bin?ticker={}&bin={}".format(*map(quote, rng.choice(earnings_keys)))),
+        'earnings_insights': sample(
+            lambda: "/api/earnings_insights?ticker={}&bin={}".format(*map(quote, rng.choice(earnings_keys))))
+    }
+
+
+def summarize(samples, elapsed=None):
+    latencies = np.array([latency for latency, _, _ in samples]) * 1000
+    statuses = [status for _, status, _ in samples]
+    result = {
+        'requests': len(samples),
+        'errors': sum(1 for status in statuses if status >= 400),
+        'mean_ms': round(float(latencies.mean()), 3) if len(samples) else None
+    }
+    for percentile in PERCENTILES:
+        result[f'p{percentile}_ms'] = round(float(np.percentile(latencies, percentile)), 3) if len(samples) else None
+    result['mean_bytes'] = round(float(np.mean([size for _, _, size in samples])), 1) if samples else None
+    if elapsed:
+        result['throughput_rps'] = round(len(samples) / elapsed, 2)
+    return result
+
+
+def run_client(app, scenarios):
+    client = app.test_client()
+    results = {}
+    for name, paths in scenarios.items():
+        # One untimed request first so lazy loads are not attributed to the route
+        client.get(paths[0], headers={'Accept-Encoding': ACCEPT_ENCODING})
+        samples = []
+        started = time.perf_counter()
+        for path in paths:
+            request_started = time.perf_counter()
+            response = client.get(path, headers={'Accept-Encoding': ACCEPT_ENCODING})
+            body = response.get_data()
+            samples.append((time.perf_counter() - request_started, response.status_code, len(body)))
+        results[name] = summarize(samples, time.perf_counter() - started)
+    return results
+
+
+def load_worker(base_url, requests, duration, seed, queue):
+    # Requests drawn at random from every scenario until the deadline; runs in its own process
+    rng = random.Random(seed)
+    samples = []
+    started_at = time.perf_counter()
+    deadline = started_at + duration
+    while time.perf_counter() < deadline:
+        name, path = rng.choice(requests)
+        request = urllib.request.Request(base_url + path, headers={'Accept-Encoding': ACCEPT_ENCODING})
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                status, size = response.status, len(response.read())
+        except urllib.error.HTTPError as e:
+            status, size = e.code, len(e.read())
+        except OSError:
+            status, size = 599, 0
+        samples.append((name, time.perf_counter() - started, status, size))
+    queue.put((samples, time.perf_counter() - started_at))
+
+
+def serve_in_thread(app):
+    from werkzeug.serving import make_server
+    # Per-request access logs would dominate the measurement
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='load-test-server', daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def run_load(base_url, scenarios, workers, duration, seed):
+    requests = [(name, path) for name, paths in scenarios.items() for path in paths]
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    processes = [context.Process(target=load_worker, args=(base_url, requests, duration, seed + number, queue))
+                 for number in range(workers)]
+    for process in processes:
+        process.start()
+    samples = []
+    elapsed = 0.0
+    for _ in processes:
+        worker_samples, worker_elapsed = queue.get()
+        samples.extend(worker_samples)
+        # Throughput over the measured window only, excluding process start-up
+        elapsed = max(elapsed, worker_elapsed)
+    for process in processes:
+        process.join()
+    by_route = {}
+    for name, latency, status, size in samples:
+        by_route.setdefault(name, []).append((latency, status, size))
+    results = {name: summarize(by_route[name], elapsed) for name in scenarios if name in by_route}
+    results['all'] = summarize([(latency, status, size) for _, latency, status, size in samples], elapsed)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=APP_DIR, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'onemchart-bench-data'))
+    parser.add_argument('--days', type=int, default=250)
+    parser.add_argument('--tickers', default='QQQ,AAPL,MSFT')
+    parser.add_argument('--scale', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=100, help='requests per route')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds of load per worker')
+    parser.add_argument('--url', help='benchmark a running server instead of a local threaded one')
+    parser.add_argument('--no-response-cache', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    data_dir = os.path.abspath(args.data_dir)
+    summary_path = os.path.join(data_dir, 'synthetic.json')
+    if os.path.exists(summary_path):
+        with open(summary_path) as f:
+            summary = json.load(f)
+    else:
+        tickers = [ticker.strip().upper() for ticker in args.tickers.split(',') if ticker.strip()]
+        summary = synthetic_data.generate(data_dir, args.days, tickers, args.scale, args.seed)
+
+    os.environ.update({
+        'DATA_DIR': data_dir,
+        'STARTUP_MANIFEST_PATH': os.path.join(data_dir, 'db', 'startup_manifest.json'),
+        'RATELIMIT_ENABLED': '0',
+        'WARM_UP': 'sync',
+        'LOG_LEVEL': os.environ.get('LOG_LEVEL', 'WARNING')
+    })
+    if args.no_response_cache:
+        os.environ['RESPONSE_CACHE_ENABLED'] = '0'
+    sys.path.insert(0, APP_DIR)
+    started = time.perf_counter()
+    import app as app_module
+    boot_s = time.perf_counter() - started
+
+    scenarios = build_scenarios(data_dir, summary, args.requests, args.seed)
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'started_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'args': vars(args),
+            'data': summary,
+            'response_cache': app_module.response_cache.enabled,
+            'boot_s': round(boot_s, 3)
+        },
+        'client': run_client(app_module.app, scenarios)
+    }
+    server = None
+    base_url = args.url
+    if not base_url:
+        server, base_url = serve_in_thread(app_module.app)
+    try:
+        results['load'] = run_load(base_url.rstrip('/'), scenarios, args.workers, args.duration, args.seed)
+    finally:
+        if server is not None:
+            server.shutdown()
+    results['meta']['target'] = 'external' if args.url else 'threaded'
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
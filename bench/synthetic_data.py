@@ -0,0 +1,169 @@
+"""Generate a synthetic data directory for benchmarks: minute-bar candle databases and scaled-up CSVs.
+
+Usage: python bench/synthetic_data.py OUT_DIR [--days 250] [--tickers QQQ,AAPL,MSFT] [--scale 4] [--seed 0]
+OUT_DIR gets the CSV datasets from data/ repeated --scale times (earlier copies shifted back in time) and
+OUT_DIR/db gets one `candles` database per ticker, with QQQ split into three stock_data_qqq_part<N>.db files.
+Point the app at it with DATA_DIR=OUT_DIR. A summary is written to OUT_DIR/synthetic.json and printed.
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import sys
+
+import numpy as np
+import pandas as pd
+
+SOURCE_DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
+BARS_PER_DAY = 391
+CANDLES_SCHEMA = ("CREATE TABLE candles (ticker TEXT, timestamp TEXT, open REAL, high REAL, low REAL, "
+                  "close REAL, volume INTEGER)")
+QQQ_PARTS = 3
+# Date columns shifted for each extra copy of a CSV, and how they are written
+CSV_DATE_COLUMNS = {
+    'qqq_central_data_updated.csv': {'date': 'iso', 'timestamp': 'iso', 'fill_time': 'iso', 'exit_time': 'iso'},
+    'news_events.csv': {'date': 'iso'},
+    'economic_data_binned.csv': {'date': 'iso'},
+    'earnings_data.csv': {'earnings_date': 'dmy'},
+    'earnings_data_binned.csv': {'date': 'iso'}
+}
+
+
+def trading_days(days, end=None):
+    end = pd.Timestamp(end or pd.Timestamp.today().normalize() - pd.Timedelta(days=1))
+    return pd.bdate_range(end=end, periods=days)
+
+
+def candle_rows(ticker, days, rng):
+    # Random-walk regular sessions, 09:30 to 16:00 inclusive
+    offsets = pd.to_timedelta(np.arange(BARS_PER_DAY), unit='min') + pd.Timedelta(hours=9, minutes=30)
+    timestamps = (np.repeat(days.values, BARS_PER_DAY) + np.tile(offsets.values, len(days)))
+    count = len(timestamps)
+    close = np.round(100 + np.cumsum(rng.normal(0, 0.05, count)), 4)
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.round(np.maximum(open_, close) + rng.uniform(0, 0.05, count), 4)
+    low = np.round(np.minimum(open_, close) - rng.uniform(0, 0.05, count), 4)
+    volume = rng.integers(1000, 500000, count)
+    return zip(
+        [ticker] * count,
+        pd.DatetimeIndex(timestamps).strftime('%Y-%m-%d %H:%M:%S'),
+        open_.tolist(), high.tolist(), low.tolist(), close.tolist(), volume.tolist()
+    )
+
+
+def write_candles(path, ticker, days, rng):
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute(CANDLES_SCHEMA)
+        conn.executemany("INSERT INTO candles VALUES (?, ?, ?, ?, ?, ?, ?)", candle_rows(ticker, days, rng))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def write_databases(db_dir, tickers, days, seed):
+    os.makedirs(db_dir, exist_ok=True)
+    files = {}
+    for number, ticker in enumerate(tickers):
+        rng = np.random.default_rng(seed + number)
+        if ticker == 'QQQ':
+            parts = np.array_split(np.arange(len(days)), QQQ_PARTS)
+            files[ticker] = []
+            for part, positions in enumerate(parts, start=1):
+                path = os.path.join(db_dir, f"stock_data_qqq_part{part}.db")
+                write_candles(path, ticker, days[positions], rng)
+                files[ticker].append(os.path.basename(path))
+        else:
+            path = os.path.join(db_dir, f"stock_data_{ticker.lower()}.db")
+            write_candles(path, ticker, days, rng)
+            files[ticker] = [os.path.basename(path)]
+    return files
+
+
+def shift_years(values, years, style):
+    # Whole years keep month/day valid; callers pass a multiple of 4 so 29 February survives
+    values = values.astype('string')
+    if style == 'dmy':
+        day_month, year = values.str[:-4], pd.to_numeric(values.str[-4:], errors='coerce')
+        return (day_month + (year - years).astype('Int64').astype('string')).where(values.notna())
+    year, rest = pd.to_numeric(values.str[:4], errors='coerce'), values.str[4:]
+    return ((year - years).astype('Int64').astype('string') + rest).where(values.notna())
+
+
+def year_span(df, columns):
+    years = []
+    for column, style in columns.items():
+        if column not in df.columns:
+            continue
+        values = df[column].dropna().astype('string')
+        values = values.str[-4:] if style == 'dmy' else values.str[:4]
+        years.extend(pd.to_numeric(values, errors='coerce').dropna().astype(int).tolist())
+    span = (max(years) - min(years) + 1) if years else 1
+    return span + (-span % 4)
+
+
+def write_csvs(out_dir, scale):
+    rows = {}
+    for filename in sorted(os.listdir(SOURCE_DATA_DIR)):
+        source = os.path.join(SOURCE_DATA_DIR, filename)
+        if not os.path.isfile(source) or filename.endswith('.arrow'):
+            continue
+        target = os.path.join(out_dir, filename)
+        if filename not in CSV_DATE_COLUMNS:
+            shutil.copyfile(source, target)
+            continue
+        df = pd.read_csv(source, dtype='string', keep_default_na=False, na_values=[''])
+        columns = CSV_DATE_COLUMNS[filename]
+        span = year_span(df, columns)
+        copies = []
+        for copy in range(scale):
+            shifted = df.copy()
+            for column, style in columns.items():
+                if column in shifted.columns and copy:
+                    shifted[column] = shift_years(shifted[column], span * copy, style)
+            copies.append(shifted)
+        scaled = pd.concat(copies, ignore_index=True)
+        scaled.to_csv(target, index=False)
+        rows[filename] = len(scaled)
+    return rows
+
+
+def generate(out_dir, days=250, tickers=('QQQ', 'AAPL', 'MSFT'), scale=4, seed=0):
+    os.makedirs(out_dir, exist_ok=True)
+    sessions = trading_days(days)
+    summary = {
+        'tickers': list(tickers),
+        'days': days,
+        'first_day': str(sessions[0].date()),
+        'last_day': str(sessions[-1].date()),
+        'bars_per_day': BARS_PER_DAY,
+        'scale': scale,
+        'seed': seed,
+        'databases': write_databases(os.path.join(out_dir, 'db'), tickers, sessions, seed),
+        'csv_rows': write_csvs(out_dir, scale)
+    }
+    with open(os.path.join(out_dir, 'synthetic.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('out_dir')
+    parser.add_argument('--days', type=int, default=250)
+    parser.add_argument('--tickers', default='QQQ,AAPL,MSFT')
+    parser.add_argument('--scale', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    tickers = [ticker.strip().upper() for ticker in args.tickers.split(',') if ticker.strip()]
+    if args.days < 1 or args.scale < 1 or not tickers:
+        sys.exit('--days and --scale must be positive and --tickers non-empty')
+    summary = generate(args.out_dir, args.days, tickers, args.scale, args.seed)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    main()
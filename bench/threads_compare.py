@@ -0,0 +1,136 @@
+"""Requests/sec and latency percentiles of the chart routes under sync and threaded gunicorn workers.
+
+Usage: python bench/threads_compare.py [--data-dir DIR] [--workers 2] [--threads 8] [--clients 16]
+                                       [--duration 10] [--requests 100] [--output results.json]
+Both servers are started from gunicorn.conf.py with the same environment (synthetic data from
+bench/synthetic_data.py, RATELIMIT_ENABLED=0) and --workers processes:
+  sync     GUNICORN_THREADS=1 (one request at a time per worker)
+  gthread  GUNICORN_THREADS=--threads (handler threads per worker)
+Each is loaded by --clients processes for --duration seconds with chart, range and batch requests.
+Results are printed as JSON (and written to --output).
+"""
+import argparse
+import datetime
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import load_test  # noqa: E402
+import synthetic_data  # noqa: E402
+
+CHART_SCENARIOS = ['chart', 'chart_compact', 'range_5m_week', 'batch_10_days']
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(base_url, process, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with {process.returncode}")
+        try:
+            with urllib.request.urlopen(base_url + '/api/tickers', timeout=5):
+                return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.5)
+    raise RuntimeError(f"Server at {base_url} did not start within {timeout}s")
+
+
+def run_server(threads, env, scenarios, clients, duration, seed):
+    port = free_port()
+    server_env = dict(env, GUNICORN_BIND=f'127.0.0.1:{port}', GUNICORN_THREADS=str(threads))
+    command = [sys.executable, '-m', 'gunicorn', '-c', os.path.join(APP_DIR, 'gunicorn.conf.py'), 'app:app']
+    process = subprocess.Popen(command, cwd=APP_DIR, env=server_env)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        wait_until_ready(base_url, process)
+        # One pass over every path first so lazy loads are not attributed to either server
+        for paths in scenarios.values():
+            for path in paths[:5]:
+                try:
+                    with urllib.request.urlopen(base_url + path, timeout=60) as response:
+                        response.read()
+                except urllib.error.HTTPError:
+                    pass
+        return load_test.run_load(base_url, scenarios, clients, duration, seed)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'onemchart-bench-data'))
+    parser.add_argument('--days', type=int, default=250)
+    parser.add_argument('--tickers', default='QQQ,AAPL,MSFT')
+    parser.add_argument('--scale', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=100, help='distinct paths per route')
+    parser.add_argument('--workers', type=int, default=2, help='server processes for both modes')
+    parser.add_argument('--threads', type=int, default=8, help='handler threads per gthread worker')
+    parser.add_argument('--clients', type=int, default=16, help='concurrent client processes')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds of load per client')
+    parser.add_argument('--modes', default='sync,gthread')
+    parser.add_argument('--no-response-cache', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    data_dir = os.path.abspath(args.data_dir)
+    summary_path = os.path.join(data_dir, 'synthetic.json')
+    if os.path.exists(summary_path):
+        with open(summary_path) as f:
+            summary = json.load(f)
+    else:
+        tickers = [ticker.strip().upper() for ticker in args.tickers.split(',') if ticker.strip()]
+        summary = synthetic_data.generate(data_dir, args.days, tickers, args.scale, args.seed)
+
+    env = dict(os.environ, DATA_DIR=data_dir, RATELIMIT_ENABLED='0', WARM_UP='sync',
+               WEB_CONCURRENCY=str(args.workers), LOG_LEVEL=os.environ.get('LOG_LEVEL', 'WARNING'),
+               STARTUP_MANIFEST_PATH=os.path.join(data_dir, 'db', 'startup_manifest.json'))
+    if args.no_response_cache:
+        env['RESPONSE_CACHE_ENABLED'] = '0'
+    scenarios = load_test.build_scenarios(data_dir, summary, args.requests, args.seed)
+    scenarios = {name: scenarios[name] for name in CHART_SCENARIOS}
+
+    results = {
+        'meta': {
+            'commit': load_test.git_commit(),
+            'started_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'cpus': os.cpu_count(),
+            'args': vars(args),
+            'data': summary
+        }
+    }
+    for mode in args.modes.split(','):
+        threads = args.threads if mode == 'gthread' else 1
+        results[mode] = run_server(threads, env, scenarios, args.clients, args.duration, args.seed)
+    if 'sync' in results and 'gthread' in results:
+        sync_all, gthread_all = results['sync']['all'], results['gthread']['all']
+        results['comparison'] = {
+            'throughput_ratio': round(gthread_all['throughput_rps'] / sync_all['throughput_rps'], 3),
+            'p99_ratio': round(gthread_all['p99_ms'] / sync_all['p99_ms'], 3)
+        }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Measure the memory and cold import time of one app worker, and which heavy libraries it loads.
+
+Usage: python bench/worker_footprint.py [--runs 3] [--app-dir .] [--host-mb 2048]
+Each run imports the app in a new subprocess, then serves the lookup routes (/api/tickers,
+/api/valid_dates) and finally one analytics route (/api/gaps) through the Flask test client,
+recording RSS, USS (private memory) and the loaded libraries after every phase. Run it once per
+WARM_UP mode to compare; results are printed as JSON.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ['numpy', 'pandas', 'pyarrow', 'matplotlib', 'mplfinance', 'sqlalchemy']
+
+SNIPPET = r"""
+import json, sys, time
+HEAVY_MODULES = %r
+
+def memory():
+    values = {}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                key, _, rest = line.partition(':')
+                if key in ('Rss', 'Pss', 'Private_Clean', 'Private_Dirty'):
+                    values[key] = int(rest.split()[0]) / 1024
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        return {'rss_mb': round(peak, 1), 'uss_mb': None}
+    return {'rss_mb': round(values['Rss'], 1),
+            'uss_mb': round(values['Private_Clean'] + values['Private_Dirty'], 1)}
+
+def phase():
+    return dict(memory(), loaded=[name for name in HEAVY_MODULES if name in sys.modules])
+
+started = time.perf_counter()
+import app
+result = {'import_s': time.perf_counter() - started, 'after_import': phase()}
+client = app.app.test_client()
+client.get('/api/tickers')
+for ticker in app.VALID_TICKERS:
+    client.get('/api/valid_dates?ticker=' + ticker)
+    client.get('/api/valid_dates?ticker=' + ticker + '&format=bitmap')
+result['after_lookups'] = phase()
+client.get('/api/gaps?gap_size=any&day=any&gap_direction=any')
+result['after_analytics'] = phase()
+print(json.dumps(result))
+""" % (HEAVY_MODULES,)
+
+
+def run_once(app_dir, env):
+    output = subprocess.run([sys.executable, '-c', SNIPPET], cwd=app_dir, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def median(samples, phase, key):
+    values = [sample[phase][key] for sample in samples if sample[phase][key] is not None]
+    return round(statistics.median(values), 1) if values else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--app-dir', default=os.path.join(os.path.dirname(__file__), '..'))
+    parser.add_argument('--host-mb', type=float, default=None,
+                        help='Memory budget for workers; reports how many fit at each phase')
+    args = parser.parse_args()
+    app_dir = os.path.abspath(args.app_dir)
+    env = dict(os.environ, RATELIMIT_ENABLED='0')
+    env.setdefault('WARM_UP', 'off')
+    samples = [run_once(app_dir, env) for _ in range(args.runs)]
+    imports = [sample['import_s'] for sample in samples]
+    results = {
+        'warm_up': env['WARM_UP'],
+        'import': {
+            'median_s': round(statistics.median(imports), 4),
+            'min_s': round(min(imports), 4),
+            'max_s': round(max(imports), 4)
+        }
+    }
+    for phase in ('after_import', 'after_lookups', 'after_analytics'):
+        results[phase] = {
+            'rss_mb': median(samples, phase, 'rss_mb'),
+            'uss_mb': median(samples, phase, 'uss_mb'),
+            'loaded': samples[-1][phase]['loaded']
+        }
+        if args.host_mb:
+            # RSS counts pages shared with a preloading master, so this is the pessimistic bound
+            results[phase]['workers_per_host'] = int(args.host_mb // results[phase]['rss_mb'])
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
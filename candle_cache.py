@@ -0,0 +1,239 @@
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from candle_store import (CANDLE_COLUMNS, day_bounds, discover_partitions, discover_tickers, files_version,
+                          merge_sorted_frames)
+from manifest import create_temp_dir
+
+# How often (seconds) a ticker's cache re-checks its DB files; a stale cache is bypassed and rebuilt
+CANDLE_CACHE_CHECK_INTERVAL = float(os.environ.get('CANDLE_CACHE_CHECK_INTERVAL', '5'))
+CACHE_FORMAT = 1
+EXPORT_QUERY = """
+    SELECT timestamp, open, high, low, close, volume
+    FROM candles
+    WHERE ticker = ?
+    ORDER BY timestamp
+"""
+
+
+def cache_directory(cache_dir, ticker, signature):
+    # One directory per DB version, so a rebuild never touches files other workers have mapped
+    return os.path.join(cache_dir, f"{ticker.lower()}-{signature}")
+
+
+def export_ticker(cache_dir, ticker, paths):
+    # SQLite -> one .npy per column (timestamps as datetime64[ns]) plus the per-day offset index
+    import pandas as pd
+    signature = files_version(paths)
+    target = cache_directory(cache_dir, ticker, signature)
+    if os.path.exists(os.path.join(target, 'meta.json')):
+        return target
+    frames = []
+    for path in paths:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            frames.append(pd.read_sql_query(EXPORT_QUERY, conn, params=(ticker,), parse_dates=['timestamp']))
+        finally:
+            conn.close()
+    df = merge_sorted_frames(frames, CANDLE_COLUMNS)
+    if df.empty:
+        raise ValueError(f"No candles for {ticker}")
+    if df['timestamp'].dt.tz is not None:
+        raise ValueError(f"Timezone-aware timestamps for {ticker} are not cached")
+    timestamps = df['timestamp'].to_numpy(dtype='datetime64[ns]')
+    days = timestamps.astype('datetime64[D]')
+    starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+
+    os.makedirs(cache_dir, exist_ok=True)
+    # Not mkdtemp: its 0700 would hide the export from workers when `python candle_cache.py` runs as another user
+    staging = create_temp_dir(cache_dir, f".{ticker.lower()}-")
+    try:
+        np.save(os.path.join(staging, 'timestamp.npy'), timestamps)
+        for column in CANDLE_COLUMNS[1:]:
+            np.save(os.path.join(staging, f'{column}.npy'), df[column].to_numpy())
+        np.save(os.path.join(staging, 'days.npy'), days[starts])
+        np.save(os.path.join(staging, 'offsets.npy'), np.r_[starts, len(df)].astype('int64'))
+        with open(os.path.join(staging, 'meta.json'), 'w') as f:
+            json.dump({'format': CACHE_FORMAT, 'ticker': ticker, 'signature': signature,
+                       'rows': len(df), 'days': len(starts)}, f)
+        os.rename(staging, target)
+    except OSError:
+        shutil.rmtree(staging, ignore_errors=True)
+        # Another process finished the same export first
+        if os.path.exists(os.path.join(target, 'meta.json')):
+            return target
+        raise
+    return target
+
+
+def remove_stale(cache_dir, ticker, keep):
+    prefix = f"{ticker.lower()}-"
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name.startswith(prefix) and path != keep:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+class TickerCache:
+    def __init__(self, directory):
+        with open(os.path.join(directory, 'meta.json')) as f:
+            self.meta = json.load(f)
+        if self.meta.get('format') != CACHE_FORMAT:
+            raise ValueError(f"Unsupported candle cache format in {directory}")
+        self.directory = directory
+        # Read-only mappings: every worker shares the same pages
+        self.columns = {column: np.load(os.path.join(directory, f'{column}.npy'), mmap_mode='r').view(np.ndarray)
+                        for column in CANDLE_COLUMNS}
+        self.offsets = np.load(os.path.join(directory, 'offsets.npy'))
+        days = np.load(os.path.join(directory, 'days.npy'))
+        self.day_index = {str(day): position for position, day in enumerate(days)}
+
+    def frame(self, start, stop):
+        # Zero-copy views of the mapped columns
+        import pandas as pd
+        return pd.DataFrame({column: values[start:stop] for column, values in self.columns.items()}, copy=False)
+
+    def fetch_range(self, start_date, end_date=None):
+        lower, upper = day_bounds(start_date, end_date)
+        timestamps = self.columns['timestamp']
+        start = np.searchsorted(timestamps, np.datetime64(lower, 'ns'), side='left')
+        stop = np.searchsorted(timestamps, np.datetime64(upper, 'ns'), side='left')
+        return self.frame(start, stop)
+
+    def fetch_days(self, dates):
+        import pandas as pd
+        slices = []
+        for date in sorted(set(str(date) for date in dates)):
+            position = self.day_index.get(date)
+            if position is not None:
+                slices.append((date, self.offsets[position], self.offsets[position + 1]))
+        if not slices:
+            return pd.DataFrame(columns=['date'] + CANDLE_COLUMNS)
+        data = {'date': np.repeat([date for date, _, _ in slices], [stop - start for _, start, stop in slices])}
+        for column, values in self.columns.items():
+            data[column] = np.concatenate([values[start:stop] for _, start, stop in slices])
+        return pd.DataFrame(data)
+
+
+class CandleCache:
+    def __init__(self, cache_dir, db_paths, check_interval=CANDLE_CACHE_CHECK_INTERVAL):
+        self.cache_dir = cache_dir
+        self.db_paths = {ticker: list(paths) for ticker, paths in db_paths.items() if paths}
+        self.check_interval = check_interval
+        self.tickers = {}
+        self.signatures = {}
+        self.builds = 0
+        self.fallbacks = 0
+        self._checked = {}
+        self._building = {}
+        # Signature whose export failed, not retried until the DB files change again
+        self._failed = {}
+        self._lock = threading.Lock()
+
+    def prepare(self):
+        # Open or export every ticker up front, e.g. in the gunicorn master before workers fork
+        started = time.perf_counter()
+        for ticker, paths in self.db_paths.items():
+            signature = files_version(paths)
+            try:
+                self._load(ticker, signature)
+            except Exception as e:
+                self._failed[ticker] = signature
+                logging.warning("Candle cache unavailable for %s: %s", ticker, e)
+        logging.info("Candle cache ready for %s tickers in %.3fs", len(self.tickers), time.perf_counter() - started)
+
+    def _load(self, ticker, signature):
+        directory = cache_directory(self.cache_dir, ticker, signature)
+        if not os.path.exists(os.path.join(directory, 'meta.json')):
+            logging.info("Exporting candles for %s to %s", ticker, directory)
+            directory = export_ticker(self.cache_dir, ticker, self.db_paths[ticker])
+            self.builds += 1
+            remove_stale(self.cache_dir, ticker, directory)
+        cache = TickerCache(directory)
+        with self._lock:
+            self.tickers[ticker] = cache
+            self.signatures[ticker] = signature
+            self._checked[ticker] = time.monotonic()
+        return cache
+
+    def _rebuild(self, ticker, signature):
+        try:
+            self._load(ticker, signature)
+        except Exception as e:
+            self._failed[ticker] = signature
+            logging.warning("Could not rebuild candle cache for %s: %s", ticker, e)
+        finally:
+            with self._lock:
+                self._building.pop(ticker, None)
+
+    def _start_rebuild(self, ticker, signature):
+        with self._lock:
+            # A flag inherited through fork has no thread behind it in this process
+            if self._building.get(ticker) == os.getpid():
+                return
+            self._building[ticker] = os.getpid()
+        threading.Thread(target=self._rebuild, args=(ticker, signature), name=f'candle-cache-{ticker}',
+                         daemon=True).start()
+
+    def _check(self, ticker):
+        cache = self.tickers.get(ticker)
+        signature = files_version(self.db_paths[ticker])
+        if cache is not None and self.signatures.get(ticker) == signature:
+            return cache
+        if cache is not None:
+            logging.info("Candle cache for %s is stale, reading SQLite until it is rebuilt", ticker)
+            with self._lock:
+                self.tickers.pop(ticker, None)
+        if self._failed.get(ticker) != signature:
+            self._start_rebuild(ticker, signature)
+        return None
+
+    def get(self, ticker):
+        # The ticker's cache if it matches the DB files, otherwise None and the caller reads SQLite
+        if ticker not in self.db_paths:
+            return None
+        cache = self.tickers.get(ticker)
+        now = time.monotonic()
+        if now - self._checked.get(ticker, 0.0) >= self.check_interval:
+            self._checked[ticker] = now
+            cache = self._check(ticker)
+        if cache is None:
+            self.fallbacks += 1
+        return cache
+
+    def stats(self):
+        return {
+            'tickers': {ticker: cache.meta['rows'] for ticker, cache in self.tickers.items()},
+            'builds': self.builds,
+            'fallbacks': self.fallbacks
+        }
+
+
+def main():
+    # python candle_cache.py [TICKER ...] exports DB_DIR's candles to CANDLE_CACHE_DIR (data/db/cache)
+    import sys
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
+    data_dir = os.environ.get('DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+    db_dir = os.environ.get('DB_DIR', os.path.join(data_dir, 'db'))
+    cache_dir = os.environ.get('CANDLE_CACHE_DIR', os.path.join(db_dir, 'cache'))
+    tickers = [arg.upper() for arg in sys.argv[1:]] or discover_tickers(db_dir)
+    for ticker in tickers:
+        paths = discover_partitions(db_dir, ticker)
+        if not paths:
+            print(f"{ticker}: no database files in {db_dir}")
+            continue
+        started = time.perf_counter()
+        directory = export_ticker(cache_dir, ticker, paths)
+        remove_stale(cache_dir, ticker, directory)
+        print(f"{ticker}: {directory} ({time.perf_counter() - started:.3f}s)")
+
+
+if __name__ == '__main__':
+    main()
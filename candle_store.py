@@ -0,0 +1,707 @@
+import base64
+import contextlib
+import datetime
+import hashlib
+import heapq
+import itertools
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from metrics import record_query, timed_query, timed_stage
+
+CANDLE_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+CANDLE_INDEX_NAME = 'idx_candles_ticker_timestamp'
+CANDLE_POOL_SIZE = int(os.environ.get('CANDLE_POOL_SIZE', '4'))
+CANDLE_ENSURE_INDEX = os.environ.get('CANDLE_ENSURE_INDEX', '1') == '1'
+CANDLE_PERSIST_CATALOG = os.environ.get('CANDLE_PERSIST_CATALOG', '1') == '1'
+# How often (seconds) the DB files are re-checked; tickers whose files changed get a fresh partition map and catalog
+CANDLE_CHECK_INTERVAL = float(os.environ.get('CANDLE_CHECK_INTERVAL', '5'))
+# Rows fetched per cursor round trip when streaming
+CANDLE_STREAM_CHUNK = int(os.environ.get('CANDLE_STREAM_CHUNK', '2000'))
+# Threads shared by all requests for querying a ticker's partitions concurrently; 1 queries them in turn
+CANDLE_FANOUT_WORKERS = int(os.environ.get('CANDLE_FANOUT_WORKERS', str(min(4, os.cpu_count() or 1))))
+# stock_data_<ticker>.db, or stock_data_<ticker>_part<N>.db when a ticker is split into partitions
+PARTITION_FILE_PATTERN = re.compile(r'^stock_data_(?P<ticker>[a-z0-9.]+?)(?:_part(?P<part>\d+))?\.db$')
+
+# Half-open timestamp range so SQLite can use the (ticker, timestamp) index
+RANGE_QUERY = """
+    SELECT timestamp, open, high, low, close, volume
+    FROM candles
+    WHERE ticker = ? AND timestamp >= ? AND timestamp < ?
+    ORDER BY timestamp
+"""
+
+# Several days from one partition in a single indexed pass; {days} is a VALUES list of (lower, upper)
+DAYS_QUERY = """
+    WITH days(day, lower, upper) AS (VALUES {days})
+    SELECT days.day AS date, candles.timestamp, candles.open, candles.high, candles.low,
+           candles.close, candles.volume
+    FROM days
+    JOIN candles ON candles.ticker = ? AND candles.timestamp >= days.lower AND candles.timestamp < days.upper
+    ORDER BY candles.timestamp
+"""
+
+# Resample intervals accepted by the range endpoints, in seconds
+RESAMPLE_INTERVALS = {
+    '1m': 60,
+    '5m': 5 * 60,
+    '15m': 15 * 60,
+    '30m': 30 * 60,
+    '1h': 60 * 60,
+    '1d': 24 * 60 * 60
+}
+
+# Per-day summary of the candles table, answered from the (ticker, timestamp) index
+TRADING_DAYS_QUERY = """
+    SELECT substr(timestamp, 1, 10) AS date, MIN(timestamp), MAX(timestamp), COUNT(*)
+    FROM candles
+    WHERE ticker = ?
+    GROUP BY date
+    ORDER BY date
+"""
+
+# Sidecar tables caching the per-day summary inside each DB file
+CATALOG_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS trading_days (
+        ticker TEXT NOT NULL, date TEXT NOT NULL, first_bar TEXT, last_bar TEXT, bar_count INTEGER,
+        PRIMARY KEY (ticker, date))""",
+    """CREATE TABLE IF NOT EXISTS trading_days_meta (
+        ticker TEXT PRIMARY KEY, max_rowid INTEGER, first_bar TEXT, last_bar TEXT)"""
+]
+
+
+def day_bounds(start_date, end_date=None):
+    end_date = end_date or start_date
+    return str(start_date), str(end_date + datetime.timedelta(days=1))
+
+
+class ConnectionPool:
+    def __init__(self, path, size=CANDLE_POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._pid = os.getpid()
+        self.opened = 0
+        self.closed = False
+
+    def _connect(self):
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        self.opened += 1
+        return conn
+
+    def _reset_after_fork(self):
+        # Connections inherited from a parent process must never be reused
+        if self._pid != os.getpid():
+            self._idle = queue.LifoQueue(maxsize=self.size)
+            self._pid = os.getpid()
+
+    @contextlib.contextmanager
+    def connection(self):
+        self._reset_after_fork()
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        returned = False
+        try:
+            yield conn
+            returned = True
+        finally:
+            # Any exception, including GeneratorExit from a stream the client dropped, closes the connection
+            # rather than pooling one that may be mid-statement
+            if returned and not self.closed:
+                try:
+                    self._idle.put_nowait(conn)
+                except queue.Full:
+                    conn.close()
+            else:
+                conn.close()
+
+    def close(self):
+        # Connections in use are closed when they are handed back
+        self.closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def discover_partitions(db_dir, ticker):
+    # Partition files in part order; the single-file DB is only used when a ticker has no parts
+    single, parts = None, []
+    try:
+        names = os.listdir(db_dir)
+    except OSError:
+        return []
+    for name in names:
+        match = PARTITION_FILE_PATTERN.match(name)
+        if match is None or match.group('ticker') != ticker.lower():
+            continue
+        if match.group('part') is None:
+            single = name
+        else:
+            parts.append((int(match.group('part')), name))
+    if parts:
+        return [os.path.join(db_dir, name) for _, name in sorted(parts)]
+    return [os.path.join(db_dir, single)] if single else []
+
+
+def discover_tickers(db_dir):
+    tickers = set()
+    for filename in os.listdir(db_dir):
+        match = PARTITION_FILE_PATTERN.match(filename)
+        if match:
+            tickers.add(match.group('ticker').upper())
+    return sorted(tickers)
+
+
+class PartitionExecutor:
+    # Bounded thread pool for per-partition queries; sqlite3 releases the GIL while a statement runs
+    def __init__(self, workers=CANDLE_FANOUT_WORKERS):
+        self.workers = workers
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        # Threads do not survive fork, so every worker process starts its own pool
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='candle-fanout')
+                    self._pid = os.getpid()
+        return self._executor
+
+    def map(self, func, items):
+        items = list(items)
+        if len(items) <= 1 or self.workers <= 1:
+            return [func(item) for item in items]
+        # Pool threads have no request context, so the stage is timed here while waiting
+        with timed_stage('sqlite'):
+            return list(self._pool().map(func, items))
+
+    def shutdown(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=False)
+        self._executor = None
+
+
+def merge_sorted_frames(frames, columns):
+    # Every frame is ordered by timestamp. Partitions rarely overlap, so most merges are a plain
+    # concat; otherwise the runs are merged with binary searches (merge_order).
+    import pandas as pd
+    non_empty = [df for df in frames if not df.empty]
+    if not non_empty:
+        return frames[0] if frames else pd.DataFrame(columns=columns)
+    if len(non_empty) == 1:
+        return non_empty[0]
+    non_empty.sort(key=lambda df: df['timestamp'].iat[0])
+    merged = pd.concat(non_empty, ignore_index=True)
+    if all(prev['timestamp'].iat[-1] <= nxt['timestamp'].iat[0] for prev, nxt in zip(non_empty, non_empty[1:])):
+        return merged
+    order = merge_order(merged['timestamp'].to_numpy(), [len(df) for df in non_empty])
+    return merged.take(order).reset_index(drop=True)
+
+
+def merge_order(timestamps, lengths):
+    # Row order merging the sorted runs of the given lengths, ordered by first timestamp. The result so
+    # far is kept as sorted pieces; a run only touches the pieces it overlaps, so partitions that meet
+    # at their edges cost a few binary searches instead of a sort over every row. side='right' keeps
+    # equal timestamps in partition order, like a stable sort.
+    pieces = []
+    start = 0
+    for length in lengths:
+        end = start + length
+        run = timestamps[start:end]
+        tail_keys, tail_order = [], []
+        while pieces and pieces[-1][0][-1] > run[0]:
+            keys, order = pieces.pop()
+            cut = np.searchsorted(keys, run[0], side='right')
+            tail_keys.insert(0, keys[cut:])
+            tail_order.insert(0, order[cut:])
+            if cut:
+                pieces.append((keys[:cut], order[:cut]))
+                break
+        split = 0
+        if tail_keys:
+            tail_keys, tail_order = np.concatenate(tail_keys), np.concatenate(tail_order)
+            split = np.searchsorted(run, tail_keys[-1], side='right')
+            positions = np.searchsorted(tail_keys, run[:split], side='right')
+            pieces.append((np.insert(tail_keys, positions, run[:split]),
+                           np.insert(tail_order, positions, np.arange(start, start + split))))
+        if split < length:
+            pieces.append((run[split:], np.arange(start + split, end)))
+        start = end
+    return np.concatenate([order for _, order in pieces])
+
+
+def files_version(paths):
+    # Version token for a set of DB files, changes whenever one is rewritten
+    signature = []
+    for path in sorted(paths):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        signature.append((path, stat.st_mtime_ns, stat.st_size))
+    return hashlib.sha1(repr(signature).encode('utf-8')).hexdigest()[:16]
+
+
+def ensure_candle_index(path):
+    try:
+        conn = sqlite3.connect(path, timeout=60)
+        try:
+            for index in conn.execute("PRAGMA index_list(candles)").fetchall():
+                columns = [row[2] for row in conn.execute(f"PRAGMA index_info('{index[1]}')").fetchall()]
+                if columns[:2] == ['ticker', 'timestamp']:
+                    return True
+            logging.info("Creating %s on %s", CANDLE_INDEX_NAME, path)
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {CANDLE_INDEX_NAME} ON candles (ticker, timestamp)")
+            conn.commit()
+            return True
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logging.warning("Could not ensure candle index on %s: %s", path, e)
+        return False
+
+
+def timestamp_bounds(conn, ticker):
+    # Separate MIN and MAX queries: SQLite only answers a lone min/max aggregate from the index
+    first = conn.execute("SELECT MIN(timestamp) FROM candles WHERE ticker = ?", (ticker,)).fetchone()[0]
+    last = conn.execute("SELECT MAX(timestamp) FROM candles WHERE ticker = ?", (ticker,)).fetchone()[0]
+    return first, last
+
+
+def catalog_signature(conn, ticker):
+    # Cheap fingerprint of the candles table: appended or rewritten rows change it
+    max_rowid = conn.execute("SELECT MAX(rowid) FROM candles").fetchone()[0]
+    first, last = timestamp_bounds(conn, ticker)
+    return max_rowid, first, last
+
+
+def read_sidecar_days(conn, ticker, signature):
+    try:
+        meta = conn.execute(
+            "SELECT max_rowid, first_bar, last_bar FROM trading_days_meta WHERE ticker = ?", (ticker,)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    if meta is None or tuple(meta) != tuple(signature):
+        return None
+    return conn.execute(
+        "SELECT date, first_bar, last_bar, bar_count FROM trading_days WHERE ticker = ? ORDER BY date", (ticker,)
+    ).fetchall()
+
+
+def write_sidecar_days(path, ticker, signature, days):
+    try:
+        conn = sqlite3.connect(path, timeout=60)
+        try:
+            with conn:
+                for statement in CATALOG_SCHEMA:
+                    conn.execute(statement)
+                conn.execute("DELETE FROM trading_days WHERE ticker = ?", (ticker,))
+                conn.executemany("INSERT INTO trading_days VALUES (?, ?, ?, ?, ?)",
+                                 [(ticker,) + tuple(day) for day in days])
+                conn.execute("INSERT OR REPLACE INTO trading_days_meta VALUES (?, ?, ?, ?)",
+                             (ticker,) + tuple(signature))
+        finally:
+            conn.close()
+        logging.debug("Persisted %s trading days for %s to %s", len(days), ticker, path)
+    except sqlite3.Error as e:
+        logging.debug("Could not persist trading days for %s to %s: %s", ticker, path, e)
+
+
+class TradingDayCatalog:
+    def __init__(self):
+        # ticker -> {date: [first_bar, last_bar, bar_count, [paths]]}, dates kept sorted
+        self.days = {}
+        self.dates = {}
+
+    def add(self, ticker, path, rows):
+        days = self.days.setdefault(ticker, {})
+        for date, first_bar, last_bar, bar_count in rows:
+            day = days.get(date)
+            if day is None:
+                days[date] = [first_bar, last_bar, bar_count, [path]]
+            else:
+                # Same day split across two partitions
+                day[0] = min(day[0], first_bar)
+                day[1] = max(day[1], last_bar)
+                day[2] += bar_count
+                day[3].append(path)
+        self.dates[ticker] = sorted(days)
+
+    def export(self):
+        return {
+            ticker: [[date] + days[date][:3] + [days[date][3]] for date in self.dates[ticker]]
+            for ticker, days in self.days.items()
+        }
+
+    @classmethod
+    def from_export(cls, exported):
+        catalog = cls()
+        for ticker, rows in exported.items():
+            catalog.days[ticker] = {row[0]: [row[1], row[2], row[3], list(row[4])] for row in rows}
+            catalog.dates[ticker] = [row[0] for row in rows]
+        return catalog
+
+    def without(self, tickers):
+        # Copy sharing every other ticker's days, so the given tickers can be rebuilt while readers use this one
+        catalog = TradingDayCatalog()
+        catalog.days = {ticker: days for ticker, days in self.days.items() if ticker not in tickers}
+        catalog.dates = {ticker: dates for ticker, dates in self.dates.items() if ticker not in tickers}
+        return catalog
+
+    def __contains__(self, ticker):
+        return bool(self.dates.get(ticker))
+
+    def get_dates(self, ticker):
+        return self.dates.get(ticker, [])
+
+    def paths_for_date(self, ticker, date):
+        day = self.days.get(ticker, {}).get(str(date))
+        return list(day[3]) if day else []
+
+    def columns(self, ticker):
+        days = self.days.get(ticker, {})
+        dates = self.get_dates(ticker)
+        return {
+            'dates': dates,
+            'first_bar': [days[date][0] for date in dates],
+            'last_bar': [days[date][1] for date in dates],
+            'bar_count': [days[date][2] for date in dates]
+        }
+
+    def bitmap(self, ticker):
+        # Bit i (LSB first within each byte) is set when start + i days is a trading day
+        dates = self.get_dates(ticker)
+        if not dates:
+            return {'start': None, 'end': None, 'count': 0, 'bitmap': ''}
+        start = datetime.date.fromisoformat(dates[0])
+        end = datetime.date.fromisoformat(dates[-1])
+        bits = bytearray((end - start).days // 8 + 1)
+        for date in dates:
+            offset = (datetime.date.fromisoformat(date) - start).days
+            bits[offset // 8] |= 1 << (offset % 8)
+        return {
+            'start': dates[0],
+            'end': dates[-1],
+            'count': len(dates),
+            'bitmap': base64.b64encode(bytes(bits)).decode('ascii')
+        }
+
+
+class CandleStore:
+    def __init__(self, db_paths, ensure_index=CANDLE_ENSURE_INDEX, persist_catalog=CANDLE_PERSIST_CATALOG,
+                 state=None, cache=None, check_interval=CANDLE_CHECK_INTERVAL):
+        # db_paths maps ticker -> list of partition files; cache is an optional candle_cache.CandleCache
+        # that answers fetch_range/fetch_days from memory-mapped arrays while it matches the DB files
+        self.db_paths = {ticker: list(paths) for ticker, paths in db_paths.items() if paths}
+        self.cache = cache
+        self.pools = {}
+        self.partitions = {}
+        self._catalog = TradingDayCatalog()
+        self.persist_catalog = persist_catalog
+        self.check_interval = check_interval
+        self.refreshes = 0
+        self.executor = PartitionExecutor()
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        if state is not None:
+            # Metadata from a startup manifest: no queries needed at boot
+            self.load_state(state)
+        else:
+            if ensure_index:
+                for paths in self.db_paths.values():
+                    for path in paths:
+                        ensure_candle_index(path)
+            self.build_partition_map()
+            self.build_catalog()
+        # Taken after the sidecar writes above, which touch the files themselves
+        self.file_versions = {ticker: files_version(paths) for ticker, paths in self.db_paths.items()}
+        self._checked = time.monotonic()
+        self._version = files_version([path for paths in self.db_paths.values() for path in paths])
+
+    @property
+    def catalog(self):
+        self.refresh()
+        return self._catalog
+
+    @property
+    def version(self):
+        # Part of the chart and analytics cache keys, so rewritten DB files get new keys
+        self.refresh()
+        return self._version
+
+    def refresh(self):
+        # Days ingested into a running app's DBs show up within check_interval, no restart needed
+        if time.monotonic() - self._checked < self.check_interval:
+            return
+        # One thread re-checks; the others keep serving the current map and catalog meanwhile
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            if time.monotonic() - self._checked < self.check_interval:
+                return
+            changed = [ticker for ticker, paths in self.db_paths.items()
+                       if files_version(paths) != self.file_versions.get(ticker)]
+            if changed:
+                logging.info("Candle DB files changed for %s, refreshing partition map and trading day catalog",
+                             changed)
+                # Open connections to a replaced file still read its old inode
+                self.drop_pools(changed)
+                self.build_partition_map(changed)
+                self.build_catalog(changed)
+                for ticker in changed:
+                    self.file_versions[ticker] = files_version(self.db_paths[ticker])
+                self._version = files_version([path for paths in self.db_paths.values() for path in paths])
+                self.refreshes += 1
+            self._checked = time.monotonic()
+        finally:
+            self._refresh_lock.release()
+
+    def export_state(self):
+        return {
+            'partitions': {ticker: [list(r) for r in ranges] for ticker, ranges in self.partitions.items()},
+            'catalog': self.catalog.export()
+        }
+
+    def load_state(self, state):
+        self.partitions = {ticker: [tuple(r) for r in ranges] for ticker, ranges in state['partitions'].items()}
+        self._catalog = TradingDayCatalog.from_export(state['catalog'])
+
+    def pool(self, path):
+        pool = self.pools.get(path)
+        if pool is None:
+            with self._lock:
+                pool = self.pools.setdefault(path, ConnectionPool(path))
+        return pool
+
+    def drop_pools(self, tickers):
+        with self._lock:
+            pools = [self.pools.pop(path, None) for ticker in tickers for path in self.db_paths[ticker]]
+        for pool in pools:
+            if pool is not None:
+                pool.close()
+
+    def build_partition_map(self, tickers=None):
+        # ticker -> sorted [(first_date, last_date, path)], from index-backed MIN/MAX lookups
+        partitions = dict(self.partitions) if tickers is not None else {}
+        for ticker in self.db_paths if tickers is None else tickers:
+            ranges = []
+            for path in self.db_paths[ticker]:
+                try:
+                    with self.pool(path).connection() as conn:
+                        first, last = timestamp_bounds(conn, ticker)
+                except sqlite3.Error as e:
+                    logging.warning("Could not read date range for %s from %s: %s", ticker, path, e)
+                    continue
+                if first is None:
+                    continue
+                ranges.append((str(first)[:10], str(last)[:10], path))
+            partitions[ticker] = sorted(ranges)
+            if logging.getLogger().isEnabledFor(logging.DEBUG):
+                logging.debug("Partition map for %s: %s", ticker, [(r[0], r[1], os.path.basename(r[2])) for r in ranges])
+        self.partitions = partitions
+
+    def build_catalog(self, tickers=None):
+        catalog = self._catalog.without(tickers) if tickers is not None else TradingDayCatalog()
+        for ticker in self.db_paths if tickers is None else tickers:
+            for path in self.db_paths[ticker]:
+                try:
+                    with self.pool(path).connection() as conn:
+                        signature = catalog_signature(conn, ticker)
+                        rows = read_sidecar_days(conn, ticker, signature)
+                        if rows is None:
+                            logging.info("Building trading day catalog for %s from %s", ticker, path)
+                            rows = conn.execute(TRADING_DAYS_QUERY, (ticker,)).fetchall()
+                            if self.persist_catalog and rows:
+                                write_sidecar_days(path, ticker, signature, rows)
+                except sqlite3.Error as e:
+                    logging.warning("Could not build trading day catalog for %s from %s: %s", ticker, path, e)
+                    continue
+                catalog.add(ticker, path, rows)
+            logging.debug("Catalogued %s trading days for %s", len(catalog.get_dates(ticker)), ticker)
+        self._catalog = catalog
+
+    def partitions_for(self, ticker, start_date, end_date=None):
+        start, end = str(start_date), str(end_date or start_date)
+        catalog = self.catalog
+        if start == end and ticker in catalog:
+            # Exact date -> partition routing from the trading day catalog
+            return catalog.paths_for_date(ticker, start)
+        return [path for first, last, path in self.partitions.get(ticker, []) if first <= end and last >= start]
+
+    def _disjoint(self, ticker, paths):
+        ranges = [(first, last) for first, last, path in self.partitions.get(ticker, []) if path in paths]
+        return len(ranges) == len(paths) and all(prev[1] < nxt[0] for prev, nxt in zip(ranges, ranges[1:]))
+
+    def _query(self, path, query, params):
+        import pandas as pd
+        with self.pool(path).connection() as conn, timed_query(path):
+            return pd.read_sql_query(query, conn, params=params, parse_dates=['timestamp'])
+
+    def _cached(self, ticker):
+        return self.cache.get(ticker) if self.cache is not None else None
+
+    def fetch_range(self, ticker, start_date, end_date=None):
+        cached = self._cached(ticker)
+        if cached is not None:
+            return cached.fetch_range(start_date, end_date)
+        lower, upper = day_bounds(start_date, end_date)
+        frames = self.executor.map(lambda path: self._query(path, RANGE_QUERY, (ticker, lower, upper)),
+                                   self.partitions_for(ticker, start_date, end_date))
+        return merge_sorted_frames(frames, CANDLE_COLUMNS)
+
+    def _iter_partition(self, path, ticker, lower, upper, chunk_size):
+        with self.pool(path).connection() as conn:
+            started = time.perf_counter()
+            cursor = conn.execute(RANGE_QUERY, (ticker, lower, upper))
+            elapsed = 0.0
+            try:
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    # Only time spent inside SQLite; the consumer's time between chunks is excluded
+                    elapsed += time.perf_counter() - started
+                    if not rows:
+                        break
+                    yield from rows
+                    started = time.perf_counter()
+            finally:
+                cursor.close()
+                record_query(path, elapsed)
+
+    def iter_range(self, ticker, start_date, end_date=None, chunk_size=CANDLE_STREAM_CHUNK):
+        # Rows straight from the cursors, merged in timestamp order across partitions
+        lower, upper = day_bounds(start_date, end_date)
+        paths = self.partitions_for(ticker, start_date, end_date)
+        partitions = [self._iter_partition(path, ticker, lower, upper, chunk_size) for path in paths]
+        if len(partitions) == 1:
+            return partitions[0]
+        if self._disjoint(ticker, paths):
+            # Partitions in date order that do not overlap need no merging
+            return itertools.chain(*partitions)
+        return heapq.merge(*partitions, key=lambda row: row[0])
+
+    def iter_range_frames(self, ticker, start_date, end_date, window_days=31):
+        # The range as a sequence of DataFrames covering at most window_days each
+        window = datetime.timedelta(days=window_days)
+        while start_date <= end_date:
+            window_end = min(start_date + window - datetime.timedelta(days=1), end_date)
+            df = self.fetch_range(ticker, start_date, window_end)
+            if not df.empty:
+                yield df
+            start_date = window_end + datetime.timedelta(days=1)
+
+    def fetch_day(self, ticker, date):
+        return self.fetch_range(ticker, date, date)
+
+    def fetch_days(self, ticker, dates):
+        # Many individual days for one ticker: one query per partition instead of one per day
+        cached = self._cached(ticker)
+        if cached is not None:
+            return cached.fetch_days(dates)
+        by_path = {}
+        for date in sorted(set(str(date) for date in dates)):
+            for path in self.partitions_for(ticker, date):
+                by_path.setdefault(path, []).append(date)
+
+        def query_days(item):
+            path, days = item
+            params = []
+            for day in days:
+                lower, upper = day_bounds(datetime.date.fromisoformat(day))
+                params.extend([day, lower, upper])
+            query = DAYS_QUERY.format(days=', '.join(['(?, ?, ?)'] * len(days)))
+            return self._query(path, query, params + [ticker])
+
+        frames = self.executor.map(query_days, by_path.items())
+        return merge_sorted_frames(frames, ['date'] + CANDLE_COLUMNS)
+
+    def close(self):
+        self.executor.shutdown()
+        for pool in self.pools.values():
+            pool.close()
+
+
+def resample_candles(df, interval):
+    # OHLCV bars aggregated into fixed clock buckets; df must be sorted by timestamp
+    import pandas as pd
+    step = RESAMPLE_INTERVALS[interval]
+    if df.empty or step == 60:
+        return df
+    timestamps = df['timestamp']
+    if timestamps.dt.tz is not None:
+        timestamps = timestamps.dt.tz_localize(None)
+    seconds = timestamps.to_numpy().astype('datetime64[s]').astype('int64')
+    buckets = seconds // step
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(df)] - 1
+    return pd.DataFrame({
+        'timestamp': pd.to_datetime(buckets[starts] * step, unit='s'),
+        'open': df['open'].to_numpy()[starts],
+        'high': np.maximum.reduceat(df['high'].to_numpy(dtype='float64'), starts),
+        'low': np.minimum.reduceat(df['low'].to_numpy(dtype='float64'), starts),
+        'close': df['close'].to_numpy()[ends],
+        'volume': np.add.reduceat(df['volume'].to_numpy(), starts)
+    })
+
+
+def shard_database(path, ticker, parts, out_dir=None):
+    # Split one ticker's candles into `parts` partition files of roughly equal trading days
+    out_dir = out_dir or os.path.dirname(path)
+    source = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        days = [row[0] for row in source.execute(TRADING_DAYS_QUERY, (ticker,))]
+        schema = source.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'candles'").fetchone()[0]
+    finally:
+        source.close()
+    written = []
+    if not days:
+        return written
+    for part, chunk in enumerate(np.array_split(np.array(days, dtype=object), min(parts, len(days))), start=1):
+        target = os.path.join(out_dir, f"stock_data_{ticker.lower()}_part{part}.db")
+        if os.path.exists(target):
+            raise FileExistsError(target)
+        lower, upper = day_bounds(datetime.date.fromisoformat(chunk[0]), datetime.date.fromisoformat(chunk[-1]))
+        conn = sqlite3.connect(target)
+        try:
+            conn.execute(schema)
+            conn.execute("ATTACH DATABASE ? AS source", (f"file:{path}?mode=ro",))
+            conn.execute("INSERT INTO candles SELECT * FROM source.candles "
+                         "WHERE ticker = ? AND timestamp >= ? AND timestamp < ? ORDER BY timestamp",
+                         (ticker, lower, upper))
+            conn.commit()
+            conn.execute("DETACH DATABASE source")
+        finally:
+            conn.close()
+        ensure_candle_index(target)
+        written.append((target, chunk[0], chunk[-1]))
+    return written
+
+
+def main():
+    # python candle_store.py shard DB_PATH TICKER PARTS [OUT_DIR] writes stock_data_<ticker>_part<N>.db files
+    import sys
+    if len(sys.argv) < 5 or sys.argv[1] != 'shard':
+        sys.exit("usage: python candle_store.py shard DB_PATH TICKER PARTS [OUT_DIR]")
+    path, ticker, parts = sys.argv[2], sys.argv[3].upper(), int(sys.argv[4])
+    for target, first, last in shard_database(path, ticker, parts, sys.argv[5] if len(sys.argv) > 5 else None):
+        print(f"{ticker}: wrote {first} to {last} to {target}")
+    # Partition files take precedence, so the app ignores the single-file DB from now on
+    print(f"Partitions are used in place of {path}; move it out of the data directory once verified")
+
+
+if __name__ == '__main__':
+    main()
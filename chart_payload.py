@@ -0,0 +1,121 @@
+import gzip
+import hashlib
+import json
+
+import numpy as np
+from flask import make_response
+
+from metrics import timed_stage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Prices are sent as integers in units of 1 / PRICE_SCALE
+PRICE_SCALE = 10000
+PRICE_COLUMNS = ['open', 'high', 'low', 'close']
+# Responses smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 512
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+
+def wall_clock_seconds(timestamps):
+    # Naive wall-clock time as epoch seconds, so clients can decode without timezone rules
+    if timestamps.dt.tz is not None:
+        timestamps = timestamps.dt.tz_localize(None)
+    return timestamps.to_numpy().astype('datetime64[s]').astype('int64')
+
+
+def delta_encode(values):
+    values = np.asarray(values, dtype='int64')
+    if values.size == 0:
+        return []
+    return np.concatenate(([values[0]], np.diff(values))).tolist()
+
+
+def delta_decode(deltas):
+    return np.cumsum(np.asarray(deltas, dtype='int64'))
+
+
+def encode_chart_json(df, ticker, date, **extra):
+    chart_data = {
+        'timestamp': df['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S').tolist(),
+        'open': df['open'].tolist(),
+        'high': df['high'].tolist(),
+        'low': df['low'].tolist(),
+        'close': df['close'].tolist(),
+        'volume': df['volume'].tolist(),
+        'ticker': ticker,
+        'date': date
+    }
+    chart_data.update(extra)
+    return chart_data
+
+
+def encode_chart_compact(df, ticker, date, **extra):
+    # Epoch-offset times and delta-encoded integer prices/volume; see decodeCompactChart in script.js
+    seconds = wall_clock_seconds(df['timestamp'])
+    chart_data = {
+        'format': 'compact',
+        'ticker': ticker,
+        'date': date,
+        'start': int(seconds[0]) if len(seconds) else None,
+        'time': delta_encode(seconds - seconds[0]) if len(seconds) else [],
+        'price_scale': PRICE_SCALE
+    }
+    for column in PRICE_COLUMNS:
+        chart_data[column] = delta_encode(np.rint(df[column].to_numpy(dtype='float64') * PRICE_SCALE))
+    chart_data['volume'] = delta_encode(np.rint(df['volume'].to_numpy(dtype='float64')))
+    chart_data.update(extra)
+    return chart_data
+
+
+def decode_chart_compact(chart_data):
+    scale = chart_data['price_scale']
+    decoded = {
+        'timestamp': (chart_data['start'] + delta_decode(chart_data['time'])).astype('datetime64[s]'),
+        'volume': delta_decode(chart_data['volume'])
+    }
+    for column in PRICE_COLUMNS:
+        decoded[column] = delta_decode(chart_data[column]) / scale
+    return decoded
+
+
+def choose_encoding(accept_encodings):
+    if brotli is not None and 'br' in accept_encodings:
+        return 'br'
+    if 'gzip' in accept_encodings:
+        return 'gzip'
+    return None
+
+
+def compress_body(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6, mtime=0)
+    return body
+
+
+def cached_json_response(payload, request, immutable=False):
+    with timed_stage('serialize'):
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    encoding = choose_encoding(request.accept_encodings) if len(body) >= MIN_COMPRESS_BYTES else None
+    etag = hashlib.sha1(body).hexdigest()
+    if encoding:
+        # Each representation gets its own strong validator
+        etag = f"{etag}-{encoding}"
+    if etag in request.if_none_match:
+        response = make_response('', 304)
+    else:
+        with timed_stage('serialize'):
+            response = make_response(compress_body(body, encoding))
+        response.mimetype = 'application/json'
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
@@ -0,0 +1,229 @@
+import hashlib
+import importlib.util
+import logging
+import os
+import threading
+import time
+
+from metrics import record_stage
+
+# pyarrow is optional and only imported when an Arrow file is read or built
+ARROW_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+# How often (seconds) a dataset re-checks its file mtime. Between checks the
+# cached frame is served without touching the filesystem.
+DATASET_CHECK_INTERVAL = float(os.environ.get('DATASET_CHECK_INTERVAL', '2'))
+# Set to 0 to ignore prebuilt .arrow files and always parse the CSVs
+DATASET_USE_ARROW = os.environ.get('DATASET_USE_ARROW', '1') == '1'
+
+# CSV files in data/ and how each one is parsed
+DATASET_SPECS = {
+    'gaps': {
+        'filename': 'qqq_central_data_updated.csv',
+        'categories': ['gap_size_bin', 'day_of_week', 'gap_direction']
+    },
+    'events': {
+        'filename': 'news_events.csv',
+        'parse_dates': ['date'],
+        'categories': ['event_type']
+    },
+    'economic': {
+        'filename': 'economic_data_binned.csv',
+        'parse_dates': ['date'],
+        'categories': ['event_type', 'bin']
+    },
+    'earnings': {
+        'filename': 'earnings_data_binned.csv',
+        'parse_dates': ['date'],
+        'categories': ['ticker', 'bin']
+    }
+}
+
+
+def arrow_path(csv_path):
+    return os.path.splitext(csv_path)[0] + '.arrow'
+
+
+def file_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class Dataset:
+    def __init__(self, name, path, parse_dates=None, date_format=None, dtype=None,
+                 categories=None, check_interval=DATASET_CHECK_INTERVAL, use_arrow=DATASET_USE_ARROW):
+        self.name = name
+        self.path = path
+        self.arrow_path = arrow_path(path)
+        self.use_arrow = use_arrow and ARROW_AVAILABLE
+        self.source = None
+        self.parse_dates = parse_dates or []
+        self.date_format = date_format or {}
+        self.dtype = dtype or {}
+        self.categories = categories or []
+        self.check_interval = check_interval
+        self.frame = None
+        self.mtime = None
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.load_seconds = 0.0
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def _signature(self):
+        signature = (file_mtime(self.path), file_mtime(self.arrow_path) if self.use_arrow else None)
+        if signature == (None, None):
+            raise FileNotFoundError(self.path)
+        return signature
+
+    def _arrow_is_fresh(self, signature):
+        csv_mtime, arrow_mtime = signature
+        return arrow_mtime is not None and (csv_mtime is None or arrow_mtime >= csv_mtime)
+
+    def _read_arrow(self):
+        # Memory-mapped Arrow IPC file: numeric columns are backed by the shared page cache
+        import pyarrow.feather as feather
+        table = feather.read_table(self.arrow_path, memory_map=True)
+        return table.to_pandas(split_blocks=True)
+
+    def _read(self, signature=None):
+        if self._arrow_is_fresh(signature or self._signature()):
+            import pyarrow as pa
+            try:
+                self.source = 'arrow'
+                return self._read_arrow()
+            except (OSError, pa.ArrowException) as e:
+                logging.warning("Could not read %s, falling back to CSV: %s", self.arrow_path, e)
+        self.source = 'csv'
+        return self._read_csv()
+
+    def _read_csv(self):
+        import pandas as pd
+        df = pd.read_csv(self.path, dtype=self.dtype)
+        for column in self.parse_dates:
+            if column in df.columns:
+                df[column] = pd.to_datetime(df[column], format=self.date_format.get(column))
+        for column in self.categories:
+            if column in df.columns:
+                df[column] = df[column].astype('category')
+        return df
+
+    def _is_stale(self, now):
+        if self.frame is None:
+            return True
+        if now - self._last_check < self.check_interval:
+            return False
+        self._last_check = now
+        return self._signature() != self.mtime
+
+    def get(self):
+        now = time.monotonic()
+        if not self._is_stale(now):
+            self.hits += 1
+            return self.frame
+        with self._lock:
+            # Another thread may have reloaded while we waited for the lock
+            mtime = self._signature()
+            if self.frame is not None and mtime == self.mtime:
+                self.hits += 1
+                return self.frame
+            started = time.perf_counter()
+            df = self._read(mtime)
+            elapsed = time.perf_counter() - started
+            self.load_seconds += elapsed
+            record_stage('load', elapsed)
+            if self.frame is None:
+                self.misses += 1
+            else:
+                self.reloads += 1
+                logging.info("Reloaded dataset %s from %s", self.name, self.path)
+            # Swap in the new frame in one assignment so readers never see a partial load
+            self.frame = df
+            self.mtime = mtime
+            self.version += 1
+            self._last_check = now
+            logging.debug("Loaded dataset %s from %s with shape: %s", self.name, self.source, df.shape)
+            return df
+
+    def token(self):
+        # Data version shared by every worker: derived from file mtimes, not the local load count
+        self.get()
+        return hashlib.sha1(repr(self.mtime).encode('utf-8')).hexdigest()[:16]
+
+    def build_arrow(self):
+        # Typed, uncompressed Arrow IPC copy of the CSV that workers can memory-map
+        if not ARROW_AVAILABLE:
+            raise RuntimeError("pyarrow is required to build Arrow datasets")
+        import pyarrow as pa
+        import pyarrow.feather as feather
+        df = self._read_csv()
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        tmp_path = f"{self.arrow_path}.tmp"
+        feather.write_feather(table, tmp_path, compression='uncompressed')
+        os.replace(tmp_path, self.arrow_path)
+        return self.arrow_path, len(df)
+
+    def stats(self):
+        return {
+            'path': os.path.basename(self.path),
+            'loaded': self.frame is not None,
+            'source': self.source,
+            'rows': 0 if self.frame is None else len(self.frame),
+            'version': self.version,
+            'hits': self.hits,
+            'misses': self.misses,
+            'reloads': self.reloads,
+            'load_seconds': round(self.load_seconds, 4)
+        }
+
+
+class DatasetRegistry:
+    def __init__(self):
+        self._datasets = {}
+
+    def register(self, name, path, **options):
+        self._datasets[name] = Dataset(name, path, **options)
+        return self._datasets[name]
+
+    def dataset(self, name):
+        return self._datasets[name]
+
+    def get(self, name):
+        # Frames are shared between requests: callers must copy before mutating
+        return self._datasets[name].get()
+
+    def names(self):
+        return list(self._datasets)
+
+    def stats(self):
+        return {name: dataset.stats() for name, dataset in self._datasets.items()}
+
+
+def create_registry(data_dir):
+    registry = DatasetRegistry()
+    for name, spec in DATASET_SPECS.items():
+        options = {key: value for key, value in spec.items() if key != 'filename'}
+        registry.register(name, os.path.join(data_dir, spec['filename']), **options)
+    return registry
+
+
+def main():
+    # Build step: python datasets.py [data_dir] converts every CSV dataset into a .arrow file
+    import sys
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+    registry = create_registry(data_dir)
+    for name in registry.names():
+        dataset = registry.dataset(name)
+        if not os.path.exists(dataset.path):
+            print(f"{name}: skipped, {dataset.path} not found")
+            continue
+        path, rows = dataset.build_arrow()
+        print(f"{name}: wrote {rows} rows to {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+import bisect
+import json
+import logging
+import os
+import re
+import threading
+
+import numpy as np
+
+from gap_builder import session_bars
+from gap_insights import ANY
+
+# Next-session reaction to every earnings report, summarized per ticker and surprise bin
+METRICS = {
+    'gap_pct': 'Open of the next session vs the close before the report (%)',
+    'day_return_pct': 'Close of the next session vs the close before the report (%)',
+    'max_up_pct': 'Highest price of the next session vs the close before the report (%)',
+    'max_down_pct': 'Lowest price of the next session vs the close before the report (%)'
+}
+PERCENTILES = (10, 25, 75, 90)
+REQUIRED_COLUMNS = ['ticker', 'date', 'bin']
+
+
+def load_bin_definitions(path):
+    # ticker -> [(bin, label)] in display order; "<-10% (Miss)" is the label of bin "Miss"
+    try:
+        with open(path) as f:
+            definitions = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logging.warning("Could not read earnings bin definitions %s: %s", path, e)
+        return {}
+    result = {}
+    for ticker, labels in definitions.items():
+        bins = []
+        for label in labels:
+            match = re.search(r'\(([^)]+)\)\s*$', label)
+            bins.append((match.group(1) if match else label, label))
+        result[ticker] = bins
+    return result
+
+
+def session_days(trading_days, date):
+    # Last session on or before the report date and the first one after it
+    position = bisect.bisect_right(trading_days, date)
+    prior = trading_days[position - 1] if position > 0 else None
+    reaction = trading_days[position] if position < len(trading_days) else None
+    return prior, reaction
+
+
+def session_ohlc(candles):
+    # Regular-session open/high/low/close per day, keyed by ISO date
+    if candles.empty:
+        return {}
+    bars = session_bars(candles)
+    day = bars['day']
+    if not len(day):
+        return {}
+    starts = np.flatnonzero(np.r_[True, day[1:] != day[:-1]])
+    ends = np.r_[starts[1:], len(day)] - 1
+    opens = bars['open'][starts]
+    highs = np.maximum.reduceat(bars['high'], starts)
+    lows = np.minimum.reduceat(bars['low'], starts)
+    closes = bars['close'][ends]
+    dates = np.datetime_as_string(day[starts], unit='D')
+    return {date: (opens[i], highs[i], lows[i], closes[i]) for i, date in enumerate(dates)}
+
+
+def compute_reactions(candle_store, ticker, dates):
+    # (ticker, date) -> metrics of the session after each report, None when its candles are missing
+    trading_days = candle_store.catalog.get_dates(ticker)
+    windows = {date: session_days(trading_days, date) for date in dates}
+    needed = {day for window in windows.values() for day in window if day is not None}
+    sessions = session_ohlc(candle_store.fetch_days(ticker, sorted(needed))) if needed else {}
+    reactions = {}
+    for date, (prior, reaction) in windows.items():
+        if prior not in sessions or reaction not in sessions:
+            reactions[(ticker, date)] = None
+            continue
+        prev_close = sessions[prior][3]
+        day_open, day_high, day_low, day_close = sessions[reaction]
+        reactions[(ticker, date)] = {
+            'session': reaction,
+            'gap_pct': (day_open / prev_close - 1) * 100,
+            'day_return_pct': (day_close / prev_close - 1) * 100,
+            'max_up_pct': (day_high / prev_close - 1) * 100,
+            'max_down_pct': (day_low / prev_close - 1) * 100
+        }
+    return reactions
+
+
+def report_keys(df):
+    return list(zip(df['ticker'].astype(str), df['date'].dt.strftime('%Y-%m-%d')))
+
+
+def summarize(reactions):
+    # Distribution of every metric over the reactions that have candles
+    available = [reaction for reaction in reactions if reaction is not None]
+    insights = {}
+    for metric, description in METRICS.items():
+        values = np.array([reaction[metric] for reaction in available], dtype='float64')
+        if not len(values):
+            insights[metric] = {'median': None, 'average': None, 'description': description}
+            continue
+        entry = {'median': round(float(np.median(values)), 2), 'average': round(float(values.mean()), 2)}
+        for percentile, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+            entry[f'p{percentile}'] = round(float(value), 2)
+        entry['up_rate'] = round(float((values > 0).mean()) * 100, 2)
+        entry['description'] = description
+        insights[metric] = entry
+    return {'events': len(reactions), 'sessions': len(available), 'insights': insights}
+
+
+class EarningsInsightsEngine:
+    # Reactions per (ticker, report date), loaded once and extended as rows are appended; the summaries
+    # per (ticker, bin) and (ticker, ANY) are rebuilt only for the tickers and bins that changed
+    def __init__(self, dataset, candle_store, definitions_path):
+        self.dataset = dataset
+        self.candle_store = candle_store
+        self.definitions_path = definitions_path
+        self.definitions = {}
+        self.definitions_mtime = None
+        self.version = None
+        self.candle_versions = {}
+        self.rows = {}
+        self.reactions = {}
+        self.cells = {}
+        self.full_builds = 0
+        self.incremental_builds = 0
+        self._lock = threading.Lock()
+
+    def _load_definitions(self):
+        try:
+            mtime = os.path.getmtime(self.definitions_path)
+        except OSError:
+            mtime = None
+        if mtime != self.definitions_mtime:
+            self.definitions = load_bin_definitions(self.definitions_path)
+            self.definitions_mtime = mtime
+
+    def _refresh(self):
+        df = self.dataset.get()
+        # New earnings rows or new candles (the store re-checks its DB files on an interval)
+        if self.version == (self.dataset.version, self.candle_store.version):
+            return
+        with self._lock:
+            version = (self.dataset.version, self.candle_store.version)
+            if self.version == version:
+                return
+            candle_versions = dict(self.candle_store.file_versions)
+            candles_changed = {ticker for ticker, value in candle_versions.items()
+                               if self.version is not None and self.candle_versions.get(ticker) != value}
+            missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+            if missing:
+                raise ValueError(f"Invalid earnings data format: missing columns {missing}")
+            rows = dict(zip(report_keys(df), df['bin'].astype(str)))
+            # New reports, reports whose next session had no candles the last time, and every report of a
+            # ticker whose candles changed
+            pending = [key for key in rows if self.reactions.get(key) is None or key[0] in candles_changed]
+            by_ticker = {}
+            for ticker, date in pending:
+                by_ticker.setdefault(ticker, []).append(date)
+            reactions = {key: value for key, value in self.reactions.items() if key in rows}
+            for ticker, ticker_dates in by_ticker.items():
+                if ticker in self.candle_store.catalog:
+                    reactions.update(compute_reactions(self.candle_store, ticker, ticker_dates))
+                else:
+                    reactions.update({(ticker, date): None for date in ticker_dates})
+            # Added, removed or re-binned reports, and older ones whose reaction is new or different
+            changed = {key for key in set(rows) | set(self.rows) if rows.get(key) != self.rows.get(key)}
+            changed.update(key for key in pending if reactions.get(key) != self.reactions.get(key))
+            affected = {(ticker, bin_value) for key in changed for ticker, bin_value in
+                        ((key[0], rows.get(key)), (key[0], self.rows.get(key))) if bin_value is not None}
+            tickers = {ticker for ticker, _ in rows}
+            cells = {cell: value for cell, value in self.cells.items() if cell[0] in tickers}
+            for ticker in {ticker for ticker, _ in affected} & tickers:
+                cells[(ticker, ANY)] = summarize([reactions[key] for key in rows if key[0] == ticker])
+            for ticker, bin_value in affected:
+                selected = [reactions[key] for key, value in rows.items() if key[0] == ticker and value == bin_value]
+                if selected:
+                    cells[(ticker, bin_value)] = summarize(selected)
+                else:
+                    cells.pop((ticker, bin_value), None)
+            if self.version is None:
+                self.full_builds += 1
+            else:
+                self.incremental_builds += 1
+                logging.info("Rebuilt %s earnings insight cells after data change", len(affected))
+            self.rows = rows
+            self.reactions = reactions
+            self.cells = cells
+            self.candle_versions = candle_versions
+            self.version = version
+            logging.debug("Earnings insights ready for %s reports", len(rows))
+
+    def lookup(self, ticker, bin_value=ANY):
+        self._refresh()
+        return self.cells.get((ticker, bin_value))
+
+    def summarize_rows(self, df):
+        # Insights for an arbitrary subset of earnings rows (several bins, a date window)
+        self._refresh()
+        keys = report_keys(df)
+        if not keys:
+            return None
+        return summarize([self.reactions.get(key) for key in keys])
+
+    def bins(self, ticker):
+        # Bins defined for the ticker, in display order, with how many reports fall in each
+        self._refresh()
+        self._load_definitions()
+        counts = {}
+        for (row_ticker, _), bin_value in self.rows.items():
+            if row_ticker == ticker:
+                counts[bin_value] = counts.get(bin_value, 0) + 1
+        defined = self.definitions.get(ticker) or [(bin_value, bin_value) for bin_value in sorted(counts)]
+        return [{'bin': bin_value, 'label': label, 'events': counts.get(bin_value, 0)}
+                for bin_value, label in defined]
+
+    def stats(self):
+        return {
+            'cells': len(self.cells),
+            'reports': len(self.rows),
+            'missing_sessions': sum(1 for reaction in self.reactions.values() if reaction is None),
+            'version': self.version,
+            'full_builds': self.full_builds,
+            'incremental_builds': self.incremental_builds
+        }
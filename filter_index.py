@@ -0,0 +1,268 @@
+import threading
+
+import numpy as np
+
+from gap_insights import ANY, time_column_to_minutes
+
+
+def _dates(series):
+    import pandas as pd
+    return pd.to_datetime(series, errors='coerce').to_numpy(dtype='datetime64[ns]')
+
+
+def _iso_dates(series):
+    return series.dt.strftime('%Y-%m-%d').to_numpy(dtype=object)
+
+
+# Per dataset: categorical columns (one bitmap per value), range columns (sortable arrays) and
+# the label returned for each matching row. Every entry is computed from the loaded frame.
+FILTER_SPECS = {
+    'gaps': {
+        'categorical': {
+            'gap_size_bin': lambda df: df['gap_size_bin'],
+            'day_of_week': lambda df: df['day_of_week'],
+            'gap_direction': lambda df: df['gap_direction'],
+            'filled': lambda df: df['filled']
+        },
+        'ranges': {
+            'date': lambda df: _dates(df['date']),
+            'time_of_low': lambda df: time_column_to_minutes(df['time_of_low']).to_numpy(),
+            'time_of_high': lambda df: time_column_to_minutes(df['time_of_high']).to_numpy()
+        },
+        'label': lambda df: df['date'].to_numpy(dtype=object)
+    },
+    'events': {
+        'categorical': {
+            'event_type': lambda df: df['event_type'],
+            'year': lambda df: df['date'].dt.year
+        },
+        'ranges': {'date': lambda df: _dates(df['date'])},
+        'label': lambda df: _iso_dates(df['date'])
+    },
+    'economic': {
+        'categorical': {
+            'event_type': lambda df: df['event_type'],
+            'bin': lambda df: df['bin']
+        },
+        'ranges': {'date': lambda df: _dates(df['date'])},
+        'label': lambda df: _iso_dates(df['date'])
+    },
+    'earnings': {
+        'categorical': {
+            'ticker': lambda df: df['ticker'],
+            'bin': lambda df: df['bin']
+        },
+        'ranges': {'date': lambda df: _dates(df['date'])},
+        'label': lambda df: _iso_dates(df['date'])
+    }
+}
+
+
+GAP_PARAMS = {'gap_size': 'gap_size_bin', 'day': 'day_of_week', 'gap_direction': 'gap_direction'}
+TIME_BAND_PARAMS = {'low_time': 'time_of_low', 'high_time': 'time_of_high'}
+
+
+class BitmapIndex:
+    # One boolean bitmap per value of each categorical column, and a sort order per range column
+    # so that a window is a slice; queries OR bitmaps within a column and AND across columns
+    def __init__(self, size, categorical, ranges):
+        import pandas as pd
+        self.size = size
+        self.bitmaps = {}
+        for name, values in categorical.items():
+            codes, uniques = pd.factorize(values)
+            self.bitmaps[name] = {value: codes == code for code, value in enumerate(uniques)}
+        self.ranges = {}
+        for name, values in ranges.items():
+            order = np.argsort(values, kind='stable')
+            sorted_values = values[order]
+            # NaN/NaT sort last and never fall inside a window
+            valid = int(np.count_nonzero(~pd.isna(sorted_values)))
+            self.ranges[name] = (order, sorted_values[:valid])
+
+    def values(self, name):
+        return list(self.bitmaps[name])
+
+    def match(self, name, values):
+        if name not in self.bitmaps:
+            raise ValueError(f"Unknown filter: {name}")
+        bitmaps = self.bitmaps[name]
+        mask = np.zeros(self.size, dtype=bool)
+        for value in values:
+            bitmap = bitmaps.get(value)
+            if bitmap is not None:
+                mask |= bitmap
+        return mask
+
+    def between(self, name, low=None, high=None):
+        # Inclusive on both ends; None leaves that side open
+        if name not in self.ranges:
+            raise ValueError(f"Unknown filter: {name}")
+        order, sorted_values = self.ranges[name]
+        start = 0 if low is None else np.searchsorted(sorted_values, low, side='left')
+        stop = len(sorted_values) if high is None else np.searchsorted(sorted_values, high, side='right')
+        mask = np.zeros(self.size, dtype=bool)
+        mask[order[start:stop]] = True
+        return mask
+
+    def query(self, equals=None, ranges=None):
+        # equals: name -> values (ANY in the values skips the column); ranges: name -> [(low, high), ...]
+        mask = np.ones(self.size, dtype=bool)
+        for name, values in (equals or {}).items():
+            if ANY in values:
+                continue
+            mask &= self.match(name, values)
+        for name, windows in (ranges or {}).items():
+            window_mask = np.zeros(self.size, dtype=bool)
+            for low, high in windows:
+                window_mask |= self.between(name, low, high)
+            mask &= window_mask
+        return mask
+
+
+class IndexedFrame:
+    def __init__(self, frame, index, labels, version):
+        self.frame = frame
+        self.index = index
+        self.labels = labels
+        self.version = version
+
+    def select(self, equals=None, ranges=None):
+        return self.index.query(equals, ranges)
+
+
+class FilterEngine:
+    # Bitmap index over one dataset, rebuilt whenever the dataset reloads
+    def __init__(self, dataset, spec):
+        self.dataset = dataset
+        self.spec = spec
+        self.current = None
+        self.builds = 0
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        # Frame, index and labels of the same version, so a query never mixes two loads
+        df = self.dataset.get()
+        current = self.current
+        if current is not None and current.frame is df:
+            return current
+        with self._lock:
+            if self.current is not None and self.current.frame is df:
+                return self.current
+            categorical = {name: make(df) for name, make in self.spec['categorical'].items()}
+            ranges = {name: make(df) for name, make in self.spec['ranges'].items()}
+            index = BitmapIndex(len(df), categorical, ranges)
+            self.current = IndexedFrame(df, index, self.spec['label'](df), self.dataset.version)
+            self.builds += 1
+            return self.current
+
+    def stats(self):
+        current = self.current
+        return {
+            'version': None if current is None else current.version,
+            'rows': 0 if current is None else current.index.size,
+            'bitmaps': 0 if current is None else sum(len(b) for b in current.index.bitmaps.values()),
+            'builds': self.builds
+        }
+
+
+def create_filters(registry):
+    return {name: FilterEngine(registry.dataset(name), spec) for name, spec in FILTER_SPECS.items()}
+
+
+def parse_date(value):
+    import pandas as pd
+    try:
+        return np.datetime64(pd.Timestamp(value).normalize().to_datetime64(), 'ns')
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid date: {value}")
+
+
+def parse_date_window(start, end):
+    # start_date/end_date query parameters as one window including both days, or None when both are absent
+    if not start and not end:
+        return None
+    low = parse_date(start) if start else None
+    high = parse_date(end) + np.timedelta64(1, 'D') - np.timedelta64(1, 'ns') if end else None
+    return [(low, high)]
+
+
+def parse_time_band(value):
+    # "HH:MM-HH:MM" as minutes after midnight
+    try:
+        start, end = value.split('-')
+        bounds = []
+        for part in (start, end):
+            hours, minutes = part.strip().split(':')
+            bounds.append(int(hours) * 60 + int(minutes))
+    except ValueError:
+        raise ValueError(f"Invalid time band: {value}")
+    return tuple(bounds)
+
+
+def parse_bool(value):
+    lowered = value.lower()
+    if lowered in ('true', '1', 'yes', 'filled'):
+        return True
+    if lowered in ('false', '0', 'no', 'unfilled'):
+        return False
+    raise ValueError(f"Invalid boolean: {value}")
+
+
+def values(args, name):
+    # Every non-empty value of a repeated query parameter (?bin=a&bin=b)
+    return [value for value in args.getlist(name) if value]
+
+
+def date_ranges(args):
+    window = parse_date_window(args.get('start_date'), args.get('end_date'))
+    return {'date': window} if window else {}
+
+
+def parse_gap_filters(args):
+    # Each gap dimension must be given (one or more values, or ANY), as before; the rest are optional
+    equals = {column: args.getlist(param) for param, column in GAP_PARAMS.items()}
+    if args.get('filled'):
+        equals['filled'] = [parse_bool(args['filled'])]
+    ranges = date_ranges(args)
+    for param, column in TIME_BAND_PARAMS.items():
+        bands = values(args, param)
+        if bands:
+            ranges[column] = [parse_time_band(band) for band in bands]
+    return equals, ranges
+
+
+def parse_event_filters(args):
+    equals = {}
+    if values(args, 'event_type'):
+        equals['event_type'] = values(args, 'event_type')
+    if values(args, 'year'):
+        try:
+            equals['year'] = [int(value) for value in values(args, 'year')]
+        except ValueError:
+            raise ValueError('Invalid year format')
+    return equals, date_ranges(args)
+
+
+def parse_economic_filters(args):
+    equals = {}
+    if values(args, 'event_type'):
+        equals['event_type'] = values(args, 'event_type')
+    if values(args, 'bin'):
+        equals['bin'] = values(args, 'bin')
+    return equals, date_ranges(args)
+
+
+def parse_earnings_filters(args):
+    # The ticker is required by every earnings query; bins are optional
+    equals = {'ticker': [args.get('ticker')]}
+    if values(args, 'bin'):
+        equals['bin'] = values(args, 'bin')
+    return equals, date_ranges(args)
+
+
+def single_gap_cell(equals, ranges):
+    # The (gap_size, day, direction) cube cell when a query is one value per dimension and nothing else
+    if ranges or 'filled' in equals or any(len(equals[column]) != 1 for column in GAP_PARAMS.values()):
+        return None
+    return tuple(equals[column][0] for column in GAP_PARAMS.values())
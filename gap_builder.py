@@ -0,0 +1,319 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from candle_store import discover_partitions, discover_tickers
+from manifest import create_temp_file
+
+# Gaps smaller than this (percent of the previous close) are not recorded
+GAP_MIN_PCT = float(os.environ.get('GAP_MIN_PCT', '0.15'))
+GAP_BUILD_WORKERS = int(os.environ.get('GAP_BUILD_WORKERS', str(min(4, os.cpu_count() or 1))))
+GAP_BINS = [0.15, 0.35, 0.5, 1.0, 1.5, float('inf')]
+GAP_BIN_LABELS = ['0.15-0.35%', '0.35-0.5%', '0.5-1%', '1-1.5%', '1.5%+']
+MARKET_TIMEZONE = 'America/New_York'
+# Regular session as minutes after midnight; the 16:00 bar is the last one
+SESSION_OPEN = 9 * 60 + 30
+SESSION_LENGTH = 390
+OPENING_WINDOW = 30
+CHECKPOINT_VERSION = 1
+# Same columns, in the same order, as qqq_central_data_updated.csv
+GAP_COLUMNS = [
+    'timestamp', 'open', 'high', 'low', 'close', 'volume', 'date', 'prev_close', 'gap', 'abs_gap', 'filled',
+    'fill_time', 'gap_size_bin', 'gap_direction', 'max_move_gap_direction_first_30min_pct',
+    'time_to_fill_minutes', 'reversal_after_fill', 'exit_time', 'move_before_reversal_fill_direction_pct',
+    'day_of_week', 'time_of_low', 'time_of_high', 'low_after_median', 'high_before_median'
+]
+
+CANDLES_SINCE_QUERY = """
+    SELECT timestamp, open, high, low, close, volume
+    FROM candles
+    WHERE ticker = ? AND timestamp >= ?
+    ORDER BY timestamp
+"""
+
+
+def output_path(out_dir, ticker):
+    return os.path.join(out_dir, f"{ticker.lower()}_gaps.csv")
+
+
+def checkpoint_path(out_dir, ticker):
+    return os.path.join(out_dir, f"{ticker.lower()}_gaps.checkpoint.json")
+
+
+def read_candles(paths, ticker, since):
+    import pandas as pd
+    frames = []
+    for path in paths:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            frames.append(pd.read_sql_query(CANDLES_SINCE_QUERY, conn, params=(ticker, since)))
+        finally:
+            conn.close()
+    if not frames:
+        return pd.DataFrame(columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    candles = pd.concat(frames, ignore_index=True)
+    candles['timestamp'] = pd.to_datetime(candles['timestamp'])
+    # Partitions may overlap at their edges
+    return candles.sort_values('timestamp', kind='stable').drop_duplicates('timestamp', keep='last')
+
+
+def session_bars(candles):
+    # Regular-session bars with their day and minute of the session (0 = 09:30, 390 = 16:00)
+    import pandas as pd
+    timestamps = candles['timestamp'].dt.tz_localize(None) if candles['timestamp'].dt.tz is not None \
+        else candles['timestamp']
+    days = timestamps.dt.normalize()
+    minutes = ((timestamps - days) // pd.Timedelta(minutes=1)).to_numpy() - SESSION_OPEN
+    keep = (minutes >= 0) & (minutes <= SESSION_LENGTH)
+    return {
+        'day': days.to_numpy()[keep],
+        'minute': minutes[keep].astype('float64'),
+        'open': candles['open'].to_numpy(dtype='float64')[keep],
+        'high': candles['high'].to_numpy(dtype='float64')[keep],
+        'low': candles['low'].to_numpy(dtype='float64')[keep],
+        'close': candles['close'].to_numpy(dtype='float64')[keep],
+        'volume': candles['volume'].to_numpy(dtype='float64')[keep]
+    }
+
+
+def first_minute(condition, minute, starts):
+    # Earliest session minute per day where condition holds, inf when it never does
+    return np.minimum.reduceat(np.where(condition, minute, np.inf), starts)
+
+
+def compute_days(bars, prev_close=np.nan):
+    # One row per session with every gap statistic, computed for all days at once
+    import pandas as pd
+    day = bars['day']
+    minute = bars['minute']
+    starts = np.flatnonzero(np.r_[True, day[1:] != day[:-1]])
+    ends = np.r_[starts[1:], len(day)] - 1
+    day_index = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(day)]))
+    high, low = bars['high'], bars['low']
+
+    day_open = bars['open'][starts]
+    day_close = bars['close'][ends]
+    day_high = np.maximum.reduceat(high, starts)
+    day_low = np.minimum.reduceat(low, starts)
+    previous = np.r_[prev_close, day_close[:-1]]
+    gap = (day_open - previous) / previous * 100
+    up = gap > 0
+
+    bar_up = up[day_index]
+    bar_previous = previous[day_index]
+    bar_open = day_open[day_index]
+    fill_minute = first_minute(np.where(bar_up, low <= bar_previous, high >= bar_previous), minute, starts)
+    filled = np.isfinite(fill_minute)
+
+    opening = minute < OPENING_WINDOW
+    opening_high = np.maximum.reduceat(np.where(opening, high, -np.inf), starts)
+    opening_low = np.minimum.reduceat(np.where(opening, low, np.inf), starts)
+    max_move = np.where(up, opening_high - day_open, day_open - opening_low) / day_open * 100
+
+    # After the fill, a reversal is price trading back to the session open
+    after_fill = minute >= fill_minute[day_index]
+    reversal_minute = first_minute(after_fill & np.where(bar_up, high >= bar_open, low <= bar_open), minute, starts)
+    reversal = filled & np.isfinite(reversal_minute)
+    exit_minute = np.where(reversal, reversal_minute, np.where(filled, SESSION_LENGTH, np.nan))
+    window = after_fill & (minute <= exit_minute[day_index])
+    window_low = np.minimum.reduceat(np.where(window, low, np.inf), starts)
+    window_high = np.maximum.reduceat(np.where(window, high, -np.inf), starts)
+    beyond = np.where(up, previous - window_low, window_high - previous) / previous * 100
+
+    return pd.DataFrame({
+        'day': day[starts],
+        'open': day_open,
+        'high': day_high,
+        'low': day_low,
+        'close': day_close,
+        'volume': np.add.reduceat(bars['volume'], starts),
+        'prev_close': previous,
+        'gap': gap,
+        'filled': filled,
+        'fill_minute': np.where(filled, fill_minute, np.nan),
+        'max_move': np.clip(max_move, 0, None),
+        'reversal': np.where(filled, reversal, np.nan),
+        'exit_minute': exit_minute,
+        'move_before_reversal': np.where(reversal, np.clip(beyond, 0, None), np.nan),
+        'low_minute': first_minute(low == day_low[day_index], minute, starts),
+        'high_minute': first_minute(high == day_high[day_index], minute, starts)
+    })
+
+
+def session_times(days, minutes):
+    import pandas as pd
+    offsets = pd.to_timedelta(SESSION_OPEN + np.asarray(minutes, dtype='float64'), unit='min')
+    return pd.DatetimeIndex(days) + offsets
+
+
+def market_timestamps(times):
+    # "2015-05-28 09:36:00-04:00", empty where the time is missing
+    import pandas as pd
+    localized = pd.Series(times.tz_localize(MARKET_TIMEZONE))
+    return localized.map(lambda value: None if pd.isna(value) else str(value))
+
+
+def format_gaps(days):
+    # Gap days in the layout of qqq_central_data_updated.csv
+    import pandas as pd
+    days = days[days['gap'].abs() >= GAP_MIN_PCT].reset_index(drop=True)
+    dates = pd.DatetimeIndex(days['day'])
+    midnight = dates.tz_localize(MARKET_TIMEZONE).tz_convert('UTC').tz_localize(None)
+    reversal = days['reversal'].map({1.0: True, 0.0: False})
+    return pd.DataFrame({
+        'timestamp': midnight.strftime('%Y-%m-%d %H:%M:%S'),
+        'open': days['open'],
+        'high': days['high'],
+        'low': days['low'],
+        'close': days['close'],
+        'volume': days['volume'],
+        'date': dates.strftime('%Y-%m-%d'),
+        'prev_close': days['prev_close'],
+        'gap': days['gap'],
+        'abs_gap': days['gap'].abs(),
+        'filled': days['filled'],
+        'fill_time': market_timestamps(session_times(dates, days['fill_minute'])),
+        'gap_size_bin': pd.cut(days['gap'].abs(), GAP_BINS, labels=GAP_BIN_LABELS, right=False).astype('object'),
+        'gap_direction': np.where(days['gap'] > 0, 'up', 'down'),
+        'max_move_gap_direction_first_30min_pct': days['max_move'],
+        'time_to_fill_minutes': days['fill_minute'],
+        'reversal_after_fill': reversal,
+        'exit_time': market_timestamps(session_times(dates, days['exit_minute'])),
+        'move_before_reversal_fill_direction_pct': days['move_before_reversal'],
+        'day_of_week': dates.day_name(),
+        'time_of_low': session_times(dates, days['low_minute']).strftime('%H:%M:%S'),
+        'time_of_high': session_times(dates, days['high_minute']).strftime('%H:%M:%S')
+    })
+
+
+def mark_medians(gaps):
+    # Relative to the ticker's whole history, so recomputed on every run
+    import pandas as pd
+    low = pd.to_timedelta(gaps['time_of_low']).dt.total_seconds()
+    high = pd.to_timedelta(gaps['time_of_high']).dt.total_seconds()
+    gaps['low_after_median'] = low > low.median()
+    gaps['high_before_median'] = high < high.median()
+    return gaps[GAP_COLUMNS]
+
+
+def load_checkpoint(path):
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logging.warning("Ignoring unreadable gap checkpoint %s: %s", path, e)
+        return None
+    return checkpoint if checkpoint.get('version') == CHECKPOINT_VERSION else None
+
+
+def write_atomic(path, write):
+    directory = os.path.dirname(path) or '.'
+    # Readable by the web workers when the builder runs as another user (e.g. from cron)
+    fd, tmp_path = create_temp_file(directory, '.gaps-')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def build_ticker(ticker, db_dir, out_dir, full=False):
+    # Adds the trading days after the checkpoint to <ticker>_gaps.csv
+    import pandas as pd
+    started = time.perf_counter()
+    os.makedirs(out_dir, exist_ok=True)
+    path = output_path(out_dir, ticker)
+    checkpoint = None if full else load_checkpoint(checkpoint_path(out_dir, ticker))
+    if checkpoint is not None and not os.path.exists(path):
+        checkpoint = None
+    since = '' if checkpoint is None else str(pd.Timestamp(checkpoint['last_date']) + pd.Timedelta(days=1))[:10]
+    prev_close = np.nan if checkpoint is None else checkpoint['last_close']
+
+    bars = session_bars(read_candles(discover_partitions(db_dir, ticker), ticker, since))
+    days = compute_days(bars, prev_close) if len(bars['day']) else None
+    # A last session that has not reached the close yet is picked up by the next run
+    if days is not None and bars['minute'][-1] < SESSION_LENGTH:
+        days = days.iloc[:-1]
+    summary = {'ticker': ticker, 'path': path, 'new_days': 0, 'new_gaps': 0}
+    if days is None or days.empty:
+        summary['rows'] = 0 if checkpoint is None else checkpoint['rows']
+        summary['seconds'] = round(time.perf_counter() - started, 3)
+        return summary
+
+    new_gaps = format_gaps(days)
+    if checkpoint is not None:
+        existing = pd.read_csv(path, dtype={'date': 'string'}, float_precision='round_trip')
+        # Rows past the checkpoint (from an interrupted run) are replaced by this run's
+        existing = existing[existing['date'] <= checkpoint['last_date']]
+        gaps = pd.concat([existing.drop(columns=['low_after_median', 'high_before_median']), new_gaps],
+                         ignore_index=True)
+    else:
+        gaps = new_gaps
+    gaps = mark_medians(gaps)
+    write_atomic(path, lambda f: gaps.to_csv(f, index=False))
+    last = days.iloc[-1]
+    checkpoint = {
+        'version': CHECKPOINT_VERSION,
+        'ticker': ticker,
+        'last_date': str(pd.Timestamp(last['day']).date()),
+        'last_close': float(last['close']),
+        'rows': len(gaps)
+    }
+    write_atomic(checkpoint_path(out_dir, ticker), lambda f: json.dump(checkpoint, f))
+    summary.update(new_days=len(days), new_gaps=len(new_gaps), rows=len(gaps),
+                   last_date=checkpoint['last_date'], seconds=round(time.perf_counter() - started, 3))
+    return summary
+
+
+def build(tickers, db_dir, out_dir, full=False, workers=GAP_BUILD_WORKERS):
+    # One process per ticker; a failing ticker is reported without stopping the others
+    if workers <= 1 or len(tickers) <= 1:
+        results = []
+        for ticker in tickers:
+            try:
+                results.append(build_ticker(ticker, db_dir, out_dir, full))
+            except Exception as e:
+                logging.error("Gap build failed for %s: %s", ticker, e)
+                results.append({'ticker': ticker, 'error': str(e)})
+        return results
+    with ProcessPoolExecutor(max_workers=min(workers, len(tickers))) as executor:
+        futures = {ticker: executor.submit(build_ticker, ticker, db_dir, out_dir, full) for ticker in tickers}
+        results = []
+        for ticker, future in futures.items():
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logging.error("Gap build failed for %s: %s", ticker, e)
+                results.append({'ticker': ticker, 'error': str(e)})
+        return results
+
+
+def main():
+    # python gap_builder.py [--full] [TICKER ...] updates <ticker>_gaps.csv in GAP_BUILD_DIR (data/gaps)
+    import sys
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
+    data_dir = os.environ.get('DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+    db_dir = os.environ.get('DB_DIR', os.path.join(data_dir, 'db'))
+    out_dir = os.environ.get('GAP_BUILD_DIR', os.path.join(data_dir, 'gaps'))
+    args = sys.argv[1:]
+    full = '--full' in args
+    tickers = [arg.upper() for arg in args if arg != '--full'] or discover_tickers(db_dir)
+    for result in build(tickers, db_dir, out_dir, full):
+        if 'error' in result:
+            print(f"{result['ticker']}: failed, {result['error']}")
+        else:
+            print(f"{result['ticker']}: {result['new_days']} new days, {result['new_gaps']} new gaps, "
+                  f"{result['rows']} rows in {result['path']} ({result.get('seconds', 0)}s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+import itertools
+import logging
+import threading
+
+# Query value that rolls a dimension up across all of its values
+ANY = 'any'
+DIMENSIONS = ['gap_size_bin', 'day_of_week', 'gap_direction']
+REQUIRED_COLUMNS = [
+    'gap_size_bin', 'day_of_week', 'gap_direction', 'filled',
+    'move_before_reversal_fill_direction_pct', 'max_move_gap_direction_first_30min_pct',
+    'time_of_low', 'time_of_high', 'reversal_after_fill', 'time_to_fill_minutes'
+]
+# Every combination of dimensions that is kept (the rest are rolled up to ANY)
+GROUPINGS = [
+    tuple(dim for dim, keep in zip(DIMENSIONS, mask) if keep)
+    for mask in itertools.product([True, False], repeat=len(DIMENSIONS))
+]
+
+
+def time_column_to_minutes(series):
+    import pandas as pd
+    parts = series.astype('string').str.split(':', expand=True)
+    if parts.shape[1] < 2:
+        return pd.Series(float('nan'), index=series.index)
+    hours = pd.to_numeric(parts[0], errors='coerce')
+    minutes = pd.to_numeric(parts[1], errors='coerce')
+    return (hours * 60 + minutes).astype('float64')
+
+
+def minutes_to_time(minutes):
+    import pandas as pd
+    if pd.isna(minutes):
+        return "N/A"
+    hours = int(minutes // 60)
+    mins = int(minutes % 60)
+    return f"{hours:02d}:{mins:02d}"
+
+
+def prepare_frame(df):
+    # Numeric working copy of the columns the insights are computed from
+    import pandas as pd
+    frame = pd.DataFrame({dim: df[dim].astype('object') for dim in DIMENSIONS})
+    frame['filled'] = df['filled'].astype('float64')
+    frame['reversal_after_fill'] = df['reversal_after_fill'].map({True: 1.0, False: 0.0}).astype('float64')
+    frame['time_to_fill_minutes'] = df['time_to_fill_minutes']
+    frame['move_pct'] = df['move_before_reversal_fill_direction_pct']
+    frame['max_move_pct'] = df['max_move_gap_direction_first_30min_pct']
+    frame['low_minutes'] = time_column_to_minutes(df['time_of_low'])
+    frame['high_minutes'] = time_column_to_minutes(df['time_of_high'])
+    is_filled = df['filled'] == True
+    frame['filled_time_to_fill'] = frame['time_to_fill_minutes'].where(is_filled)
+    frame['filled_move_pct'] = frame['move_pct'].where(is_filled)
+    frame['unfilled_max_move_pct'] = frame['max_move_pct'].where(df['filled'] == False)
+    frame['is_filled'] = is_filled.astype('int64')
+    frame['is_unfilled'] = (df['filled'] == False).astype('int64')
+    return frame
+
+
+def _aggregate(frame, grouping):
+    import pandas as pd
+    keys = list(grouping) if grouping else [pd.Series(ANY, index=frame.index)]
+    grouped = frame.groupby(keys, observed=True, sort=False, dropna=False)
+    stats = grouped.agg(
+        rows=('filled', 'size'),
+        fill_rate=('filled', 'mean'),
+        reversal_rate=('reversal_after_fill', 'mean'),
+        filled_rows=('is_filled', 'sum'),
+        unfilled_rows=('is_unfilled', 'sum'),
+        fill_time_median=('filled_time_to_fill', 'median'),
+        fill_time_mean=('filled_time_to_fill', 'mean'),
+        filled_move_median=('filled_move_pct', 'median'),
+        filled_move_mean=('filled_move_pct', 'mean'),
+        unfilled_move_median=('unfilled_max_move_pct', 'median'),
+        unfilled_move_mean=('unfilled_max_move_pct', 'mean'),
+        move_median=('move_pct', 'median'),
+        move_mean=('move_pct', 'mean'),
+        low_median=('low_minutes', 'median'),
+        low_mean=('low_minutes', 'mean'),
+        high_median=('high_minutes', 'median'),
+        high_mean=('high_minutes', 'mean'),
+    )
+    cells = {}
+    for key, row in zip(stats.index, stats.itertuples(index=False)):
+        if not isinstance(key, tuple):
+            key = (key,)
+        values = dict(zip(grouping, key))
+        cell = tuple(values.get(dim, ANY) for dim in DIMENSIONS)
+        cells[cell] = build_insights(row)
+    return cells
+
+
+def build_insights(row):
+    import pandas as pd
+    gap_fill_rate = row.fill_rate * 100
+    reversal_after_fill_rate = row.reversal_rate * 100
+    has_filled = row.filled_rows > 0
+    has_unfilled = row.unfilled_rows > 0
+    median_time_to_fill = row.fill_time_median if has_filled else 0
+    average_time_to_fill = row.fill_time_mean if has_filled else 0
+    return {
+        'gap_fill_rate': {
+            'median': round(gap_fill_rate, 2),
+            'average': round(gap_fill_rate, 2),
+            'description': 'Percentage of gaps that close'
+        },
+        'median_move_before_fill': {
+            'median': round(row.filled_move_median, 2) if has_filled else 0,
+            'average': round(row.filled_move_mean, 2) if has_filled else 0,
+            'description': 'Percentage move before gap closes'
+        },
+        'median_max_move_unfilled': {
+            'median': round(row.unfilled_move_median, 2) if has_unfilled else 0,
+            'average': round(row.unfilled_move_mean, 2) if has_unfilled else 0,
+            'description': '% move in gap direction when price does not close the gap'
+        },
+        'median_time_to_fill': {
+            'median': round(median_time_to_fill, 2) if not pd.isna(median_time_to_fill) else 0,
+            'average': round(average_time_to_fill, 2) if not pd.isna(average_time_to_fill) else 0,
+            'description': 'Median time in minutes to fill gap'
+        },
+        'median_time_of_low': {
+            'median': minutes_to_time(row.low_median),
+            'average': minutes_to_time(row.low_mean),
+            'description': 'Median time of the day’s low'
+        },
+        'median_time_of_high': {
+            'median': minutes_to_time(row.high_median),
+            'average': minutes_to_time(row.high_mean),
+            'description': 'Median time of the day’s high'
+        },
+        'reversal_after_fill_rate': {
+            'median': round(reversal_after_fill_rate, 2),
+            'average': round(reversal_after_fill_rate, 2),
+            'description': '% of time price reverses after gap is filled'
+        },
+        'median_move_before_reversal': {
+            'median': round(row.move_median, 2),
+            'average': round(row.move_mean, 2),
+            'description': 'Median move in gap fill direction before reversal'
+        }
+    }
+
+
+def build_cube(frame):
+    cube = {}
+    for grouping in GROUPINGS:
+        cube.update(_aggregate(frame, grouping))
+    return cube
+
+
+def summarize(df):
+    # Insights for an arbitrary subset of gap rows, rolled up into a single cell
+    if df.empty:
+        return None
+    return _aggregate(prepare_frame(df), ()).get((ANY,) * len(DIMENSIONS))
+
+
+def _row_hashes(frame):
+    import pandas as pd
+    return pd.util.hash_pandas_object(frame, index=False)
+
+
+def affected_cells(old_frame, new_frame):
+    # Leaf keys of rows that were added, removed or changed between two loads
+    old_hashes = _row_hashes(old_frame)
+    new_hashes = _row_hashes(new_frame)
+    removed = old_frame[~old_hashes.isin(new_hashes).to_numpy()]
+    added = new_frame[~new_hashes.isin(old_hashes).to_numpy()]
+    leaves = set()
+    for part in (removed, added):
+        leaves.update(map(tuple, part[DIMENSIONS].itertuples(index=False)))
+    cells = set()
+    for leaf in leaves:
+        for mask in itertools.product([True, False], repeat=len(DIMENSIONS)):
+            cells.add(tuple(value if keep else ANY for value, keep in zip(leaf, mask)))
+    return cells
+
+
+def update_cube(cube, frame, cells):
+    import pandas as pd
+    updated = dict(cube)
+    for cell in cells:
+        updated.pop(cell, None)
+    for grouping in GROUPINGS:
+        wanted = {cell for cell in cells
+                  if all((cell[i] != ANY) == (dim in grouping) for i, dim in enumerate(DIMENSIONS))}
+        if not wanted:
+            continue
+        positions = [DIMENSIONS.index(dim) for dim in grouping]
+        keys = {tuple(cell[i] for i in positions) for cell in wanted}
+        if grouping:
+            mask = pd.MultiIndex.from_frame(frame[list(grouping)]).isin(list(keys))
+            subset = frame[mask]
+        else:
+            subset = frame
+        if subset.empty:
+            continue
+        updated.update(_aggregate(subset, grouping))
+    return updated
+
+
+class GapInsightsEngine:
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.version = None
+        self.frame = None
+        self.cube = {}
+        self.full_builds = 0
+        self.incremental_builds = 0
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        df = self.dataset.get()
+        if self.version == self.dataset.version:
+            return
+        with self._lock:
+            if self.version == self.dataset.version:
+                return
+            version = self.dataset.version
+            missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+            if missing:
+                raise ValueError(f"Invalid gap data format: missing columns {missing}")
+            frame = prepare_frame(df)
+            if self.frame is None:
+                cube = build_cube(frame)
+                self.full_builds += 1
+            else:
+                cells = affected_cells(self.frame, frame)
+                cube = update_cube(self.cube, frame, cells)
+                self.incremental_builds += 1
+                logging.info("Rebuilt %s gap insight cells after data change", len(cells))
+            self.cube = cube
+            self.frame = frame
+            self.version = version
+            logging.debug("Gap insights cube ready with %s cells", len(cube))
+
+    def lookup(self, gap_size, day, gap_direction):
+        self._refresh()
+        return self.cube.get((gap_size, day, gap_direction))
+
+    def stats(self):
+        return {
+            'cells': len(self.cube),
+            'version': self.version,
+            'full_builds': self.full_builds,
+            'incremental_builds': self.incremental_builds
+        }
@@ -0,0 +1,14 @@
+import os
+
+# Load app.py once in the master so the startup manifest, dataset caches and gap
+# insights cube are built a single time and shared copy-on-write by every worker.
+preload_app = True
+# WARM_UP=off keeps pandas and pyarrow out of the master: lookup-only workers then never import
+# them, the rest import them on their first analytics request (see bench/worker_footprint.py).
+os.environ.setdefault('WARM_UP', 'sync')
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:' + os.environ.get('PORT', '8000'))
+workers = int(os.environ.get('WEB_CONCURRENCY', '4'))
+# Handler threads per worker; above 1 gunicorn switches to its gthread worker, so one process keeps
+# serving other requests while a handler waits on SQLite or Redis (see bench/threads_compare.py)
+threads = int(os.environ.get('GUNICORN_THREADS', '1'))
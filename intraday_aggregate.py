@@ -0,0 +1,81 @@
+import bisect
+import warnings
+
+import numpy as np
+
+from gap_builder import SESSION_LENGTH, SESSION_OPEN
+
+PERCENTILES = (10, 50, 90)
+BASES = ('open', 'prev_close')
+SESSION_MINUTES = [f"{minute // 60:02d}:{minute % 60:02d}"
+                   for minute in range(SESSION_OPEN, SESSION_OPEN + SESSION_LENGTH + 1)]
+
+
+def previous_days(trading_days, dates):
+    # Trading day before each date in the sorted catalog, None for the first one
+    result = {}
+    for date in dates:
+        position = bisect.bisect_left(trading_days, date)
+        result[date] = trading_days[position - 1] if position > 0 else None
+    return result
+
+
+def session_matrix(candles, days):
+    # days x session-minute matrices of first open and forward-filled close (NaN before the first bar)
+    import pandas as pd
+    shape = (len(days), SESSION_LENGTH + 1)
+    opens = np.full(shape, np.nan)
+    closes = np.full(shape, np.nan)
+    if candles.empty:
+        return opens, closes
+    timestamps = candles['timestamp']
+    rows = pd.Index(days).get_indexer(candles['date'])
+    minutes = ((timestamps - timestamps.dt.normalize()) // pd.Timedelta(minutes=1)).to_numpy() - SESSION_OPEN
+    keep = (rows >= 0) & (minutes >= 0) & (minutes <= SESSION_LENGTH)
+    opens[rows[keep], minutes[keep]] = candles['open'].to_numpy(dtype='float64')[keep]
+    closes[rows[keep], minutes[keep]] = candles['close'].to_numpy(dtype='float64')[keep]
+    # A minute without a bar keeps the last close of that day
+    last_seen = np.maximum.accumulate(np.where(np.isnan(closes), 0, np.arange(shape[1])), axis=1)
+    closes = closes[np.arange(shape[0])[:, None], last_seen]
+    return opens, closes
+
+
+def first_valid(matrix):
+    has_value = ~np.isnan(matrix)
+    first = has_value.argmax(axis=1)
+    values = matrix[np.arange(len(matrix)), first]
+    return np.where(has_value.any(axis=1), values, np.nan)
+
+
+def aggregate_paths(candles, dates, previous=None, base='open'):
+    # Percentile bands of the intraday path across days, in percent of the open or the prior close.
+    # candles holds a 'date' column (fetch_days); previous maps each date to its prior trading day.
+    previous = previous or {}
+    prior_days = sorted({day for day in previous.values() if day is not None} - set(dates))
+    days = list(dates) + prior_days
+    opens, closes = session_matrix(candles, days)
+    path = closes[:len(dates)]
+    if base == 'open':
+        reference = first_valid(opens[:len(dates)])
+    else:
+        last_close = closes[:, -1]
+        row = {day: index for index, day in enumerate(days)}
+        reference = np.array([last_close[row[previous[day]]] if previous.get(day) in row else np.nan
+                              for day in dates])
+    usable = ~np.isnan(reference) & ~np.isnan(path).all(axis=1)
+    returns = (path[usable] / reference[usable, None] - 1) * 100
+    with warnings.catch_warnings():
+        # Minutes no day traded in come back as NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        bands = np.nanpercentile(returns, PERCENTILES, axis=0) if len(returns) else \
+            np.full((len(PERCENTILES), SESSION_LENGTH + 1), np.nan)
+    result = {
+        'base': base,
+        'days': int(usable.sum()),
+        'dates': [day for day, keep in zip(dates, usable) if keep],
+        'minutes': SESSION_MINUTES,
+        'count': (~np.isnan(returns)).sum(axis=0).tolist()
+    }
+    for percentile, band in zip(PERCENTILES, bands):
+        result[f'p{percentile}'] = [None if np.isnan(value) else round(float(value), 4) for value in band]
+    return result
@@ -0,0 +1,72 @@
+import json
+import logging
+import os
+import secrets
+
+MANIFEST_VERSION = 1
+
+
+def file_signature(paths):
+    # (mtime, size) per existing file; any change invalidates the manifest
+    signature = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        signature[os.path.abspath(path)] = [stat.st_mtime_ns, stat.st_size]
+    return signature
+
+
+def create_temp_file(directory, prefix, suffix=''):
+    # tempfile.mkstemp with the mode open() would use: mkstemp forces 0600, which survives the final rename and
+    # hides the file from workers running as another user. The kernel applies the umask, no os.umask() needed
+    while True:
+        path = os.path.join(directory, f"{prefix}{secrets.token_hex(8)}{suffix}")
+        try:
+            return os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666), path
+        except FileExistsError:
+            continue
+
+
+def create_temp_dir(directory, prefix):
+    # tempfile.mkdtemp without its 0700 mode, for the same reason
+    while True:
+        path = os.path.join(directory, f"{prefix}{secrets.token_hex(8)}")
+        try:
+            os.mkdir(path, 0o777)
+            return path
+        except FileExistsError:
+            continue
+
+
+def load_manifest(path, db_paths):
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logging.warning("Ignoring unreadable startup manifest %s: %s", path, e)
+        return None
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+    if manifest.get('files') != file_signature(db_paths):
+        logging.info("Startup manifest is stale, database files changed")
+        return None
+    return manifest
+
+
+def save_manifest(path, manifest):
+    manifest = dict(manifest, version=MANIFEST_VERSION)
+    directory = os.path.dirname(path) or '.'
+    try:
+        os.makedirs(directory, exist_ok=True)
+        # Write to a temp file and rename so concurrent workers never read a partial manifest
+        fd, tmp_path = create_temp_file(directory, '.manifest-', '.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, path)
+        logging.debug("Saved startup manifest to %s", path)
+    except OSError as e:
+        logging.warning("Could not save startup manifest %s: %s", path, e)
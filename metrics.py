@@ -0,0 +1,213 @@
+import bisect
+import contextlib
+import os
+import threading
+import time
+
+from flask import g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_PREFIX = 'onemchart'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def collect(self):
+        with self._lock:
+            values = sorted((labels, list(counts), total, count) for labels, (counts, total, count) in self._values.items())
+        names = self.labelnames + ('le',)
+        for labels, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{_format_labels(names, labels + (_format_value(bound),))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}"
+
+
+# Metrics live in each worker process; with several gunicorn workers every scrape sees one worker
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(f"{METRICS_PREFIX}_{name}", documentation, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(f"{METRICS_PREFIX}_{name}", documentation, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        # collector() yields (name, kind, documentation, labelnames, [(labels, value)]) for values read at scrape time
+        self.collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.collect())
+        for collector in self.collectors:
+            for name, kind, documentation, labelnames, samples in collector():
+                name = f"{METRICS_PREFIX}_{name}"
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labelnames, labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+REQUEST_SECONDS = REGISTRY.histogram(
+    'request_duration_seconds', 'Request latency by route.', ('route', 'method', 'status'))
+STAGE_SECONDS = REGISTRY.histogram(
+    'stage_duration_seconds', 'Time spent per request in each stage (load, filter, sqlite, aggregate, serialize).',
+    ('route', 'stage'))
+RESPONSE_BYTES = REGISTRY.histogram(
+    'response_size_bytes', 'Response body size by route, after compression.', ('route',), SIZE_BUCKETS)
+SQLITE_QUERIES = REGISTRY.counter('sqlite_queries_total', 'SQLite queries executed per database file.', ('db',))
+SQLITE_SECONDS = REGISTRY.counter('sqlite_query_seconds_total', 'Time spent in SQLite queries per database file.', ('db',))
+RATE_LIMITED = REGISTRY.counter('rate_limited_total', 'Requests rejected by the rate limiter.', ('route',))
+
+
+def current_route():
+    if not has_request_context():
+        return None
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def record_stage(stage, seconds):
+    # Accumulated per request and observed once when the request finishes
+    if not METRICS_ENABLED or not has_request_context():
+        return
+    stages = g.setdefault('metric_stages', {})
+    stages[stage] = stages.get(stage, 0.0) + seconds
+
+
+@contextlib.contextmanager
+def timed_stage(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+def record_query(path, seconds):
+    if not METRICS_ENABLED:
+        return
+    db = os.path.basename(path)
+    SQLITE_QUERIES.inc(db)
+    SQLITE_SECONDS.inc(db, amount=seconds)
+    record_stage('sqlite', seconds)
+
+
+@contextlib.contextmanager
+def timed_query(path):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_query(path, time.perf_counter() - started)
+
+
+def start_request():
+    g.metric_started = time.perf_counter()
+
+
+def finish_request(response):
+    started = g.pop('metric_started', None)
+    if not METRICS_ENABLED or started is None:
+        return response
+    route = current_route()
+    REQUEST_SECONDS.observe(time.perf_counter() - started, route, request.method, response.status_code)
+    for stage, seconds in g.pop('metric_stages', {}).items():
+        STAGE_SECONDS.observe(seconds, route, stage)
+    if not response.is_streamed:
+        RESPONSE_BYTES.observe(response.content_length or 0, route)
+    return response
+
+
+def record_rate_limited():
+    if METRICS_ENABLED:
+        RATE_LIMITED.inc(current_route())
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    # Counts jsonify() encoding towards the serialize stage
+    def response(self, *args, **kwargs):
+        with timed_stage('serialize'):
+            return super().response(*args, **kwargs)
+
+
+def init_app(app):
+    # Ahead of the rate limiter's own before_request so rejected requests are timed too
+    app.before_request_funcs.setdefault(None, []).insert(0, start_request)
+    app.after_request(finish_request)
+    app.json = TimedJSONProvider(app)
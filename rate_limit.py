@@ -0,0 +1,197 @@
+import logging
+import os
+import threading
+import time
+
+import redis
+from limits.storage import Storage
+
+# How often (seconds) locally counted hits are pushed to Redis
+RATELIMIT_SYNC_INTERVAL = float(os.environ.get('RATELIMIT_SYNC_INTERVAL', '1'))
+# Unsynced hits per key before a request pushes them itself; bounds how far a worker can
+# overshoot a limit that other workers have already used up
+RATELIMIT_MAX_UNSYNCED = int(os.environ.get('RATELIMIT_MAX_UNSYNCED', '3'))
+# Local state for keys idle this long (seconds) is dropped; Redis stays authoritative
+RATELIMIT_LOCAL_IDLE = float(os.environ.get('RATELIMIT_LOCAL_IDLE', '600'))
+# After a failed sync, requests stop pushing hits themselves for this many seconds; the flusher
+# keeps retrying in the background and counting stays local meanwhile
+RATELIMIT_RETRY_AFTER = float(os.environ.get('RATELIMIT_RETRY_AFTER', '30'))
+KEY_PREFIX = 'LIMITS'
+
+
+class WindowCounter:
+    __slots__ = ('synced', 'inflight', 'pending', 'expires_at', 'touched')
+
+    def __init__(self, expires_at):
+        # Global count as of the last sync, hits being pushed right now and hits not pushed yet
+        self.synced = 0
+        self.inflight = 0
+        self.pending = 0
+        self.expires_at = expires_at
+        self.touched = time.time()
+
+    @property
+    def value(self):
+        return self.synced + self.inflight + self.pending
+
+
+# Fixed-window counters kept in process and pushed to Redis in batches. Registered with the limits
+# library as local+redis:// (or local+rediss://), so Flask-Limiter uses it like any other storage.
+class LocalSyncStorage(Storage):
+    STORAGE_SCHEME = ['local+redis', 'local+rediss']
+
+    def __init__(self, uri, wrap_exceptions=False, sync_interval=RATELIMIT_SYNC_INTERVAL,
+                 max_unsynced=RATELIMIT_MAX_UNSYNCED, retry_after=RATELIMIT_RETRY_AFTER, **options):
+        self.redis_url = uri.split('+', 1)[1]
+        self.redis = redis.Redis.from_url(self.redis_url, **options)
+        self.sync_interval = sync_interval
+        self.max_unsynced = max_unsynced
+        self.retry_after = retry_after
+        self.counters = {}
+        self.syncs = 0
+        self.sync_errors = 0
+        self.sync_failed = None
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._pid = None
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @staticmethod
+    def uri_for(redis_url):
+        return f"local+{redis_url}"
+
+    @property
+    def base_exceptions(self):
+        return redis.RedisError
+
+    def _ensure_sync_thread(self):
+        # Threads do not survive fork, so every worker process starts its own flusher and counters
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._lock = threading.Lock()
+            self.counters = {}
+            threading.Thread(target=self._sync_loop, name='rate-limit-sync', daemon=True).start()
+            self._pid = os.getpid()
+
+    def _sync_loop(self):
+        while True:
+            time.sleep(self.sync_interval)
+            try:
+                self.sync()
+            except Exception as e:
+                logging.error("Rate limit sync failed: %s", e)
+
+    def backing_off(self):
+        failed = self.sync_failed
+        return failed is not None and time.monotonic() - failed < self.retry_after
+
+    def _counter(self, key, now):
+        counter = self.counters.get(key)
+        if counter is not None and counter.expires_at <= now:
+            del self.counters[key]
+            counter = None
+        return counter
+
+    def incr(self, key, expiry, amount=1, **_):
+        self._ensure_sync_thread()
+        now = time.time()
+        with self._lock:
+            counter = self._counter(key, now)
+            if counter is None:
+                counter = self.counters[key] = WindowCounter(now + expiry)
+            counter.pending += amount
+            counter.touched = now
+            must_sync = counter.pending >= self.max_unsynced and not self.backing_off()
+        if must_sync:
+            self.sync([key], expiry)
+        with self._lock:
+            return counter.value
+
+    def get(self, key):
+        with self._lock:
+            counter = self._counter(key, time.time())
+            return 0 if counter is None else counter.value
+
+    def get_expiry(self, key):
+        with self._lock:
+            counter = self._counter(key, time.time())
+            return time.time() if counter is None else counter.expires_at
+
+    def sync(self, keys=None, expiry=None):
+        # Push pending hits with one pipeline; Redis answers with the global count and window TTL
+        now = time.time()
+        with self._lock:
+            if keys is None:
+                for key in [key for key, counter in self.counters.items()
+                            if counter.expires_at <= now or
+                            (not counter.pending and now - counter.touched > RATELIMIT_LOCAL_IDLE)]:
+                    del self.counters[key]
+                keys = [key for key, counter in self.counters.items() if counter.pending]
+            batch = []
+            for key in keys:
+                counter = self.counters.get(key)
+                if counter is None or not counter.pending:
+                    continue
+                # Claimed by this sync so a concurrent one never pushes the same hits twice
+                batch.append((key, counter, counter.pending))
+                counter.inflight += counter.pending
+                counter.pending = 0
+        if not batch:
+            return
+        pipeline = self.redis.pipeline(transaction=False)
+        for key, counter, pending in batch:
+            ttl = max(int(counter.expires_at - now), 1) if expiry is None else expiry
+            redis_key = f"{KEY_PREFIX}:{key}"
+            # The first hit in a window fixes its expiry, like the Redis storage does
+            pipeline.set(redis_key, 0, ex=ttl, nx=True)
+            pipeline.incrby(redis_key, pending)
+            pipeline.pttl(redis_key)
+        try:
+            results = pipeline.execute()
+        except redis.RedisError as e:
+            # Keep counting locally; the hits are retried on the next sync
+            with self._lock:
+                for key, counter, pending in batch:
+                    counter.inflight -= pending
+                    counter.pending += pending
+                self.sync_errors += 1
+                self.sync_failed = time.monotonic()
+            logging.warning("Rate limit sync to Redis failed: %s", e)
+            return
+        with self._lock:
+            for index, (key, counter, pending) in enumerate(batch):
+                total, pttl = results[index * 3 + 1], results[index * 3 + 2]
+                counter.inflight -= pending
+                counter.synced = max(counter.synced, total)
+                if pttl and pttl > 0:
+                    counter.expires_at = now + pttl / 1000
+            self.syncs += 1
+            self.sync_failed = None
+
+    def check(self):
+        try:
+            return bool(self.redis.ping())
+        except redis.RedisError:
+            return False
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+        keys = list(self.redis.scan_iter(match=f"{KEY_PREFIX}:*"))
+        if keys:
+            self.redis.delete(*keys)
+        return len(keys)
+
+    def clear(self, key):
+        with self._lock:
+            self.counters.pop(key, None)
+        self.redis.delete(f"{KEY_PREFIX}:{key}")
+
+    def stats(self):
+        with self._lock:
+            pending = sum(counter.pending + counter.inflight for counter in self.counters.values())
+        return {'keys': len(self.counters), 'pending': pending, 'syncs': self.syncs, 'sync_errors': self.sync_errors,
+                'backing_off': self.backing_off()}
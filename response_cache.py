@@ -0,0 +1,182 @@
+import collections
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+
+import redis
+from flask import Response, make_response, request
+
+RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', '1') == '1'
+RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', '3600'))
+RESPONSE_CACHE_LOCAL_ENTRIES = int(os.environ.get('RESPONSE_CACHE_LOCAL_ENTRIES', '1024'))
+RESPONSE_CACHE_LOCAL_BYTES = int(os.environ.get('RESPONSE_CACHE_LOCAL_BYTES', str(64 * 1024 * 1024)))
+# Seconds a Redis read or write may take before the lookup counts as a miss; a cache hit is
+# only worth it while it is faster than rebuilding the response
+RESPONSE_CACHE_REDIS_TIMEOUT = float(os.environ.get('RESPONSE_CACHE_REDIS_TIMEOUT', '0.25'))
+# After a Redis error the shared store is skipped for this many seconds and only the local LRU is used
+RESPONSE_CACHE_RETRY_AFTER = float(os.environ.get('RESPONSE_CACHE_RETRY_AFTER', '30'))
+# Response headers worth replaying on a cache hit
+CACHED_HEADERS = ['Content-Type', 'Content-Encoding', 'ETag', 'Cache-Control', 'Vary']
+
+
+class LocalLRU:
+    def __init__(self, max_entries, max_bytes, ttl):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self.size += len(value)
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, value = self._entries.pop(key)
+        self.size -= len(value)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def encode_entry(response):
+    headers = {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+    return json.dumps(headers).encode('utf-8') + b'\n' + response.get_data()
+
+
+def decode_entry(entry):
+    header_line, body = entry.split(b'\n', 1)
+    return json.loads(header_line), body
+
+
+# Successful JSON responses keyed by route, normalized query and data version. A process-local
+# LRU sits in front of an optional shared Redis store; because keys embed the data version,
+# refreshed data is never served from the cache and stale entries simply age out.
+class ResponseCache:
+    def __init__(self, redis_client=None, ttl=RESPONSE_CACHE_TTL, local_entries=RESPONSE_CACHE_LOCAL_ENTRIES,
+                 local_bytes=RESPONSE_CACHE_LOCAL_BYTES, enabled=RESPONSE_CACHE_ENABLED, prefix='response-cache',
+                 retry_after=RESPONSE_CACHE_RETRY_AFTER):
+        self.redis = redis_client
+        self.ttl = ttl
+        self.enabled = enabled
+        self.prefix = prefix
+        self.retry_after = retry_after
+        self.local = LocalLRU(local_entries, local_bytes, ttl)
+        self.counters = collections.defaultdict(collections.Counter)
+        self._redis_failed = None
+
+    def make_key(self, route, args, version, variant=None):
+        params = sorted((key, value) for key, values in args.lists() for value in values if value != '')
+        raw = json.dumps([route, params, version, variant], separators=(',', ':'))
+        return f"{self.prefix}:{route}:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}"
+
+    @staticmethod
+    def connect(redis_url, timeout=RESPONSE_CACHE_REDIS_TIMEOUT):
+        return redis.Redis.from_url(redis_url, socket_timeout=timeout, socket_connect_timeout=timeout)
+
+    def _redis_available(self):
+        failed = self._redis_failed
+        return self.redis is not None and (failed is None or time.monotonic() - failed >= self.retry_after)
+
+    def _redis_error(self, route, action, error):
+        # Timeouts included: the lookup is a miss and Redis is left alone until retry_after has passed
+        self._redis_failed = time.monotonic()
+        self.counters[route]['errors'] += 1
+        logging.warning("Response cache %s failed, skipping Redis for %ss: %s", action, self.retry_after, error)
+
+    def get(self, route, key):
+        entry = self.local.get(key)
+        if entry is not None:
+            self.counters[route]['local_hits'] += 1
+            return entry
+        if self._redis_available():
+            try:
+                stored = self.redis.get(key)
+            except redis.RedisError as e:
+                self._redis_error(route, 'read', e)
+                stored = None
+            else:
+                self._redis_failed = None
+            if stored is not None:
+                entry = zlib.decompress(stored)
+                self.local.set(key, entry)
+                self.counters[route]['redis_hits'] += 1
+                return entry
+        self.counters[route]['misses'] += 1
+        return None
+
+    def set(self, route, key, entry):
+        self.local.set(key, entry)
+        self.counters[route]['stores'] += 1
+        if self._redis_available():
+            try:
+                self.redis.setex(key, self.ttl, zlib.compress(entry, 6))
+            except redis.RedisError as e:
+                self._redis_error(route, 'write', e)
+
+    def cached(self, route, version, variant=None, bypass=None):
+        # version() returns the data version token; variant() distinguishes representations
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled or (bypass is not None and bypass()):
+                    return view(*args, **kwargs)
+                try:
+                    key = self.make_key(route, request.args, version(), variant() if variant else None)
+                except Exception as e:
+                    logging.warning("Response cache disabled for %s: %s", route, e)
+                    return view(*args, **kwargs)
+                entry = self.get(route, key)
+                if entry is not None:
+                    headers, body = decode_entry(entry)
+                    response = Response(body, headers=headers)
+                    return response.make_conditional(request)
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200 and not response.is_streamed and response.is_json:
+                    self.set(route, key, encode_entry(response))
+                return response
+            return wrapper
+        return decorator
+
+    def stats(self):
+        routes = {}
+        for route, counter in self.counters.items():
+            lookups = counter['local_hits'] + counter['redis_hits'] + counter['misses']
+            hits = counter['local_hits'] + counter['redis_hits']
+            routes[route] = dict(counter, hit_rate=round(hits / lookups, 4) if lookups else 0.0)
+        return {
+            'enabled': self.enabled,
+            'redis': self.redis is not None,
+            'redis_available': self._redis_available(),
+            'local_entries': len(self.local),
+            'local_bytes': self.local.size,
+            'local_evictions': self.local.evictions,
+            'routes': routes
+        }
@@ -198,7 +198,7 @@ async function loadDates() {
     }
     console.log(`Fetching dates for ticker: ${ticker}`);
     try {
-        const url = `/api/valid_dates?ticker=${encodeURIComponent(ticker)}`;
+        const url = `/api/valid_dates?ticker=${encodeURIComponent(ticker)}&format=bitmap`;
         console.log('Fetching URL:', url);
         const response = await fetch(url);
         if (response.status === 429) {
@@ -218,7 +218,7 @@ async function loadDates() {
             dateInput.disabled = true;
             return;
         }
-        console.log(`Fetched ${data.dates.length} dates for ${ticker}`);
+        console.log(`Fetched ${data.count} dates for ${ticker}`);
         dateInput.disabled = false;
     } catch (error) {
         console.error('Error loading dates:', error);
@@ -227,6 +227,33 @@ async function loadDates() {
     }
 }
 
+// Expand a format=compact chart payload (epoch offsets, delta-encoded integers) into plain arrays
+function decodeCompactChart(chartData) {
+    if (chartData.format !== 'compact') {
+        return chartData;
+    }
+    const undelta = (deltas, scale = 1) => {
+        let value = 0;
+        return deltas.map(delta => {
+            value += delta;
+            return value / scale;
+        });
+    };
+    const timestamp = undelta(chartData.time).map(offset =>
+        new Date((chartData.start + offset) * 1000).toISOString().slice(0, 19).replace('T', ' ')
+    );
+    return {
+        timestamp: timestamp,
+        open: undelta(chartData.open, chartData.price_scale),
+        high: undelta(chartData.high, chartData.price_scale),
+        low: undelta(chartData.low, chartData.price_scale),
+        close: undelta(chartData.close, chartData.price_scale),
+        volume: undelta(chartData.volume),
+        ticker: chartData.ticker,
+        date: chartData.date
+    };
+}
+
 async function loadChart(event) {
     event.preventDefault();
     const ticker = document.getElementById('ticker-select').value;
@@ -251,7 +278,7 @@ async function loadChart(event) {
         return;
     }
     console.log(`Loading chart for ticker=${ticker}, date=${date}`);
-    const url = `/api/stock/chart?ticker=${encodeURIComponent(ticker)}&date=${encodeURIComponent(date)}`;
+    const url = `/api/stock/chart?ticker=${encodeURIComponent(ticker)}&date=${encodeURIComponent(date)}&format=compact`;
     console.log('Fetching URL:', url);
     chartContainer.innerHTML = '<p>Loading chart...</p>';
     try {
@@ -283,7 +310,7 @@ async function loadChart(event) {
         }
 
         // Render Plotly chart
-        const chartData = data.chart_data;
+        const chartData = decodeCompactChart(data.chart_data);
         const candlestickTrace = {
             x: chartData.timestamp,
             open: chartData.open,
@@ -694,7 +721,7 @@ async function loadGapInsights(event) {
     // Check rate limit state
     const rateLimitResetTime = localStorage.getItem('gapInsightsRateLimitReset');
     if (rateLimitResetTime && Date.now() < parseInt(rateLimitResetTime)) {
-        insightsContainer.innerHTML = `<p style="color: red; font-weight: bold;">Rate limit exceeded: You have reached the limit of 3 requests per 12 hours. Please wait until ${new Date(parseInt(rateLimitResetTime)).toLocaleTimeString()} to try again.</p>`;
+        insightsContainer.innerHTML = `<p style="color: red; font-weight: bold;">Rate limit exceeded: You have reached the limit of 10 requests per 12 hours. Please wait until ${new Date(parseInt(rateLimitResetTime)).toLocaleTimeString()} to try again.</p>`;
         button.disabled = true;
         button.textContent = 'Rate Limit Exceeded';
         selects.forEach(select => select.disabled = true);
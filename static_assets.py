@@ -0,0 +1,312 @@
+import gzip
+import hashlib
+import io
+import json
+import logging
+import mimetypes
+import os
+import threading
+import time
+
+from flask import make_response, send_file
+
+from chart_payload import IMMUTABLE_CACHE_CONTROL, MIN_COMPRESS_BYTES
+from manifest import create_temp_file, file_signature
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Content-hashed, precompressed copies of static/, written by `python static_assets.py` or at startup
+STATIC_BUILD_FORMAT = 1
+COMPRESSIBLE_TYPES = ('.js', '.css', '.svg', '.html', '.json', '.txt')
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+HASH_LENGTH = 12
+# Images resized to the largest size the page shows them at (2x for high-DPI screens) and quantized to a
+# 256-colour palette: built name -> (source, width in px). Needs Pillow, otherwise the source is copied
+IMAGE_VARIANTS = {
+    'logo-new.png': ('logo-new.png', 1000),
+    'logo-small.png': ('logo-new.png', 200)
+}
+# How often (seconds) the build manifest is re-checked, so a rebuild is picked up without a restart
+STATIC_CHECK_INTERVAL = float(os.environ.get('STATIC_CHECK_INTERVAL', '5'))
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def hashed_name(name, digest):
+    root, ext = os.path.splitext(name)
+    return f"{root}.{digest}{ext}"
+
+
+def source_files(static_dir):
+    # Top-level files only, so the build directory inside static/ is never an input
+    return sorted(name for name in os.listdir(static_dir)
+                  if not name.startswith('.') and os.path.isfile(os.path.join(static_dir, name)))
+
+
+def optimize_image(path, width):
+    # PNG scaled down to width (never up) with a 256-colour palette; None when Pillow is not installed
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    with Image.open(path) as image:
+        image.load()
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        if image.width > width:
+            image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        image = image.quantize(256, method=Image.Quantize.FASTOCTREE)
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def precompress(data):
+    # Highest levels: this runs once per build or render, not per request
+    bodies = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        bodies['br'] = brotli.compress(data, quality=11)
+    return {encoding: body for encoding, body in bodies.items() if len(body) < len(data)}
+
+
+def pick_encoding(available, accept_encodings):
+    for encoding in ('br', 'gzip'):
+        if encoding in available and encoding in accept_encodings:
+            return encoding
+    return None
+
+
+def write_file(directory, name, data):
+    # Names are content hashes, so an existing file already holds these bytes
+    path = os.path.join(directory, name)
+    if os.path.exists(path):
+        return
+    # Readable by a proxy serving static/dist directly, or by workers when the build ran as another user
+    fd, tmp_path = create_temp_file(directory, '.asset-')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def read_manifest(build_dir):
+    try:
+        with open(os.path.join(build_dir, 'manifest.json')) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logging.warning("Ignoring unreadable static build manifest in %s: %s", build_dir, e)
+        return None
+    if manifest.get('format') != STATIC_BUILD_FORMAT:
+        return None
+    return manifest
+
+
+def is_stale(static_dir, manifest):
+    sources = [os.path.join(static_dir, name) for name in source_files(static_dir)]
+    return manifest is None or manifest.get('signature') != file_signature(sources)
+
+
+def build(static_dir, build_dir):
+    started = time.perf_counter()
+    names = source_files(static_dir)
+    outputs = {}
+    for name in names:
+        with open(os.path.join(static_dir, name), 'rb') as f:
+            outputs[name] = f.read()
+    for name, (source, width) in IMAGE_VARIANTS.items():
+        if source not in outputs:
+            continue
+        optimized = optimize_image(os.path.join(static_dir, source), width)
+        if optimized is None:
+            logging.info("Pillow is not installed, copying %s without optimizing", source)
+        outputs[name] = optimized if optimized is not None and len(optimized) < len(outputs[source]) \
+            else outputs[source]
+
+    os.makedirs(build_dir, exist_ok=True)
+    previous = read_manifest(build_dir)
+    assets = {}
+    files = {}
+    for name, data in outputs.items():
+        digest = content_hash(data)
+        target = hashed_name(name, digest)
+        compressible = name.endswith(COMPRESSIBLE_TYPES) and len(data) >= MIN_COMPRESS_BYTES
+        bodies = precompress(data) if compressible else {}
+        write_file(build_dir, target, data)
+        for encoding, body in bodies.items():
+            write_file(build_dir, target + ENCODING_SUFFIXES[encoding], body)
+        assets[name] = target
+        files[target] = {'hash': digest, 'size': len(data),
+                         'encodings': {encoding: len(body) for encoding, body in bodies.items()}}
+    if previous is not None:
+        # Pages and caches from before this build still reference the previous hashes
+        for target in previous.get('assets', {}).values():
+            if target not in files and target in previous.get('files', {}) and \
+                    os.path.exists(os.path.join(build_dir, target)):
+                files[target] = previous['files'][target]
+    keep = {'manifest.json'} | set(files) | {target + ENCODING_SUFFIXES[encoding]
+                                             for target, entry in files.items() for encoding in entry['encodings']}
+    for name in os.listdir(build_dir):
+        if name not in keep and not name.startswith('.'):
+            os.remove(os.path.join(build_dir, name))
+
+    manifest = {
+        'format': STATIC_BUILD_FORMAT,
+        'signature': file_signature([os.path.join(static_dir, name) for name in names]),
+        'assets': assets,
+        'files': files
+    }
+    fd, tmp_path = create_temp_file(build_dir, '.manifest-', '.json')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, os.path.join(build_dir, 'manifest.json'))
+    logging.info("Built %s static assets into %s in %.3fs", len(assets), build_dir, time.perf_counter() - started)
+    return manifest
+
+
+class StaticAssets:
+    # Asset URLs for templates and the responses behind them; without a build the plain /static files are linked
+    def __init__(self, static_dir, build_dir, url_prefix='/assets', check_interval=STATIC_CHECK_INTERVAL):
+        self.static_dir = static_dir
+        self.build_dir = build_dir
+        self.url_prefix = url_prefix
+        self.check_interval = check_interval
+        self.manifest = None
+        self.manifest_mtime = None
+        self.builds = 0
+        self.responses = {'identity': 0, 'gzip': 0, 'br': 0}
+        self._checked = 0.0
+
+    def prepare(self, rebuild=True):
+        # Build when static/ changed since the last build (gunicorn runs this once in the master)
+        if rebuild and is_stale(self.static_dir, read_manifest(self.build_dir)):
+            build(self.static_dir, self.build_dir)
+            self.builds += 1
+        self._load()
+
+    def _load(self):
+        if self.build_dir is None:
+            return
+        path = os.path.join(self.build_dir, 'manifest.json')
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime != self.manifest_mtime:
+            self.manifest = read_manifest(self.build_dir) if mtime is not None else None
+            self.manifest_mtime = mtime
+            if self.manifest is not None:
+                logging.info("Serving %s built static assets from %s", len(self.manifest['assets']), self.build_dir)
+
+    def current(self):
+        now = time.monotonic()
+        if now - self._checked >= self.check_interval:
+            self._checked = now
+            self._load()
+        return self.manifest
+
+    def version(self):
+        return self.manifest_mtime if self.current() is not None else None
+
+    def url(self, name):
+        manifest = self.current()
+        if manifest is not None and name in manifest['assets']:
+            return f"{self.url_prefix}/{manifest['assets'][name]}"
+        source = IMAGE_VARIANTS.get(name, (name,))[0]
+        try:
+            mtime = int(os.path.getmtime(os.path.join(self.static_dir, source)))
+        except OSError:
+            return f"/static/{source}"
+        return f"/static/{source}?v={mtime}"
+
+    def response(self, filename, request):
+        # None for names that are not in the build, so the route answers 404
+        manifest = self.current()
+        entry = manifest['files'].get(filename) if manifest is not None else None
+        if entry is None:
+            return None
+        encoding = pick_encoding(entry['encodings'], request.accept_encodings)
+        path = os.path.join(self.build_dir, filename + ENCODING_SUFFIXES[encoding] if encoding else filename)
+        etag = f"{entry['hash']}-{encoding}" if encoding else entry['hash']
+        response = send_file(path, mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                             etag=etag, conditional=True)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if entry['encodings']:
+            response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        self.responses[encoding or 'identity'] += 1
+        return response
+
+    def stats(self):
+        manifest = self.manifest
+        return {
+            'assets': manifest['assets'] if manifest is not None else {},
+            'bytes': {target: dict(entry['encodings'], identity=entry['size'])
+                      for target, entry in manifest['files'].items()} if manifest is not None else {},
+            'builds': self.builds,
+            'responses': self.responses
+        }
+
+
+class CachedPage:
+    # A rendered page and its compressed bodies, rendered again only when key() changes
+    def __init__(self, render, key, cache_control):
+        self.render = render
+        self.key = key
+        self.cache_control = cache_control
+        self.entry = None
+        self.renders = 0
+        self._lock = threading.Lock()
+
+    def _current(self):
+        key = self.key()
+        entry = self.entry
+        if entry is not None and entry['key'] == key:
+            return entry
+        with self._lock:
+            entry = self.entry
+            if entry is None or entry['key'] != key:
+                body = self.render().encode('utf-8')
+                entry = {'key': key, 'etag': content_hash(body), 'bodies': dict(precompress(body), identity=body)}
+                self.entry = entry
+                self.renders += 1
+        return entry
+
+    def response(self, request):
+        entry = self._current()
+        encoding = pick_encoding(entry['bodies'], request.accept_encodings)
+        etag = f"{entry['etag']}-{encoding}" if encoding else entry['etag']
+        if etag in request.if_none_match:
+            response = make_response('', 304)
+        else:
+            response = make_response(entry['bodies'][encoding or 'identity'])
+            response.mimetype = 'text/html'
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = self.cache_control
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+def main():
+    # python static_assets.py builds static/ into STATIC_BUILD_DIR (static/dist)
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    static_dir = os.path.join(base_dir, 'static')
+    build_dir = os.environ.get('STATIC_BUILD_DIR', os.path.join(static_dir, 'dist'))
+    manifest = build(static_dir, build_dir)
+    for name, target in manifest['assets'].items():
+        entry = manifest['files'][target]
+        sizes = ', '.join(f"{encoding} {size}" for encoding, size in entry['encodings'].items())
+        print(f"{name}: {target} ({entry['size']} bytes{', ' + sizes if sizes else ''})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+import itertools
+import json
+
+from flask import Response, stream_with_context
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def wants_ndjson(request):
+    # Opt-in via ?format=ndjson or an Accept header that prefers NDJSON over JSON
+    if request.args.get('format') == 'ndjson':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, separators=(',', ':')) + '\n'
+
+
+def ndjson_response(rows):
+    # Rows are serialized one at a time as the client reads, so memory stays flat
+    response = Response(stream_with_context(ndjson_lines(rows)), mimetype=NDJSON_MIMETYPE)
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def date_rows(dates):
+    return ({'date': date} for date in dates)
+
+
+def candle_rows(rows):
+    # (timestamp, open, high, low, close, volume) tuples straight from SQLite
+    for timestamp, open_, high, low, close, volume in rows:
+        yield {
+            'timestamp': str(timestamp)[:19].replace('T', ' '),
+            'open': open_,
+            'high': high,
+            'low': low,
+            'close': close,
+            'volume': volume
+        }
+
+
+def frame_rows(frames):
+    # Candle DataFrames converted a chunk at a time
+    for df in frames:
+        columns = [df['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S').tolist()]
+        columns += [df[column].tolist() for column in ['open', 'high', 'low', 'close', 'volume']]
+        for timestamp, open_, high, low, close, volume in zip(*columns):
+            yield {
+                'timestamp': timestamp,
+                'open': open_,
+                'high': high,
+                'low': low,
+                'close': close,
+                'volume': volume
+            }
+
+
+def peek(rows):
+    # First row (or None) plus an iterator that still yields it, so empty results can 404 before streaming
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return None, rows
+    return first, itertools.chain([first], rows)